@@ -0,0 +1,167 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+"""
+chunk_dedup.py - MinHash/LSH near-duplicate detection for document chunks.
+
+Page overlap and repeated sections within a document produce chunks that
+are nearly identical, and each one would be embedded, stored and retrieved
+on its own. A chunk is dropped when its estimated Jaccard similarity (over
+word 5-gram shingles) with a chunk already kept in the same group reaches
+the threshold; LSH banding limits the comparisons to candidate pairs.
+Groups are source documents: boilerplate shared by different products
+(warranty, returns, care) is kept once per product, because the dropped
+chunk's title and parent are what retrieval cites.
+
+    python chunk_dedup.py benchmark
+"""
+import argparse
+import os
+import re
+import time
+import zlib
+
+import numpy as np
+
+DEDUP_THRESHOLD = 0.8
+NUM_PERM = 128
+SHINGLE_WORDS = 5
+
+# Universal hashing (a * x + b) mod p over 32-bit shingle hashes; a < 2**31 keeps a * x within uint64
+_PRIME = np.uint64(4294967311)
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+_WORD = re.compile(r'\w+')
+
+
+def shingles(text: str) -> np.ndarray:
+    words = _WORD.findall(text.lower())
+    grams = [' '.join(words[i:i + SHINGLE_WORDS]) for i in range(max(1, len(words) - SHINGLE_WORDS + 1))]
+    return np.unique(np.fromiter((zlib.crc32(g.encode('utf-8')) for g in grams), dtype=np.uint64, count=len(grams)))
+
+
+def jaccard(a: str, b: str) -> float:
+    """Exact shingle Jaccard similarity, for checking estimates."""
+    sa, sb = set(shingles(a).tolist()), set(shingles(b).tolist())
+    return len(sa & sb) / len(sa | sb) if sa or sb else 1.0
+
+
+def optimal_bands(threshold: float, num_perm: int, false_negative_weight: float = 0.9) -> tuple:
+    """
+    (bands, rows) minimizing the weighted false positive and false negative
+    areas around threshold. Candidates are verified against their estimated
+    similarity, so a missed duplicate costs more than an extra comparison.
+    """
+    def area(f, low, high, steps=100):
+        width = (high - low) / steps
+        return sum(f(low + (i + 0.5) * width) for i in range(steps)) * width
+
+    best, best_error = (1, num_perm), float('inf')
+    for bands in range(1, num_perm + 1):
+        rows = num_perm // bands
+        false_positive = area(lambda s: 1 - (1 - s ** rows) ** bands, 0.0, threshold)
+        false_negative = area(lambda s: (1 - s ** rows) ** bands, threshold, 1.0)
+        error = (1 - false_negative_weight) * false_positive + false_negative_weight * false_negative
+        if error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+class ChunkDeduplicator:
+    """LSH index over the MinHash signatures of kept chunks, partitioned by group."""
+
+    def __init__(self, threshold: float = DEDUP_THRESHOLD, num_perm: int = NUM_PERM, seed: int = 1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        # Fixed seed: the same chunks are dropped on every run
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.bands, self.rows = optimal_bands(threshold, num_perm)
+        self.reset()
+
+    def settings(self) -> dict:
+        return {'threshold': self.threshold, 'num_perm': self.num_perm, 'shingle_words': SHINGLE_WORDS, 'scope': 'document'}
+
+    def reset(self) -> None:
+        self._buckets = [{} for _ in range(self.bands)]
+        self._signatures = {}
+
+    def signature(self, text: str) -> np.ndarray:
+        x = shingles(text)
+        return (((np.outer(x, self._a) + self._b) % _PRIME) & _MAX_HASH).min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray, group: str) -> list:
+        return [(group, signature[i * self.rows:(i + 1) * self.rows].tobytes()) for i in range(self.bands)]
+
+    def add(self, key: str, signature: np.ndarray, group: str = None) -> None:
+        self._signatures[key] = signature
+        for bucket, band_key in zip(self._buckets, self._band_keys(signature, group)):
+            bucket.setdefault(band_key, []).append(key)
+
+    def find_duplicate(self, signature: np.ndarray, group: str = None):
+        """Key of the most similar kept chunk of group with estimated Jaccard >= threshold, else None."""
+        candidates = {key for bucket, band_key in zip(self._buckets, self._band_keys(signature, group))
+                      for key in bucket.get(band_key, ())}
+        best, best_similarity = None, self.threshold
+        for key in sorted(candidates):
+            similarity = float(np.mean(self._signatures[key] == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = key, similarity
+        return best
+
+
+def dedup_chunks(records: list, dedup: ChunkDeduplicator) -> tuple:
+    """(kept records, {dropped chunk_id: kept chunk_id}) in record order; only chunks of one parent are compared."""
+    kept, duplicates = [], {}
+    for record in records:
+        signature = dedup.signature(record['chunk'])
+        duplicate_of = dedup.find_duplicate(signature, record['parent_id'])
+        if duplicate_of is None:
+            dedup.add(record['chunk_id'], signature, record['parent_id'])
+            kept.append(record)
+        else:
+            duplicates[record['chunk_id']] = duplicate_of
+    return kept, duplicates
+
+
+def _benchmark(archive: str) -> None:
+    import itertools
+    import tarfile
+    import tempfile
+    from incremental_index import chunk_records, embedding_config, read_documents
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with tarfile.open(archive) as tar:
+            tar.extractall(tmp)
+        documents = read_documents(tmp)
+    config = embedding_config('text-embedding-ada-002', 1536)
+    records = [r for name in sorted(documents) for r in chunk_records(name, documents[name], config)]
+    by_id = {r['chunk_id']: r for r in records}
+    total_chars = sum(len(r['chunk']) for r in records)
+    print(f"{len(documents)} documents, {len(records)} chunks, {total_chars} characters")
+
+    start = time.perf_counter()
+    sets = [(r['parent_id'], set(shingles(r['chunk']).tolist())) for r in records]
+    similar = [len(a & b) / len(a | b) for (pa, a), (pb, b) in itertools.combinations(sets, 2) if pa == pb]
+    print(f"exhaustive pairwise Jaccard within documents ({time.perf_counter() - start:.2f}s): "
+          + ", ".join(f"{sum(s >= t for s in similar)} pairs >= {t}" for t in (0.8, 0.7, 0.6, 0.5)))
+
+    for threshold in (0.9, 0.8, 0.7, 0.6, 0.5):
+        dedup = ChunkDeduplicator(threshold)
+        start = time.perf_counter()
+        kept, duplicates = dedup_chunks(records, dedup)
+        elapsed = time.perf_counter() - start
+        dropped_chars = sum(len(by_id[c]['chunk']) for c in duplicates)
+        exact = [jaccard(by_id[c]['chunk'], by_id[k]['chunk']) for c, k in duplicates.items()]
+        print(f"threshold {threshold} ({dedup.bands}x{dedup.rows} bands): {len(duplicates)} dropped "
+              f"({len(duplicates) / len(records):.1%} of embeddings, index vectors and retrieved context), "
+              f"~{dropped_chars // 4} tokens, exact Jaccard of dropped >= {min(exact, default=1):.2f}, {elapsed * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    benchmark = commands.add_parser('benchmark', help='near-duplicate savings on the product docs')
+    benchmark.add_argument('--archive', default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                            '..', '..', 'data', 'product_info.tar.gz'))
+    args = parser.parse_args()
+    _benchmark(args.archive)
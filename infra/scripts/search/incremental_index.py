@@ -0,0 +1,428 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+"""
+incremental_index.py - Content-hash manifest for incremental search indexing.
+
+Documents are chunked locally (the same page length and overlap as the
+indexer's SplitSkill) and each chunk's key is derived from its text and the
+embedding configuration, so an unchanged chunk keeps its key and its vector.
+The manifest records every document's SHA-256 and chunk keys: a re-run only
+chunks and embeds documents whose bytes changed, and deletes the chunks of
+changed or removed documents that no longer exist. Without a manifest (first
+run, fresh container) the keys already in the index are reused instead.
+
+The same sync drives the Azure AI Search index (push mode of index_setup.py)
+and a local JSON index:
+
+    python incremental_index.py local --source product_info --index local_index.json
+    python incremental_index.py benchmark
+"""
+import argparse
+import fnmatch
+import hashlib
+import json
+import os
+import re
+import time
+import urllib.error
+import urllib.request
+from dataclasses import dataclass
+
+from chunk_dedup import DEDUP_THRESHOLD, ChunkDeduplicator
+
+MANIFEST_VERSION = 1
+CHUNK_MAX_LENGTH = 2000
+CHUNK_OVERLAP = 500
+EMBED_BATCH_SIZE = 16
+UPLOAD_BATCH_SIZE = 100
+AOAI_API_VERSION = '2024-02-01'
+
+_SENTENCE_END = re.compile(r'[.!?]\s|\n\s*\n')
+
+
+def sha256_hex(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def config_hash(config: dict) -> str:
+    return sha256_hex(json.dumps(config, sort_keys=True).encode('utf-8'))[:16]
+
+
+def split_pages(text: str, max_length: int = CHUNK_MAX_LENGTH, overlap: int = CHUNK_OVERLAP) -> list:
+    """Pages of at most max_length characters, ending at sentence (else word) boundaries, overlapping by ~overlap."""
+    pages = []
+    start = 0
+    while start < len(text):
+        end = min(start + max_length, len(text))
+        if end < len(text):
+            window = text[start + max_length // 2:end]
+            breaks = [m.end() for m in _SENTENCE_END.finditer(window)]
+            if breaks:
+                end = start + max_length // 2 + breaks[-1]
+            elif ' ' in window:
+                end = start + max_length // 2 + window.rindex(' ') + 1
+        page = text[start:end].strip()
+        if page:
+            pages.append(page)
+        if end >= len(text):
+            break
+        # Next page starts on a word boundary about `overlap` characters back
+        next_start = max(end - overlap, start + 1)
+        space = text.find(' ', next_start, end)
+        start = space + 1 if space != -1 else next_start
+    return pages
+
+
+def parent_key(name: str) -> str:
+    return sha256_hex(name.encode('utf-8'))[:32]
+
+
+def chunk_records(name: str, data: bytes, config: dict) -> list:
+    """Index documents (without vectors) for one source document; identical chunks are kept once."""
+    parent_id = parent_key(name)
+    salt = config_hash(config).encode('ascii')
+    records = {}
+    for page in split_pages(data.decode('utf-8', errors='replace'), config['max_length'], config['overlap']):
+        chunk_id = f"{parent_id}_{sha256_hex(salt + page.encode('utf-8'))[:32]}"
+        records.setdefault(chunk_id, {'chunk_id': chunk_id, 'parent_id': parent_id, 'title': name, 'chunk': page})
+    return list(records.values())
+
+
+def read_documents(source_dir: str, pattern: str = '*.md') -> dict:
+    documents = {}
+    for root, _, files in os.walk(source_dir):
+        for file_name in fnmatch.filter(files, pattern):
+            path = os.path.join(root, file_name)
+            with open(path, 'rb') as fp:
+                documents[os.path.relpath(path, source_dir).replace(os.sep, '/')] = fp.read()
+    return documents
+
+
+def load_manifest(path: str, config: dict):
+    """The manifest at path, or None if it is missing or was built with a different configuration."""
+    try:
+        with open(path, 'r') as fp:
+            manifest = json.load(fp)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != MANIFEST_VERSION or manifest.get('config') != config:
+        return None
+    return manifest
+
+
+def save_manifest(path: str, manifest: dict) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as fp:
+        json.dump(manifest, fp, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+@dataclass
+class SyncStats:
+    documents: int = 0
+    changed: int = 0
+    removed: int = 0
+    chunks: int = 0
+    embedded: int = 0
+    deleted: int = 0
+    duplicates: int = 0
+    seconds: float = 0.0
+
+    def __str__(self):
+        return (f"{self.documents} documents ({self.changed} changed, {self.removed} removed), "
+                f"{self.chunks} chunks: {self.embedded} embedded, {self.chunks - self.embedded} reused, "
+                f"{self.deleted} deleted, {self.duplicates} near-duplicates dropped in {self.seconds:.2f}s")
+
+
+def sync_documents(documents: dict, manifest_path: str, embed, sink, config: dict, dedup=None) -> SyncStats:
+    """
+    Brings sink in line with documents (name -> bytes), embedding only new chunks.
+    embed(texts) returns one vector per text; sink provides existing_ids(),
+    upsert(records) and delete(ids). With a ChunkDeduplicator, chunks that
+    nearly duplicate a kept chunk of the same document are left out of the
+    index.
+
+    Each embedded batch is upserted at once, and the manifest is checkpointed
+    with the documents whose chunks are all in the sink, so an interrupted
+    run resumes where it stopped instead of embedding everything again.
+    """
+    start = time.perf_counter()
+    stats = SyncStats(documents=len(documents))
+    manifest_config = dict(config, dedup=dedup.settings() if dedup else None)
+    manifest = load_manifest(manifest_path, manifest_config)
+    known = manifest['documents'] if manifest else {}
+    # Without a usable manifest, chunks already in the index are reused and any others are orphans;
+    # an interrupted run records the ones no document has claimed yet
+    if manifest is None:
+        existing = sink.existing_ids()
+    else:
+        existing = set(manifest['untracked']) if 'untracked' in manifest else None
+
+    digests = {name: sha256_hex(data) for name, data in documents.items()}
+    # A document interrupted mid-upload is re-synced even if its bytes are back to the recorded version
+    changed = {name for name in documents if name not in known or known[name]['sha256'] != digests[name]
+               or known[name].get('pending')}
+    if dedup:
+        # Duplicates are only dropped within a document, so unchanged documents need no re-check
+        dedup.reset()
+
+    # Checkpointed state: known entries until a document's new chunks are all upserted; until then the
+    # chunks already upserted for it are listed as 'pending', so a resumed run reuses or deletes them
+    completed = dict(known)
+    entries, orphans, waiting, upserted, batch = {}, {}, {}, {}, []
+
+    def checkpoint():
+        done = [name for name, count in waiting.items() if count == 0]
+        stale = set().union(*(orphans.pop(name) for name in done))
+        if stale:
+            sink.delete(sorted(stale))
+            stats.deleted += len(stale)
+        for name in done:
+            del waiting[name]
+            upserted.pop(name, None)
+            completed[name] = entries[name]
+        for name, chunk_ids in upserted.items():
+            previous = known.get(name) or {'sha256': None, 'chunks': []}
+            completed[name] = dict(previous, pending=sorted(set(previous.get('pending', ())).union(chunk_ids)))
+        untracked = {} if existing is None else {
+            'untracked': sorted(existing.difference(*(e['chunks'] for e in completed.values())))}
+        save_manifest(manifest_path, dict(untracked, version=MANIFEST_VERSION, config=manifest_config,
+                                          documents=completed))
+
+    def flush():
+        records = batch[:EMBED_BATCH_SIZE]
+        del batch[:EMBED_BATCH_SIZE]
+        for (_, record), vector in zip(records, embed([r['chunk'] for _, r in records])):
+            record['text_vector'] = vector
+        sink.upsert([record for _, record in records])
+        stats.embedded += len(records)
+        for name, record in records:
+            waiting[name] -= 1
+            upserted.setdefault(name, []).append(record['chunk_id'])
+        checkpoint()
+
+    for name in sorted(documents):
+        entry = known.get(name)
+        if name not in changed:
+            entries[name] = entry
+            stats.chunks += len(entry['chunks'])
+            stats.duplicates += len(entry.get('duplicates', {}))
+            continue
+        stats.changed += 1
+        previous = set(entry['chunks']).union(entry.get('pending', ())) if entry else set()
+        old_ids = previous | (existing or set())
+        new_entry = {'sha256': digests[name], 'chunks': []}
+        if dedup:
+            new_entry.update(duplicates={})
+        pending = []
+        for record in chunk_records(name, documents[name], config):
+            chunk_id = record['chunk_id']
+            if dedup:
+                signature = dedup.signature(record['chunk'])
+                duplicate_of = dedup.find_duplicate(signature, record['parent_id'])
+                if duplicate_of is not None:
+                    new_entry['duplicates'][chunk_id] = duplicate_of
+                    continue
+                dedup.add(chunk_id, signature, record['parent_id'])
+            new_entry['chunks'].append(chunk_id)
+            if chunk_id not in old_ids:
+                pending.append((name, record))
+        entries[name] = new_entry
+        stats.chunks += len(new_entry['chunks'])
+        stats.duplicates += len(new_entry.get('duplicates', {}))
+        orphans[name] = previous.difference(new_entry['chunks'])
+        waiting[name] = len(pending)
+        batch.extend(pending)
+        while len(batch) >= EMBED_BATCH_SIZE:
+            flush()
+    while batch:
+        flush()
+    if waiting:
+        checkpoint()
+
+    stale = set()
+    for name in known.keys() - documents.keys():
+        stats.removed += 1
+        stale.update(known[name]['chunks'], known[name].get('pending', ()))
+    if existing is not None:
+        stale.update(existing.difference(*(e['chunks'] for e in entries.values())))
+    if stale:
+        sink.delete(sorted(stale))
+        stats.deleted += len(stale)
+
+    save_manifest(manifest_path, {'version': MANIFEST_VERSION, 'config': manifest_config, 'documents': entries})
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+class LocalIndex:
+    """Chunk documents with vectors in one JSON file, keyed by chunk_id."""
+
+    def __init__(self, path: str):
+        self.path = path
+        try:
+            with open(path, 'r') as fp:
+                self.documents = json.load(fp)
+        except (OSError, ValueError):
+            self.documents = {}
+
+    def existing_ids(self) -> set:
+        return set(self.documents)
+
+    def upsert(self, records: list) -> None:
+        self.documents.update((r['chunk_id'], r) for r in records)
+        self._save()
+
+    def delete(self, ids: list) -> None:
+        for chunk_id in ids:
+            self.documents.pop(chunk_id, None)
+        self._save()
+
+    def _save(self) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as fp:
+            json.dump(self.documents, fp)
+        os.replace(tmp_path, self.path)
+
+
+class AzureSearchIndex:
+    """Pushes chunk documents to an Azure AI Search index through a SearchClient."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def existing_ids(self) -> set:
+        return {doc['chunk_id'] for doc in self.client.search(search_text='*', select=['chunk_id'])}
+
+    def _check(self, results) -> None:
+        failed = [r.key for r in results if not r.succeeded]
+        if failed:
+            raise RuntimeError(f"Indexing failed for {len(failed)} chunks, e.g. {failed[:3]}")
+
+    def upsert(self, records: list) -> None:
+        for i in range(0, len(records), UPLOAD_BATCH_SIZE):
+            self._check(self.client.merge_or_upload_documents(documents=records[i:i + UPLOAD_BATCH_SIZE]))
+
+    def delete(self, ids: list) -> None:
+        for i in range(0, len(ids), UPLOAD_BATCH_SIZE):
+            self._check(self.client.delete_documents(documents=[{'chunk_id': c} for c in ids[i:i + UPLOAD_BATCH_SIZE]]))
+
+
+class AzureOpenAIEmbedder:
+    """Embeddings REST calls with an Entra ID token; retries throttled requests."""
+
+    def __init__(self, endpoint: str, deployment: str, model: str, dimensions: int, credential, max_retries: int = 5):
+        self.url = f"{endpoint.rstrip('/')}/openai/deployments/{deployment}/embeddings?api-version={AOAI_API_VERSION}"
+        # Only the text-embedding-3 models accept a dimensions parameter
+        self.dimensions = dimensions if model.startswith('text-embedding-3') else None
+        self.credential = credential
+        self.max_retries = max_retries
+
+    def __call__(self, texts: list) -> list:
+        body = {'input': texts}
+        if self.dimensions:
+            body['dimensions'] = self.dimensions
+        for attempt in range(self.max_retries + 1):
+            token = self.credential.get_token('https://cognitiveservices.azure.com/.default').token
+            request = urllib.request.Request(self.url, data=json.dumps(body).encode('utf-8'), method='POST', headers={
+                'Content-Type': 'application/json', 'Authorization': f"Bearer {token}"})
+            try:
+                with urllib.request.urlopen(request, timeout=60) as response:
+                    data = json.load(response)['data']
+                return [item['embedding'] for item in sorted(data, key=lambda item: item['index'])]
+            except urllib.error.HTTPError as e:
+                if e.code != 429 or attempt == self.max_retries:
+                    raise
+                time.sleep(float(e.headers.get('Retry-After', 2 ** attempt)))
+
+
+class HashingEmbedder:
+    """Offline feature-hashing embeddings for local builds and benchmarks (no service calls)."""
+
+    def __init__(self, dimensions: int = 256):
+        self.dimensions = dimensions
+
+    def __call__(self, texts: list) -> list:
+        vectors = []
+        for text in texts:
+            vector = [0.0] * self.dimensions
+            for token in re.findall(r'\w+', text.lower()):
+                h = int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little')
+                vector[h % self.dimensions] += 1.0 if h >> 63 else -1.0
+            norm = sum(v * v for v in vector) ** 0.5 or 1.0
+            vectors.append([v / norm for v in vector])
+        return vectors
+
+
+def embedding_config(model: str, dimensions: int) -> dict:
+    # Part of every chunk key: changing the chunking or the model re-embeds everything
+    return {'max_length': CHUNK_MAX_LENGTH, 'overlap': CHUNK_OVERLAP, 'model': model, 'dimensions': dimensions}
+
+
+def _benchmark(archive: str, dedup_threshold: float) -> None:
+    import tarfile
+    import tempfile
+
+    class CountingEmbedder(HashingEmbedder):
+        # Simulated service round trip per batch, so timings reflect what re-embedding costs
+        def __call__(self, texts):
+            time.sleep(0.15)
+            return super().__call__(texts)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'docs')
+        with tarfile.open(archive) as tar:
+            tar.extractall(source)
+        index = LocalIndex(os.path.join(tmp, 'index.json'))
+        manifest_path = os.path.join(tmp, 'manifest.json')
+        embed, config = CountingEmbedder(), embedding_config('hashing', 256)
+        dedup = ChunkDeduplicator(dedup_threshold) if dedup_threshold else None
+
+        def run(label):
+            stats = sync_documents(read_documents(source), manifest_path, embed, index, config, dedup)
+            print(f"{label:<28} {stats}")
+
+        run('full build:')
+        run('re-run, nothing changed:')
+        names = sorted(read_documents(source))
+        with open(os.path.join(source, names[0]), 'a') as fp:
+            fp.write('\n\n## Care\nWipe clean with a damp cloth.\n')
+        run('one document edited:')
+        os.remove(os.path.join(source, names[1]))
+        run('one document removed:')
+        os.remove(manifest_path)
+        run('manifest lost:')
+        print(f"index holds {len(index.documents)} chunks")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    local = commands.add_parser('local', help='incrementally build a local JSON index')
+    local.add_argument('--source', required=True)
+    local.add_argument('--pattern', default='*.md')
+    local.add_argument('--index', default='local_index.json')
+    local.add_argument('--manifest', default=None, help='default <index>.manifest.json')
+    local.add_argument('--embedder', choices=['hash', 'aoai'], default='hash')
+    local.add_argument('--dedup-threshold', type=float, default=0,
+                       help=f'near-duplicate Jaccard threshold within a document, e.g. {DEDUP_THRESHOLD}; 0 (default) disables')
+    benchmark = commands.add_parser('benchmark', help='full build vs incremental re-runs on the product docs')
+    benchmark.add_argument('--archive', default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                            '..', '..', 'data', 'product_info.tar.gz'))
+    benchmark.add_argument('--dedup-threshold', type=float, default=0)
+    args = parser.parse_args()
+
+    if args.command == 'benchmark':
+        _benchmark(args.archive, args.dedup_threshold)
+    else:
+        if args.embedder == 'aoai':
+            from azure.identity import DefaultAzureCredential
+            model, dimensions = os.environ['EMBEDDING_MODEL_NAME'], int(os.environ['EMBEDDING_MODEL_DIMENSIONS'])
+            embedder = AzureOpenAIEmbedder(os.environ['AOAI_ENDPOINT'], os.environ['EMBEDDING_DEPLOYMENT_NAME'],
+                                           model, dimensions, DefaultAzureCredential())
+            index_config = embedding_config(model, dimensions)
+        else:
+            embedder, index_config = HashingEmbedder(), embedding_config('hashing', 256)
+        print(sync_documents(read_documents(args.source, args.pattern), args.manifest or f"{args.index}.manifest.json",
+                             embedder, LocalIndex(args.index), index_config,
+                             ChunkDeduplicator(args.dedup_threshold) if args.dedup_threshold else None))
@@ -26,6 +26,17 @@ from azure.search.documents.indexes.models import (
     SearchIndexer,
     FieldMapping
 )
+from azure.search.documents import SearchClient
+from chunk_dedup import ChunkDeduplicator
+from incremental_index import (
+    CHUNK_MAX_LENGTH,
+    CHUNK_OVERLAP,
+    AzureOpenAIEmbedder,
+    AzureSearchIndex,
+    embedding_config,
+    read_documents,
+    sync_documents
+)
 
 def get_azure_credential():
     use_mi_auth = os.environ.get('USE_MI_AUTH', 'false').lower() == 'true'
@@ -47,6 +58,8 @@ storage_account_connection_string = os.environ['STORAGE_ACCOUNT_CONNECTION_STRIN
 blob_container_name = os.environ['BLOB_CONTAINER_NAME']
 
 index_name = os.environ['SEARCH_INDEX_NAME']
+# indexer: blob data source + skillset; push: chunk and embed here, only for changed documents
+index_mode = os.environ.get('INDEX_MODE', 'indexer').lower()
 data_source_name = index_name + '-ds'
 skillset_name = index_name + '-ss'
 indexer_name = index_name + '-idxr'
@@ -94,98 +107,117 @@ index = SearchIndex(name=index_name, fields=fields, vector_search=vector_search)
 result = index_client.create_or_update_index(index)
 print(f"{result.name} created")
 
-# Create data source:
-indexer_client = SearchIndexerClient(endpoint=endpoint, credential=credential)
-container = SearchIndexerDataContainer(name=blob_container_name)
-data_source_connection = SearchIndexerDataSourceConnection(
-    name=data_source_name,
-    type="azureblob",
-    connection_string=storage_account_connection_string,
-    container=container
-)
-data_source = indexer_client.create_or_update_data_source_connection(data_source_connection)
-
-print(f"Data source '{data_source.name}' created or updated")
-
-# Chunking:
-split_skill = SplitSkill(  
-    description="Split skill to chunk documents",
-    text_split_mode="pages",
-    context="/document",
-    maximum_page_length=2000,
-    page_overlap_length=500,
-    inputs=[
-        InputFieldMappingEntry(name="text", source="/document/content"),
-    ],
-    outputs=[
-        OutputFieldMappingEntry(name="textItems", target_name="pages")
-    ]
-)
+if index_mode == 'push':
+    # Incremental sync against the content-hash manifest; unchanged documents are not re-chunked or re-embedded:
+    source_dir = os.environ['INDEX_SOURCE_DIR']
+    manifest_path = os.environ.get('INDEX_MANIFEST_PATH', f"{index_name}-manifest.json")
+    embedder = AzureOpenAIEmbedder(aoai_endpoint, embedding_deployment_name, embedding_model_name, embedding_model_dimensions, credential)
+    search_client = SearchClient(endpoint=endpoint, index_name=index_name, credential=credential)
+    # Opt-in: near-duplicate chunks of a document (Jaccard similarity at or above the threshold, e.g.
+    # 0.8) are not indexed. The product docs have none, so it is off by default (0):
+    dedup_threshold = float(os.environ.get('INDEX_DEDUP_THRESHOLD', '0'))
+    stats = sync_documents(
+        read_documents(source_dir),
+        manifest_path,
+        embedder,
+        AzureSearchIndex(search_client),
+        embedding_config(embedding_model_name, embedding_model_dimensions),
+        ChunkDeduplicator(dedup_threshold) if dedup_threshold else None
+    )
+    print(f"{index_name} synced: {stats}")
+else:
+    # Create data source:
+    indexer_client = SearchIndexerClient(endpoint=endpoint, credential=credential)
+    container = SearchIndexerDataContainer(name=blob_container_name)
+    data_source_connection = SearchIndexerDataSourceConnection(
+        name=data_source_name,
+        type="azureblob",
+        connection_string=storage_account_connection_string,
+        container=container
+    )
+    data_source = indexer_client.create_or_update_data_source_connection(data_source_connection)
+
+    print(f"Data source '{data_source.name}' created or updated")
+
+    # Chunking:
+    split_skill = SplitSkill(  
+        description="Split skill to chunk documents",
+        text_split_mode="pages",
+        context="/document",
+        maximum_page_length=CHUNK_MAX_LENGTH,
+        page_overlap_length=CHUNK_OVERLAP,
+        inputs=[
+            InputFieldMappingEntry(name="text", source="/document/content"),
+        ],
+        outputs=[
+            OutputFieldMappingEntry(name="textItems", target_name="pages")
+        ]
+    )
 
-# Embedding:
-embedding_skill = AzureOpenAIEmbeddingSkill(
-    description="Skill to generate embeddings via Azure OpenAI",
-    context="/document/pages/*",
-    resource_url=aoai_endpoint,
-    deployment_name=embedding_deployment_name,
-    model_name=embedding_model_name,
-    dimensions=embedding_model_dimensions,
-    inputs=[
-        InputFieldMappingEntry(name="text", source="/document/pages/*"),
-    ],
-    outputs=[
-        OutputFieldMappingEntry(name="embedding", target_name="text_vector")
-    ]
-)
+    # Embedding:
+    embedding_skill = AzureOpenAIEmbeddingSkill(
+        description="Skill to generate embeddings via Azure OpenAI",
+        context="/document/pages/*",
+        resource_url=aoai_endpoint,
+        deployment_name=embedding_deployment_name,
+        model_name=embedding_model_name,
+        dimensions=embedding_model_dimensions,
+        inputs=[
+            InputFieldMappingEntry(name="text", source="/document/pages/*"),
+        ],
+        outputs=[
+            OutputFieldMappingEntry(name="embedding", target_name="text_vector")
+        ]
+    )
 
-# Projections:
-index_projections = SearchIndexerIndexProjection(
-    selectors=[
-        SearchIndexerIndexProjectionSelector(
-            target_index_name=index_name,
-            parent_key_field_name="parent_id",
-            source_context="/document/pages/*",
-            mappings=[
-                InputFieldMappingEntry(name="chunk", source="/document/pages/*"),
-                InputFieldMappingEntry(name="text_vector", source="/document/pages/*/text_vector"),
-                InputFieldMappingEntry(name="title", source="/document/metadata_storage_name"),
-            ],
-        ),
-    ],
-    parameters=SearchIndexerIndexProjectionsParameters(
-        projection_mode=IndexProjectionMode.SKIP_INDEXING_PARENT_DOCUMENTS
+    # Projections:
+    index_projections = SearchIndexerIndexProjection(
+        selectors=[
+            SearchIndexerIndexProjectionSelector(
+                target_index_name=index_name,
+                parent_key_field_name="parent_id",
+                source_context="/document/pages/*",
+                mappings=[
+                    InputFieldMappingEntry(name="chunk", source="/document/pages/*"),
+                    InputFieldMappingEntry(name="text_vector", source="/document/pages/*/text_vector"),
+                    InputFieldMappingEntry(name="title", source="/document/metadata_storage_name"),
+                ],
+            ),
+        ],
+        parameters=SearchIndexerIndexProjectionsParameters(
+            projection_mode=IndexProjectionMode.SKIP_INDEXING_PARENT_DOCUMENTS
+        )
     )
-)
 
-# Create skillset:
-skills = [split_skill, embedding_skill]
-skillset = SearchIndexerSkillset(
-    name=skillset_name,
-    description="Skillset to chunk documents and generating embeddings",
-    skills=skills,
-    index_projection=index_projections,
-)
+    # Create skillset:
+    skills = [split_skill, embedding_skill]
+    skillset = SearchIndexerSkillset(
+        name=skillset_name,
+        description="Skillset to chunk documents and generating embeddings",
+        skills=skills,
+        index_projection=index_projections,
+    )
 
-client = SearchIndexerClient(endpoint=endpoint, credential=credential)
-client.create_or_update_skillset(skillset)
-print(f"{skillset.name} created")
-
-# Create indexer:
-indexer_parameters = None
-
-indexer = SearchIndexer(
-    name=indexer_name,
-    description="Indexer to index documents and generate embeddings",
-    skillset_name=skillset_name,
-    target_index_name=index_name,
-    data_source_name=data_source.name,
-    # Map metadata_storage_name field to title field in index to display PDF title in search results:
-    field_mappings=[FieldMapping(source_field_name="metadata_storage_name", target_field_name="title")],
-    parameters=indexer_parameters
-)
+    client = SearchIndexerClient(endpoint=endpoint, credential=credential)
+    client.create_or_update_skillset(skillset)
+    print(f"{skillset.name} created")
+
+    # Create indexer:
+    indexer_parameters = None
+
+    indexer = SearchIndexer(
+        name=indexer_name,
+        description="Indexer to index documents and generate embeddings",
+        skillset_name=skillset_name,
+        target_index_name=index_name,
+        data_source_name=data_source.name,
+        # Map metadata_storage_name field to title field in index to display PDF title in search results:
+        field_mappings=[FieldMapping(source_field_name="metadata_storage_name", target_field_name="title")],
+        parameters=indexer_parameters
+    )
 
-# Create and run indexer:
-indexer_client = SearchIndexerClient(endpoint=endpoint, credential=credential)
-indexer_result = indexer_client.create_or_update_indexer(indexer)
+    # Create and run indexer:
+    indexer_client = SearchIndexerClient(endpoint=endpoint, credential=credential)
+    indexer_result = indexer_client.create_or_update_indexer(indexer)
 
-print(f"{indexer_name} is created and running. Give the indexer a few minutes before running a query.")
+    print(f"{indexer_name} is created and running. Give the indexer a few minutes before running a query.")
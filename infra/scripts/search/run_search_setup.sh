@@ -18,14 +18,22 @@ cp ../../data/${product_info_file} .
 mkdir product_info && mv ${product_info_file} product_info/
 cd product_info && tar -xvzf ${product_info_file} && cd ..
 
-echo "Uploading files to blob container..."
-az storage blob upload-batch \
-    --auth-mode login \
-    --destination ${blob_container_name} \
-    --account-name ${storage_account_name} \
-    --source "product_info" \
-    --pattern "*.md" \
-    --overwrite
+# Push mode indexes product_info directly and re-embeds only changed documents;
+# indexer mode uploads the documents for the blob indexer:
+export INDEX_MODE=${INDEX_MODE:-push}
+export INDEX_SOURCE_DIR="${script_dir}/product_info"
+export INDEX_MANIFEST_PATH=${INDEX_MANIFEST_PATH:-"${script_dir}/index_manifest.json"}
+
+if [ "${INDEX_MODE}" != "push" ]; then
+    echo "Uploading files to blob container..."
+    az storage blob upload-batch \
+        --auth-mode login \
+        --destination ${blob_container_name} \
+        --account-name ${storage_account_name} \
+        --source "product_info" \
+        --pattern "*.md" \
+        --overwrite
+fi
 
 echo "Installing requirements..."
 python3 -m pip install -r requirements.txt
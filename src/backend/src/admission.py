@@ -0,0 +1,146 @@
+"""
+admission.py - Admission control and load shedding for request handlers.
+
+Limits requests in flight per process, queues a bounded number of waiters
+with a deadline, and rejects early (503 + Retry-After) when the expected
+queue wait would exceed the SLO. Waiters are admitted by fewest in-flight
+requests per client, so one heavy client cannot starve the rest.
+
+Under the gthread launcher a request only reaches the controller once it
+holds one of the worker's WEB_THREADS threads, and a queued waiter keeps
+holding it. The default limits are therefore derived from WEB_THREADS:
+half the threads run admitted requests, a quarter wait in the queue, and
+the rest stay free to answer 503s instead of leaving overload in the
+listen backlog.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict
+
+WEB_THREADS = int(os.getenv("WEB_THREADS", "32"))
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", str(max(1, WEB_THREADS // 2))))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", str(WEB_THREADS // 4)))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
+ADMISSION_MAX_PER_CLIENT = int(os.getenv("ADMISSION_MAX_PER_CLIENT", "4"))
+ADMISSION_MAX_QUEUED_PER_CLIENT = int(os.getenv("ADMISSION_MAX_QUEUED_PER_CLIENT", "8"))
+
+# EWMA weight for observed service time
+_SERVICE_TIME_ALPHA = 0.2
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class _Waiter:
+    __slots__ = ("client_id", "event", "admitted")
+
+    def __init__(self, client_id: str):
+        self.client_id = client_id
+        self.event = threading.Event()
+        self.admitted = False
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_in_flight: int = ADMISSION_MAX_IN_FLIGHT,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+        max_per_client: int = ADMISSION_MAX_PER_CLIENT,
+        max_queued_per_client: int = ADMISSION_MAX_QUEUED_PER_CLIENT,
+        initial_service_time: float = 1.0
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_per_client = max_per_client
+        self.max_queued_per_client = max_queued_per_client
+        self.service_time = initial_service_time
+        self.in_flight = 0
+        self._per_client: Dict[str, int] = {}
+        self._waiters: deque = deque()
+        self._lock = threading.Lock()
+
+    def _can_admit(self, client_id: str) -> bool:
+        return (self.in_flight < self.max_in_flight
+                and self._per_client.get(client_id, 0) < self.max_per_client)
+
+    def _admit(self, client_id: str) -> None:
+        self.in_flight += 1
+        self._per_client[client_id] = self._per_client.get(client_id, 0) + 1
+
+    def _expected_wait(self, queue_position: int) -> float:
+        return (queue_position + 1) * self.service_time / max(self.max_in_flight, 1)
+
+    def acquire(self, client_id: str, timeout: float = None) -> float:
+        """
+        Blocks until admitted (at most queue_timeout, or timeout if shorter);
+        returns the admission time. Raises AdmissionRejected.
+        """
+        wait_limit = self.queue_timeout if timeout is None else min(timeout, self.queue_timeout)
+        with self._lock:
+            # Admit immediately unless a queued waiter could take this slot
+            if self._can_admit(client_id) and not any(self._can_admit(w.client_id) for w in self._waiters):
+                self._admit(client_id)
+                return time.monotonic()
+            if len(self._waiters) >= self.max_queue:
+                raise AdmissionRejected("queue full", self._expected_wait(len(self._waiters)))
+            if sum(1 for w in self._waiters if w.client_id == client_id) >= self.max_queued_per_client:
+                raise AdmissionRejected("client queue share exceeded", self._expected_wait(len(self._waiters)))
+            expected = self._expected_wait(len(self._waiters))
+            if expected > wait_limit:
+                raise AdmissionRejected("expected wait exceeds SLO", expected)
+            waiter = _Waiter(client_id)
+            self._waiters.append(waiter)
+
+        waiter.event.wait(wait_limit)
+        with self._lock:
+            if waiter.admitted:
+                return time.monotonic()
+            # Timed out; if admitted concurrently the flag above would be set
+            self._waiters.remove(waiter)
+            raise AdmissionRejected("queue timeout", self._expected_wait(len(self._waiters)))
+
+    def release(self, client_id: str, admitted_at: float) -> None:
+        elapsed = time.monotonic() - admitted_at
+        with self._lock:
+            self.in_flight -= 1
+            remaining = self._per_client.get(client_id, 1) - 1
+            if remaining > 0:
+                self._per_client[client_id] = remaining
+            else:
+                self._per_client.pop(client_id, None)
+            self.service_time += _SERVICE_TIME_ALPHA * (elapsed - self.service_time)
+            self._dispatch()
+
+    def _dispatch(self) -> None:
+        # Admit waiters while capacity allows, preferring clients with the fewest requests in flight
+        while self._waiters and self.in_flight < self.max_in_flight:
+            candidates = [w for w in self._waiters if self._can_admit(w.client_id)]
+            if not candidates:
+                return
+            waiter = min(candidates, key=lambda w: self._per_client.get(w.client_id, 0))
+            self._waiters.remove(waiter)
+            self._admit(waiter.client_id)
+            waiter.admitted = True
+            waiter.event.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": self.in_flight,
+                "queued": len(self._waiters),
+                "service_time": round(self.service_time, 3),
+            }
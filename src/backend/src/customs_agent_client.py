@@ -2,43 +2,238 @@
 
 from azure.ai.projects import AIProjectClient
 from azure.identity import DefaultAzureCredential
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import os
+import threading
+import time
+
+TERMINAL_RUN_STATUSES = {"completed", "failed", "cancelled", "expired", "requires_action"}
+
+class AgentRunError(RuntimeError):
+    """
+    An agent run ended in a status other than completed.
+    """
+    def __init__(self, run):
+        self.status = run.status
+        self.last_error = getattr(run, "last_error", None)
+        super().__init__(f"Agent run {run.id} ended with status '{run.status}'"
+                         + (f": {self.last_error}" if self.last_error else ""))
 
 class CustomsAgentClient:
-    def __init__(self, conn_str=None, agent_id=None, thread_id=None, credential=None, api_key=None):
+    def __init__(self, conn_str=None, agent_id=None, thread_id=None, credential=None, api_key=None,
+                 project_client=None, max_threads=None, poll_interval=0.1, max_poll_interval=1.0):
         self.conn_str = conn_str or os.environ.get("US_CUSTOMS_AGENT_CONN_STR")
         self.agent_id = agent_id or os.environ.get("US_CUSTOMS_AGENT_ID")
         self.thread_id = thread_id or os.environ.get("US_CUSTOMS_AGENT_THREAD_ID")
         self.api_key = api_key or os.environ.get("US_CUSTOMS_AGENT_API_KEY")
-        self.credential = credential or DefaultAzureCredential()
-        # If API key is required, pass it as a 'key' argument if supported
-        # If not supported, document how to use it
+        self.max_threads = max_threads or int(os.environ.get("US_CUSTOMS_AGENT_MAX_THREADS", "1000"))
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        if project_client is not None:
+            # Injected client (e.g. a local stand-in for the agents API)
+            self.project_client = project_client
+        else:
+            self.credential = credential or DefaultAzureCredential()
+            # If API key is required, pass it as a 'key' argument if supported
+            # If not supported, document how to use it
+            try:
+                self.project_client = AIProjectClient.from_connection_string(
+                    credential=self.credential,
+                    conn_str=self.conn_str,
+                    key=self.api_key
+                )
+            except TypeError:
+                # Fallback: if 'key' is not a valid argument, document usage
+                self.project_client = AIProjectClient.from_connection_string(
+                    credential=self.credential,
+                    conn_str=self.conn_str
+                )
+                # If the SDK requires passing the API key in another way, please consult the documentation.
+        self.agent = self.project_client.agents.get_agent(self.agent_id)
+        self.thread = self.project_client.agents.get_thread(self.thread_id) if self.thread_id else None
+
+        # user_id -> thread_id (LRU); one run at a time per thread
+        self._user_threads = OrderedDict()
+        # thread_id -> [lock, requests using it]; evicted threads keep theirs until the last request finishes
+        self._thread_locks = {}
+        self._evicted_threads = set()
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def get_thread_id(self, user_id: str = None) -> str:
+        """Returns the pooled thread for a user, creating it on first use.
+
+        Without a user_id the shared US_CUSTOMS_AGENT_THREAD_ID thread is used.
+        """
+        if user_id is None:
+            if self.thread is None:
+                raise ValueError("No user_id given and US_CUSTOMS_AGENT_THREAD_ID is not set.")
+            return self.thread.id
+        with self._lock:
+            thread_id = self._user_threads.get(user_id)
+            if thread_id is not None:
+                self._user_threads.move_to_end(user_id)
+                return thread_id
+        thread_id = self.project_client.agents.create_thread().id
+        with self._lock:
+            # Another request may have created one concurrently; keep the first.
+            thread_id = self._user_threads.setdefault(user_id, thread_id)
+            self._user_threads.move_to_end(user_id)
+            while len(self._user_threads) > self.max_threads:
+                _, evicted = self._user_threads.popitem(last=False)
+                entry = self._thread_locks.get(evicted)
+                if entry is not None and entry[1] > 0:
+                    self._evicted_threads.add(evicted)
+                else:
+                    self._thread_locks.pop(evicted, None)
+        return thread_id
+
+    @contextmanager
+    def _locked_thread(self, thread_id: str):
+        # Serializes runs on a thread; the lock is only dropped once no request holds or waits for it
+        with self._lock:
+            entry = self._thread_locks.setdefault(thread_id, [threading.Lock(), 0])
+            entry[1] += 1
         try:
-            self.project_client = AIProjectClient.from_connection_string(
-                credential=self.credential,
-                conn_str=self.conn_str,
-                key=self.api_key
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0 and thread_id in self._evicted_threads:
+                    self._evicted_threads.discard(thread_id)
+                    self._thread_locks.pop(thread_id, None)
+
+    def _wait_for_run(self, thread_id: str, run):
+        # Poll with exponential backoff instead of a fixed one-second sleep
+        interval = self.poll_interval
+        while run.status not in TERMINAL_RUN_STATUSES:
+            time.sleep(interval)
+            interval = min(interval * 2, self.max_poll_interval)
+            run = self.project_client.agents.get_run(thread_id=thread_id, run_id=run.id)
+        return run
+
+    def _messages_after(self, thread_id: str, after: str):
+        # Only messages newer than `after`, oldest first, following pagination
+        messages = []
+        while True:
+            page = self.project_client.agents.list_messages(thread_id=thread_id, order="asc", after=after)
+            messages.extend(page.text_messages)
+            if not page.has_more or not page.last_id:
+                return messages
+            after = page.last_id
+
+    def send_message(self, message: str, role: str = "user", user_id: str = None):
+        """Posts a message, runs the agent and returns only the messages added after it.
+
+        Raises AgentRunError if the run fails, is cancelled, expires or requires action.
+        """
+        thread_id = self.get_thread_id(user_id)
+        with self._locked_thread(thread_id):
+            created = self.project_client.agents.create_message(
+                thread_id=thread_id,
+                role=role,
+                content=message
             )
-        except TypeError:
-            # Fallback: if 'key' is not a valid argument, document usage
-            self.project_client = AIProjectClient.from_connection_string(
-                credential=self.credential,
-                conn_str=self.conn_str
+            run = self.project_client.agents.create_run(
+                thread_id=thread_id,
+                agent_id=self.agent.id)
+            run = self._wait_for_run(thread_id, run)
+            if run.status != "completed":
+                raise AgentRunError(run)
+            messages = self._messages_after(thread_id, created.id)
+        # Return new text messages as dicts
+        return [msg.as_dict() for msg in messages]
+
+    def send_message_async(self, message: str, role: str = "user", user_id: str = None):
+        """Runs send_message in the background; returns a concurrent.futures.Future."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(thread_name_prefix="customs-agent")
+        return self._executor.submit(self.send_message, message, role, user_id)
+
+    def stream_message(self, message: str, role: str = "user", user_id: str = None):
+        """Posts a message and yields assistant text deltas as the run streams them."""
+        thread_id = self.get_thread_id(user_id)
+        with self._locked_thread(thread_id):
+            self.project_client.agents.create_message(
+                thread_id=thread_id,
+                role=role,
+                content=message
             )
-            # If the SDK requires passing the API key in another way, please consult the documentation.
-        self.agent = self.project_client.agents.get_agent(self.agent_id)
-        self.thread = self.project_client.agents.get_thread(self.thread_id)
-
-    def send_message(self, message: str, role: str = "user"):
-        self.project_client.agents.create_message(
-            thread_id=self.thread.id,
-            role=role,
-            content=message
-        )
-        run = self.project_client.agents.create_and_process_run(
-            thread_id=self.thread.id,
-            agent_id=self.agent.id)
-        messages = self.project_client.agents.list_messages(thread_id=self.thread.id)
-        # Return all text messages as dicts
-        return [msg.as_dict() for msg in messages.text_messages]
+            with self.project_client.agents.create_stream(thread_id=thread_id, agent_id=self.agent.id) as stream:
+                for event_type, event_data, _ in stream:
+                    if event_type == "thread.message.delta" and getattr(event_data, "text", None):
+                        yield event_data.text
+
+
+if __name__ == "__main__":
+    # Local stand-in for the agents API: shows that per-turn retrieval stays
+    # constant as the thread grows, and that users get separate threads.
+    import itertools
+    from types import SimpleNamespace
+
+    class FakeMessage(SimpleNamespace):
+        def as_dict(self):
+            return {"id": self.id, "role": self.role, "content": self.content}
+
+    class FakeAgents:
+        def __init__(self, latency=0.02):
+            self.latency = latency
+            self.ids = itertools.count(1)
+            self.threads = {}
+            self.runs = {}
+            self.listed = 0
+
+        def get_agent(self, agent_id):
+            return SimpleNamespace(id=agent_id)
+
+        def get_thread(self, thread_id):
+            self.threads.setdefault(thread_id, [])
+            return SimpleNamespace(id=thread_id)
+
+        def create_thread(self):
+            thread_id = f"thread_{next(self.ids)}"
+            self.threads[thread_id] = []
+            return SimpleNamespace(id=thread_id)
+
+        def create_message(self, thread_id, role, content):
+            msg = FakeMessage(id=f"msg_{next(self.ids):06d}", role=role, content=content)
+            self.threads[thread_id].append(msg)
+            return msg
+
+        def create_run(self, thread_id, agent_id):
+            run = SimpleNamespace(id=f"run_{next(self.ids)}", status="queued", done_at=time.monotonic() + self.latency)
+            self.runs[run.id] = (thread_id, run)
+            return run
+
+        def get_run(self, thread_id, run_id):
+            _, run = self.runs[run_id]
+            if run.status != "completed" and time.monotonic() >= run.done_at:
+                question = self.threads[thread_id][-1].content
+                self.create_message(thread_id, "assistant", f"answer to {question}")
+                run.status = "completed"
+            return run
+
+        def list_messages(self, thread_id, order="desc", after=None, limit=20):
+            msgs = self.threads[thread_id]
+            if after is not None:
+                msgs = [m for m in msgs if m.id > after]
+            page = msgs[:limit]
+            self.listed += len(page)
+            return SimpleNamespace(text_messages=page, has_more=len(msgs) > limit,
+                                   last_id=page[-1].id if page else None)
 
+    fake = FakeAgents()
+    client = CustomsAgentClient(agent_id="agent", thread_id="shared",
+                                project_client=SimpleNamespace(agents=fake))
+    for turn in range(1, 51):
+        before = fake.listed
+        start = time.perf_counter()
+        new_messages = client.send_message(f"question {turn}", user_id="alice")
+        if turn in (1, 10, 50):
+            print(f"turn {turn:>2}: {fake.listed - before} messages retrieved, "
+                  f"{(time.perf_counter() - start) * 1000:.1f} ms, last: {new_messages[-1]['content']}")
+    print(f"alice -> {client.get_thread_id('alice')}, bob -> {client.get_thread_id('bob')}")
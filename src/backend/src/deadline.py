@@ -0,0 +1,51 @@
+"""
+deadline.py - Request deadline propagated through router and upstream calls.
+
+Each hop asks the deadline for its timeout instead of using a fixed value,
+so the total time spent on a request never exceeds the caller's budget.
+"""
+
+import os
+import time
+from typing import Optional
+
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "60"))
+# Never start an upstream call with less time than this left
+MIN_HOP_TIMEOUT = 0.05
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class Deadline:
+    def __init__(self, seconds: float = REQUEST_DEADLINE_SECONDS):
+        self.budget = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    @classmethod
+    def from_header(cls, value: Optional[str], maximum: float = REQUEST_DEADLINE_SECONDS) -> "Deadline":
+        """Parses a caller timeout in seconds (e.g. X-Request-Timeout), capped at the server maximum."""
+        try:
+            seconds = float(value)
+        except (TypeError, ValueError):
+            return cls(maximum)
+        return cls(min(max(seconds, 0.0), maximum))
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() < MIN_HOP_TIMEOUT
+
+    def check(self, stage: str = "") -> None:
+        """Raises DeadlineExceeded if too little time is left to start another hop."""
+        if self.expired:
+            raise DeadlineExceeded(f"Request deadline of {self.budget:g}s exceeded{' before ' + stage if stage else ''}.")
+
+    def timeout(self, cap: Optional[float] = None, stage: str = "") -> float:
+        """Timeout for the next hop: the remaining budget, optionally capped."""
+        self.check(stage)
+        remaining = self.remaining()
+        return min(cap, remaining) if cap is not None else remaining
@@ -0,0 +1,205 @@
+"""
+hts_index.py - Local HTSUS schedule index for tariff number lookup, browse and validation.
+
+Loads the USITC HTS export (JSON or CSV) into a sorted array of digit-only
+codes with parallel row data, so exact lookups and prefix browsing are a
+binary search rather than an LLM call.
+"""
+
+import bisect
+import csv
+import json
+import logging
+import os
+import re
+import threading
+from typing import List, Dict, Any, Optional, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+HTS_SCHEDULE_PATH = os.getenv("HTS_SCHEDULE_PATH")
+
+# Valid HTS code lengths: heading, subheading, rate line, statistical suffix
+HTS_CODE_LENGTHS = (4, 6, 8, 10)
+_NON_DIGIT = re.compile(r"[^0-9]")
+_HTS_TOKEN = re.compile(r"^\s*\d{2,4}(?:[.\s]?\d{2}){0,3}\s*$")
+
+# Column names in the USITC JSON and CSV exports
+_FIELD_ALIASES = {
+    "code": ("htsno", "HTS Number"),
+    "indent": ("indent", "Indent"),
+    "description": ("description", "Description"),
+    "general": ("general", "General Rate of Duty"),
+    "special": ("special", "Special Rate of Duty"),
+    "other": ("other", "Column 2 Rate of Duty"),
+}
+
+
+class HtsEntry(NamedTuple):
+    code: str
+    description: str
+    full_description: str
+    general: str
+    special: str
+    other: str
+
+
+def normalize_hts_code(code: str) -> Optional[str]:
+    """
+    Returns the digit-only form of an HTS number ("6109.10.0012" -> "6109100012"),
+    or None if it is not a well-formed heading/subheading/rate line/statistical code.
+    """
+    if not code or not _HTS_TOKEN.match(code):
+        return None
+    digits = _NON_DIGIT.sub("", code)
+    return digits if len(digits) in HTS_CODE_LENGTHS else None
+
+
+def format_hts_code(digits: str) -> str:
+    """Formats digit-only codes in dotted HTSUS form, e.g. "6109.10.00.12"."""
+    parts = [digits[:4]] + [digits[i:i + 2] for i in range(4, len(digits), 2)]
+    return ".".join(parts)
+
+
+def _field(row: Dict[str, Any], name: str) -> str:
+    for alias in _FIELD_ALIASES[name]:
+        value = row.get(alias)
+        if value not in (None, ""):
+            return str(value).strip()
+    return ""
+
+
+class HtsIndex:
+    """
+    Sorted-array index over HTS codes. Prefix browse is a bisect over the code
+    array; duty rates are inherited from the nearest ancestor that defines one.
+    """
+
+    def __init__(self, rows: List[Dict[str, Any]]):
+        entries = {}
+        # Ancestor descriptions by indent level, including label rows without a code
+        stack: List[tuple] = []
+        for row in rows:
+            description = _field(row, "description")
+            try:
+                indent = int(_field(row, "indent") or 0)
+            except ValueError:
+                indent = 0
+            while stack and stack[-1][0] >= indent:
+                stack.pop()
+            stack.append((indent, description))
+
+            digits = normalize_hts_code(_field(row, "code"))
+            if not digits:
+                continue
+            entries[digits] = (
+                description,
+                " > ".join(d for _, d in stack if d),
+                _field(row, "general"),
+                _field(row, "special"),
+                _field(row, "other"),
+            )
+
+        self._codes: List[str] = sorted(entries)
+        self._rows: List[tuple] = [entries[c] for c in self._codes]
+        logger.info(f"Built HTS index with {len(self._codes)} codes.")
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def _position(self, digits: str) -> int:
+        i = bisect.bisect_left(self._codes, digits)
+        return i if i < len(self._codes) and self._codes[i] == digits else -1
+
+    def _entry(self, i: int) -> HtsEntry:
+        digits = self._codes[i]
+        description, full_description, general, special, other = self._rows[i]
+        if not general:
+            # Statistical suffixes usually inherit the rate of their 8-digit line
+            for length in (8, 6, 4):
+                j = self._position(digits[:length]) if length < len(digits) else -1
+                if j >= 0 and self._rows[j][2]:
+                    general, special, other = self._rows[j][2:]
+                    break
+        return HtsEntry(format_hts_code(digits), description, full_description, general, special, other)
+
+    def lookup(self, code: str) -> Optional[HtsEntry]:
+        """Exact lookup of a heading/subheading/rate line/statistical code."""
+        digits = normalize_hts_code(code)
+        if digits is None:
+            return None
+        i = self._position(digits)
+        return self._entry(i) if i >= 0 else None
+
+    def browse(self, prefix: str, limit: int = 20) -> List[HtsEntry]:
+        """Codes under a prefix (e.g. "8471" or "61"), in schedule order."""
+        digits = _NON_DIGIT.sub("", prefix or "")
+        start = bisect.bisect_left(self._codes, digits)
+        end = bisect.bisect_left(self._codes, digits + "\x7f", lo=start)
+        return [self._entry(i) for i in range(start, min(end, start + limit))]
+
+    def validate(self, code: str) -> Optional[str]:
+        """Returns the dotted form of a code present in the schedule, else None."""
+        digits = normalize_hts_code(code)
+        if digits is None or self._position(digits) < 0:
+            return None
+        return format_hts_code(digits)
+
+
+def load_hts_index(path: str) -> HtsIndex:
+    """Loads a USITC HTS export (.json list of rows, or .csv) into an HtsIndex."""
+    with open(path, "r", encoding="utf-8-sig") as fp:
+        if path.lower().endswith(".csv"):
+            rows = list(csv.DictReader(fp))
+        else:
+            rows = json.load(fp)
+    return HtsIndex(rows)
+
+
+_index: Optional[HtsIndex] = None
+_index_loaded = False
+_load_lock = threading.Lock()
+
+
+def get_hts_index() -> Optional[HtsIndex]:
+    """Returns the index from HTS_SCHEDULE_PATH (loaded once), or None if unavailable."""
+    global _index, _index_loaded
+    if not _index_loaded:
+        with _load_lock:
+            if not _index_loaded:
+                if HTS_SCHEDULE_PATH:
+                    try:
+                        _index = load_hts_index(HTS_SCHEDULE_PATH)
+                    except (OSError, ValueError) as e:
+                        logger.error(f"Could not load HTS schedule from {HTS_SCHEDULE_PATH}: {e}")
+                # Only marked loaded once _index is final, so unlocked readers never see it early
+                _index_loaded = True
+    return _index
+
+
+if __name__ == "__main__":
+    import sys
+    import timeit
+
+    if len(sys.argv) > 1:
+        index = load_hts_index(sys.argv[1])
+    else:
+        # Synthetic schedule of ~30k rows, roughly the size of the real HTSUS
+        rows = []
+        for heading in range(100, 9800, 1):
+            h = f"{heading:04d}"
+            rows.append({"htsno": h, "indent": 0, "description": f"Heading {h}"})
+            rows.append({"htsno": f"{h}.10.00", "indent": 1, "description": "Of cotton", "general": "Free"})
+            rows.append({"htsno": f"{h}.10.00.10", "indent": 2, "description": "Men's"})
+        index = HtsIndex(rows)
+
+    sample = index.browse("")[:1][0].code if len(index) else "0100"
+    runs = 100_000
+    for label, fn in [
+        ("lookup", lambda: index.lookup(sample)),
+        ("browse", lambda: index.browse(sample[:2], limit=10)),
+        ("validate", lambda: index.validate(sample)),
+    ]:
+        t = timeit.timeit(fn, number=runs) / runs
+        print(f"{label:>8}: {t * 1e6:.2f} us")
+    print(index.lookup(sample))
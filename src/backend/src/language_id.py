@@ -0,0 +1,156 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+import os
+import re
+from typing import NamedTuple
+
+"""
+Fast local language identification.
+
+Unicode script detection for non-Latin text, plus function-word and
+diacritic evidence for common Latin-script languages. Intended as a cheap
+first pass; callers fall back to Azure AI Language when `confidence` is
+below threshold.
+"""
+
+CONFIDENCE_THRESHOLD = float(os.environ.get("LANGUAGE_ID_CONFIDENCE_THRESHOLD", "0.7"))
+
+
+class LanguageGuess(NamedTuple):
+    """
+    Local language identification result (ISO 639-1 code).
+    """
+    language: str
+    confidence: float
+
+
+# Frequent words per language; English includes customs domain vocabulary,
+# since most of our short queries have few function words:
+_LEXICONS = {
+    "en": """the a an and or of to in on for with is are was be it this that what which
+        how do does can i my me you your we our please about from by at as not any
+        hts tariff code classification classify heading subheading duty import
+        export customs ruling rulings item product goods""",
+    "es": """el la los las un una y o de del en para con es son que qué cuál cómo por
+        mi su se al lo como más pero está código arancel clasificación""",
+    "fr": """le la les un une et ou de des du en pour avec est sont que quel quelle
+        comment par mon ma mes au aux ce cette je vous nous code tarif douane""",
+    "de": """der die das ein eine und oder von zu im mit ist sind was welche wie für
+        auf den dem des ich mein sie nicht zoll tarifnummer einfuhr""",
+    "pt": """o a os as um uma e ou de do da dos das em para com é são que qual como
+        por meu minha não código tarifa classificação importação""",
+    "it": """il lo la gli le un una e o di del della in per con è sono che quale come
+        mio mia non codice tariffa classificazione dogana""",
+    "nl": """de het een en of van in voor met is zijn wat welke hoe mijn niet op te
+        code douane invoer"""
+}
+_LEXICONS = {lang: frozenset(words.split()) for lang, words in _LEXICONS.items()}
+
+# Word -> {language: weight}; words shared by several languages count less:
+_WORD_WEIGHTS = dict()
+for _language, _lexicon in _LEXICONS.items():
+    for _word in _lexicon:
+        _WORD_WEIGHTS.setdefault(_word, []).append(_language)
+_WORD_WEIGHTS = {
+    word: {language: 1.0 / len(languages) for language in languages}
+    for word, languages in _WORD_WEIGHTS.items()
+}
+
+_DIACRITICS = {
+    "es": "ñ¿¡",
+    "fr": "çèêëîïûœ",
+    "de": "ßäöü",
+    "pt": "ãõ",
+    "it": "ìò"
+}
+
+# (code point ranges, language, confidence); ambiguous scripts get low confidence:
+_SCRIPTS = [
+    (((0x3040, 0x30FF),), "ja", 0.95),
+    (((0xAC00, 0xD7AF), (0x1100, 0x11FF)), "ko", 0.95),
+    (((0x4E00, 0x9FFF),), "zh", 0.8),
+    (((0x0E00, 0x0E7F),), "th", 0.95),
+    (((0x0370, 0x03FF),), "el", 0.95),
+    (((0x0590, 0x05FF),), "he", 0.95),
+    (((0x0900, 0x097F),), "hi", 0.8),
+    (((0x0400, 0x04FF),), "ru", 0.6),
+    (((0x0600, 0x06FF),), "ar", 0.6)
+]
+
+_WORD_REGEX = re.compile(r"[^\W\d_]+")
+
+
+def _detect_script(
+    text: str
+) -> LanguageGuess:
+    """
+    Identify language from dominant non-Latin script, if any.
+    """
+    letters = [c for c in text if c.isalpha()]
+    if not letters or all(ord(c) < 0x0250 for c in letters):
+        return None
+
+    for ranges, language, confidence in _SCRIPTS:
+        count = sum(
+            1 for c in letters
+            if any(lo <= ord(c) <= hi for lo, hi in ranges)
+        )
+        # Kana is decisive for Japanese even alongside Han characters:
+        if count and (language == "ja" or count * 2 >= len(letters)):
+            return LanguageGuess(language, confidence)
+
+    return None
+
+
+def identify(
+    text: str
+) -> LanguageGuess:
+    """
+    Identify language of text locally.
+    """
+    guess = _detect_script(text)
+    if guess is not None:
+        return guess
+
+    lowered = text.lower()
+    scores = dict.fromkeys(_LEXICONS, 0.0)
+
+    for word in _WORD_REGEX.findall(lowered):
+        for language, weight in _WORD_WEIGHTS.get(word, {}).items():
+            scores[language] += weight
+
+    for language, chars in _DIACRITICS.items():
+        if any(c in lowered for c in chars):
+            scores[language] += 2.0
+
+    total = sum(scores.values())
+    if total == 0:
+        return LanguageGuess("en", 0.0)
+
+    language = max(scores, key=scores.get)
+    top = scores[language]
+
+    # Share of evidence for the winner, discounted when evidence is thin:
+    confidence = (top / total) * (0.5 + 0.5 * min(1.0, top / 2))
+    return LanguageGuess(language, round(confidence, 3))
+
+
+if __name__ == "__main__":
+    import timeit
+
+    samples = [
+        "What is the HTS code for a cotton t-shirt?",
+        "classify leather handbags",
+        "¿Cuál es el código arancelario de una camiseta de algodón?",
+        "Quel est le code tarifaire pour un sac en cuir ?",
+        "Was ist die Zolltarifnummer für ein Baumwoll-T-Shirt?",
+        "綿のTシャツのHTSコードは何ですか？",
+        "Какой код ТН ВЭД для хлопковой футболки?",
+        "laptop"
+    ]
+    for sample in samples:
+        print(f"{identify(sample)}  {sample}")
+
+    runs = 100_000
+    t = timeit.timeit(lambda: identify(samples[0]), number=runs) / runs
+    print(f"identify: {t * 1e6:.1f} us per message")
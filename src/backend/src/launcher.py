@@ -0,0 +1,154 @@
+"""
+launcher.py - Production entry point: preforking gunicorn server for the Flask app.
+
+    python launcher.py                 # serve with settings from the environment
+    python launcher.py --benchmark     # throughput vs. worker count against mock upstreams
+
+The app and its shared read-only state are loaded once in the master
+(preload) so forked workers share those pages copy-on-write. SIGHUP
+gracefully restarts workers; SIGTERM drains in-flight requests for up to
+GRACEFUL_TIMEOUT seconds.
+"""
+
+import logging
+import multiprocessing
+import os
+import sys
+
+from gunicorn.app.base import BaseApplication
+
+from admission import ADMISSION_MAX_IN_FLIGHT, ADMISSION_MAX_QUEUE, WEB_THREADS
+
+logger = logging.getLogger(__name__)
+
+
+def default_options() -> dict:
+    workers = int(os.getenv("WEB_WORKERS", str(multiprocessing.cpu_count() * 2 + 1)))
+    return {
+        "bind": os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '7000')}"),
+        "workers": workers,
+        # Threads let one worker overlap several upstream calls; admission limits are derived from them
+        "threads": WEB_THREADS,
+        "worker_class": "gthread",
+        "preload_app": True,
+        # Longer than the Prompt Flow request timeout
+        "timeout": int(os.getenv("WORKER_TIMEOUT", "90")),
+        "graceful_timeout": int(os.getenv("GRACEFUL_TIMEOUT", "30")),
+        "keepalive": int(os.getenv("KEEPALIVE", "5")),
+        # Recycle workers periodically; jitter avoids restarting all at once
+        "max_requests": int(os.getenv("MAX_REQUESTS", "5000")),
+        "max_requests_jitter": int(os.getenv("MAX_REQUESTS_JITTER", "500")),
+        "accesslog": os.getenv("ACCESS_LOG", None),
+        "loglevel": os.getenv("LOG_LEVEL", "info"),
+    }
+
+
+class CustomsApplication(BaseApplication):
+    def __init__(self, options: dict = None):
+        self.options = {**default_options(), **(options or {})}
+        if ADMISSION_MAX_IN_FLIGHT + ADMISSION_MAX_QUEUE >= self.options["threads"]:
+            logger.warning(f"ADMISSION_MAX_IN_FLIGHT + ADMISSION_MAX_QUEUE ({ADMISSION_MAX_IN_FLIGHT + ADMISSION_MAX_QUEUE}) "
+                           f"leave none of the {self.options['threads']} threads per worker to reject overload; "
+                           f"excess requests will wait in the listen backlog instead of getting 503.")
+        if self.options["workers"] > 1 and not os.getenv("SESSION_REDIS_URL"):
+            logger.warning(f"{self.options['workers']} workers without SESSION_REDIS_URL: conversation history is "
+                           f"per worker, so follow-ups need sticky routing or a shared Redis session store.")
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if value is not None and key in self.cfg.settings:
+                self.cfg.set(key, value)
+
+    def load(self):
+        # Runs once in the master when preload_app is set
+        from server import app, warm_up
+        warm_up()
+        return app
+
+
+def run_benchmark(duration: float = 5.0, concurrency: int = 32, upstream_latency: float = 0.02) -> None:
+    """Measures requests/s for 1..cpu_count workers with mock CROSS and Prompt Flow upstreams."""
+    import http.server
+    import json
+    import socketserver
+    import subprocess
+    import threading
+    import time
+    import urllib.request
+    from concurrent.futures import ThreadPoolExecutor
+
+    class MockUpstream(http.server.BaseHTTPRequestHandler):
+        def _reply(self, payload: dict):
+            time.sleep(upstream_latency)
+            body = json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            ruling = {"rulingNumber": "N1", "rulingDate": "2020-01-01T00:00:00", "subject": "cotton t-shirt",
+                      "tariffs": ["6109.10.0012"], "url": "https://rulings.cbp.gov/ruling/N1"}
+            self._reply({"rulings": [dict(ruling, rulingNumber=f"N{i}") for i in range(30)]})
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self._reply({"output": "Mock Prompt Flow answer."})
+
+        def log_message(self, *args):
+            pass
+
+    class ThreadedServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+        daemon_threads = True
+
+    upstream = ThreadedServer(("127.0.0.1", 0), MockUpstream)
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    upstream_url = f"http://127.0.0.1:{upstream.server_address[1]}"
+
+    messages = [b'{"message": "What is the HTS classification of a cotton t-shirt?"}',
+                b'{"message": "What documents do I need to import textiles?"}']
+    app_port = 7901
+    print(f"{'workers':>8} {'req/s':>10}  (cpu_count={multiprocessing.cpu_count()}, concurrency={concurrency})")
+    for workers in [w for w in sorted({1, 2, 4, multiprocessing.cpu_count()}) if w <= multiprocessing.cpu_count()]:
+        env = dict(os.environ, WEB_WORKERS=str(workers), BIND=f"127.0.0.1:{app_port}", LOG_LEVEL="warning",
+                   AZURE_PROMPT_FLOW_ENDPOINT=f"{upstream_url}/score", AZURE_PROMPT_FLOW_API_KEY="benchmark",
+                   CROSS_API_URL=f"{upstream_url}/api/search")
+        proc = subprocess.Popen([sys.executable, __file__], env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+                                stderr=subprocess.DEVNULL)
+        try:
+            for _ in range(100):
+                try:
+                    urllib.request.urlopen(f"http://127.0.0.1:{app_port}/healthz", timeout=1)
+                    break
+                except OSError:
+                    time.sleep(0.1)
+
+            deadline = time.monotonic() + duration
+            counts = [0] * concurrency
+
+            def client(n: int):
+                i = 0
+                while time.monotonic() < deadline:
+                    request = urllib.request.Request(f"http://127.0.0.1:{app_port}/api/customs/ask",
+                                                     data=messages[i % len(messages)],
+                                                     headers={"Content-Type": "application/json"})
+                    urllib.request.urlopen(request, timeout=30).read()
+                    counts[n] += 1
+                    i += 1
+
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                list(pool.map(client, range(concurrency)))
+            print(f"{workers:>8} {sum(counts) / duration:>10.1f}")
+        finally:
+            proc.terminate()
+            proc.wait()
+    upstream.shutdown()
+
+
+if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        run_benchmark()
+    else:
+        CustomsApplication().run()
@@ -0,0 +1,175 @@
+"""
+log_config.py - Non-blocking, structured, sampled logging.
+
+Request threads only put LogRecords on an in-memory queue; a background
+listener thread formats and writes them. Messages use lazy %-style
+arguments, so records dropped by level or sampling are never formatted,
+and full upstream payloads are logged at DEBUG only.
+
+    LOG_LEVEL=info             # root level
+    LOG_FORMAT=json            # json (one object per line) | text
+    LOG_SAMPLE_RATES=customs.request=0.1,cross.query=0.5
+
+Sampling applies per event (the "event" extra) and only below WARNING.
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from typing import Dict
+
+import serialization
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "info").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Attributes every LogRecord has; anything else came from `extra`
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener = None
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """Parses "event=rate,event=rate" into a dict; malformed entries are ignored."""
+    rates = {}
+    for item in (spec or "").split(","):
+        event, _, rate = item.partition("=")
+        try:
+            rates[event.strip()] = min(max(float(rate), 0.0), 1.0)
+        except ValueError:
+            continue
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of records per event; warnings and errors always pass."""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(getattr(record, "event", None))
+        return rate is None or random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with timestamp, level, logger, message and extras."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return serialization.dumps(entry).decode("utf-8")
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueues records without formatting them (the stdlib handler formats in
+    the calling thread). The queue is in-process, so arguments are formatted
+    later by the listener; callers must not mutate logged objects afterwards.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def _start_listener(handler: DeferredQueueHandler, target: logging.Handler) -> None:
+    global _listener
+    handler.queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(handler.queue, target, respect_handler_level=True)
+    _listener.start()
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, sample_rates: str = None) -> None:
+    """Installs the queue handler on the root logger; later calls are no-ops."""
+    root = logging.getLogger()
+    if any(isinstance(h, DeferredQueueHandler) for h in root.handlers):
+        return
+
+    target = logging.StreamHandler(sys.stderr)
+    target.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+
+    handler = DeferredQueueHandler(queue.SimpleQueue())
+    handler.addFilter(SamplingFilter(parse_sample_rates(
+        os.getenv("LOG_SAMPLE_RATES", "") if sample_rates is None else sample_rates)))
+    _start_listener(handler, target)
+
+    root.handlers = [handler]
+    root.setLevel(level)
+    atexit.register(stop_logging)
+    # The listener thread does not survive fork (gunicorn workers); restart it in the child
+    os.register_at_fork(after_in_child=lambda: _start_listener(handler, target))
+
+
+def stop_logging() -> None:
+    """Flushes queued records; registered at exit."""
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
+if __name__ == "__main__":
+    import time
+
+    # Per-request logging cost in the calling thread: the old synchronous
+    # f-string/payload pattern vs. lazy, sampled, queued records.
+    response = {
+        "kind": "Conversation",
+        "result": {
+            "query": "what is the tariff for a laptop computer",
+            "prediction": {
+                "topIntent": "classification",
+                "intents": [{"category": f"intent_{i}", "confidenceScore": 0.01 * i} for i in range(40)],
+                "entities": [{"category": "product", "text": "laptop", "offset": 23, "length": 6}] * 10,
+            },
+        },
+    }
+    runs = 20_000
+    devnull = open(os.devnull, "w")
+
+    def per_request(logger: logging.Logger, lazy: bool) -> None:
+        if lazy:
+            logger.info("Calling %s:%s runtime", "project", "deployment", extra={"event": "clu.call"})
+            logger.debug("Runtime response: %s", response)
+            logger.info("Runtime response received", extra={"event": "clu.response", "intents": 40})
+        else:
+            logger.info(f"Calling {'project'}:{'deployment'} runtime")
+            logger.info(f"Runtime response: {response}")
+
+    baseline = logging.getLogger("bench.sync")
+    baseline.propagate = False
+    sync_handler = logging.StreamHandler(devnull)
+    sync_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    baseline.addHandler(sync_handler)
+    baseline.setLevel(logging.INFO)
+
+    configure_logging(level="INFO", sample_rates="clu.call=0.1")
+    _listener.handlers[0].setStream(devnull)
+    queued = logging.getLogger("bench.queued")
+
+    for label, logger, lazy in [("sync f-string payloads", baseline, False), ("queued lazy sampled", queued, True)]:
+        start = time.process_time()
+        wall = time.perf_counter()
+        for _ in range(runs):
+            per_request(logger, lazy)
+        caller = time.perf_counter() - wall
+        if lazy:
+            # Include the listener's formatting work in the CPU total
+            stop_logging()
+        cpu = time.process_time() - start
+        print(f"{label:>24}: caller {caller / runs * 1e6:7.1f} us/request, total CPU {cpu / runs * 1e6:7.1f} us/request")
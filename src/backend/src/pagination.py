@@ -0,0 +1,160 @@
+"""
+pagination.py - Cursor-based "more rulings" paging over cached candidate sets.
+
+The first answer for a search term keeps its full re-ranked candidate page
+in a short-TTL cache and returns an opaque cursor. Follow-ups with the
+cursor page through that set; when fewer than two pages of unseen rulings
+remain, the next upstream CROSS page is fetched in the background so it
+is usually ready before it is needed.
+
+Cursors carry the term, the source term that actually produced results
+(a spelling or synonym alternative when the term itself found nothing)
+and the offset, so a follow-up served by another worker rebuilds the
+candidate set (from the CROSS cache) instead of failing, and later
+upstream pages are fetched for the source term.
+"""
+
+import base64
+import binascii
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import serialization
+from deadline import Deadline
+from query_cache import TTLCache, normalize_query
+
+logger = logging.getLogger(__name__)
+
+PAGINATION_TTL = float(os.getenv("PAGINATION_TTL", "900"))
+PAGINATION_MAX_UPSTREAM_PAGES = int(os.getenv("PAGINATION_MAX_UPSTREAM_PAGES", "5"))
+PREFETCH_WORKERS = 4
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(term: str, source: str, offset: int, page_size: int) -> str:
+    payload = serialization.dumps({"t": term, "s": source, "o": offset, "n": page_size})
+    return base64.urlsafe_b64encode(payload).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str, int, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        state = serialization.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        term, offset, page_size = state["t"], int(state["o"]), int(state["n"])
+        # Cursors issued before source terms were recorded searched the term itself
+        source = state.get("s", term)
+    except (binascii.Error, ValueError, KeyError, TypeError, AttributeError, UnicodeEncodeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {e}") from e
+    if not isinstance(term, str) or not isinstance(source, str) or offset < 0 or not 0 < page_size <= 50:
+        raise InvalidCursor("Invalid cursor")
+    return term, source, offset, page_size
+
+
+class Paginator:
+    """
+    fetch_page(source, page, timeout) returns one upstream page (page >= 2)
+    for the source term; load_first(term, source, deadline) rebuilds page 1
+    as (rulings ranked for term, exhausted) when a cursor arrives for a set
+    this process does not hold.
+    """
+
+    def __init__(
+        self,
+        fetch_page: Callable[[str, int, float], List[Dict[str, Any]]],
+        load_first: Callable[[str, str, Deadline], Tuple[List[Dict[str, Any]], bool]],
+        ttl: float = PAGINATION_TTL
+    ):
+        self.fetch_page = fetch_page
+        self.load_first = load_first
+        self.sets = TTLCache(ttl)
+        self._executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+        self._pending: Dict[Tuple[str, int], Future] = {}
+        self._lock = threading.Lock()
+
+    def start(self, term: str, ranked: List[Dict[str, Any]], exhausted: bool, shown: int,
+              source: str = None) -> Optional[str]:
+        """
+        Caches a fresh candidate set; returns the cursor for the rulings after
+        the first `shown`, if any. source is the term whose search produced
+        ranked, when it was not term itself.
+        """
+        key = normalize_query(term)
+        source = normalize_query(source) if source else key
+        self.sets.set((key, source), self._new_state(ranked, exhausted, source))
+        if shown >= len(ranked) and exhausted:
+            return None
+        self._maybe_prefetch((key, source), shown, shown)
+        return encode_cursor(key, source, shown, shown)
+
+    @staticmethod
+    def _new_state(ranked: List[Dict[str, Any]], exhausted: bool, source: str) -> dict:
+        return {"rulings": list(ranked), "pages": 1, "exhausted": exhausted, "source": source,
+                "seen": {r.get("rulingNumber") for r in ranked}}
+
+    def _candidate_set(self, set_key: Tuple[str, str], deadline: Deadline) -> dict:
+        # Cursors are unsigned, so sets are keyed by term and source: a crafted cursor can only
+        # populate the set its own (term, source) pair names, never another term's
+        state = self.sets.get(set_key)
+        if state is None:
+            key, source = set_key
+            ranked, exhausted = self.load_first(key, source, deadline)
+            state = self._new_state(ranked, exhausted, source)
+            self.sets.set(set_key, state)
+        return state
+
+    def _fetch_next(self, set_key: Tuple[str, str], state: dict, page: int, timeout: float) -> None:
+        rulings = self.fetch_page(state["source"], page, timeout)
+        with self._lock:
+            if state["pages"] >= page:
+                return
+            fresh = [r for r in rulings if r.get("rulingNumber") not in state["seen"]]
+            state["seen"].update(r.get("rulingNumber") for r in fresh)
+            state["rulings"].extend(fresh)
+            state["pages"] = page
+            state["exhausted"] = not rulings or page >= PAGINATION_MAX_UPSTREAM_PAGES
+        logger.debug("Fetched page %d for %r (%d new rulings).", page, set_key, len(fresh))
+
+    def _next_page_future(self, set_key: Tuple[str, str], state: dict, page: int, timeout: float) -> Future:
+        with self._lock:
+            future = self._pending.get((set_key, page))
+            if future is None:
+                future = self._executor.submit(self._fetch_next, set_key, state, page, timeout)
+                self._pending[(set_key, page)] = future
+                future.add_done_callback(lambda _: self._pending.pop((set_key, page), None))
+            return future
+
+    def _maybe_prefetch(self, set_key: Tuple[str, str], offset: int, page_size: int) -> None:
+        state = self.sets.get(set_key)
+        if state is None:
+            return
+        with self._lock:
+            if state["exhausted"] or len(state["rulings"]) - offset >= 2 * page_size:
+                return
+            page = state["pages"] + 1
+        self._next_page_future(set_key, state, page, timeout=30)
+
+    def next_page(self, cursor: str, deadline: Deadline) -> Tuple[List[Dict[str, Any]], Optional[str], str]:
+        """Returns (rulings, next cursor or None, term); raises InvalidCursor."""
+        key, source, offset, page_size = decode_cursor(cursor)
+        set_key = (key, source)
+        state = self._candidate_set(set_key, deadline)
+        # Wait for upstream pages (usually already prefetched) until the page is full; the state is
+        # shared with prefetch threads, so it is only read under the lock
+        while True:
+            with self._lock:
+                if len(state["rulings"]) >= offset + page_size or state["exhausted"]:
+                    page = state["rulings"][offset:offset + page_size]
+                    next_offset = offset + len(page)
+                    has_more = next_offset < len(state["rulings"]) or not state["exhausted"]
+                    break
+                next_upstream = state["pages"] + 1
+            future = self._next_page_future(set_key, state, next_upstream, deadline.timeout(30, "CROSS page fetch"))
+            future.result(timeout=deadline.remaining())
+        self._maybe_prefetch(set_key, next_offset, page_size)
+        return page, encode_cursor(key, source, next_offset, page_size) if page and has_more else None, key
@@ -0,0 +1,148 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+import re
+from typing import NamedTuple
+
+"""
+Local rule-based PII recognizer.
+
+Covers the subset of Azure AI Language PII categories that can be detected
+reliably with patterns. Entities mirror the shape of the Text Analytics
+`PiiEntity` (text, category, confidence_score, offset, length) so they can
+be consumed by the same redaction code.
+"""
+
+
+class LocalPiiEntity(NamedTuple):
+    """
+    PII entity recognized locally.
+    """
+    text: str
+    category: str
+    confidence_score: float
+    offset: int
+    length: int
+
+
+# (category, pattern, confidence); the entity is capture group 1 if present:
+_RULES = [
+    (
+        "Email",
+        re.compile(r"\b[A-Za-z0-9._%+\-]+@[A-Za-z0-9.\-]+\.[A-Za-z]{2,}\b"),
+        0.8
+    ),
+    (
+        # Separators are required so bare 10-digit HTS numbers do not match:
+        "PhoneNumber",
+        re.compile(
+            r"(?<![\w.+])(?:\+\d{1,3}(?:[\s.\-]\d{2,4}){2,4}"
+            r"|(?:\(\d{3}\)\s?|\d{3}[\s.\-])\d{3}[\s.\-]\d{4})(?![\w.])"
+        ),
+        0.8
+    ),
+    (
+        "USUKPassportNumber",
+        re.compile(
+            r"\bpassport(?:\s+(?:no\.?|num(?:ber)?|#))?\s*[:#]?\s*([A-Z]?\d{8,9})\b",
+            re.IGNORECASE
+        ),
+        0.85
+    ),
+    (
+        # Dashes or spaces between all groups, like phone numbers, so dotted HTS numbers never match:
+        "USSocialSecurityNumber",
+        re.compile(r"(?<![\w.\-])(?:\d{3}-\d{2}-\d{4}|\d{3} \d{2} \d{4})(?![\w.\-])"),
+        0.85
+    ),
+    (
+        "CreditCardNumber",
+        re.compile(r"(?<![\d.])(?:\d[ \-]?){12,18}\d(?![\d.])"),
+        0.9
+    )
+]
+
+SUPPORTED_CATEGORIES = frozenset(category.upper() for category, _, _ in _RULES)
+
+
+def _luhn_valid(
+    digits: str
+) -> bool:
+    """
+    Validate card number checksum.
+    """
+    total = 0
+    for i, d in enumerate(reversed(digits)):
+        n = int(d)
+        if i % 2 == 1:
+            n *= 2
+            if n > 9:
+                n -= 9
+        total += n
+    return total % 10 == 0
+
+
+def recognize_pii_entities(
+    text: str,
+    categories: list[str] = None
+) -> list[LocalPiiEntity]:
+    """
+    Recognize PII entities in text using local rules.
+    """
+    wanted = None if categories is None else {c.upper() for c in categories}
+    entities = []
+
+    for category, pattern, confidence in _RULES:
+        if wanted is not None and category.upper() not in wanted:
+            continue
+
+        for match in pattern.finditer(text):
+            group = 1 if pattern.groups else 0
+            entity_text = match.group(group)
+
+            if category == "CreditCardNumber":
+                digits = re.sub(r"[ \-]", "", entity_text)
+                if not 13 <= len(digits) <= 19 or not _luhn_valid(digits):
+                    continue
+
+            entities.append(LocalPiiEntity(
+                text=entity_text,
+                category=category,
+                confidence_score=confidence,
+                offset=match.start(group),
+                length=len(entity_text)
+            ))
+
+    entities.sort(key=lambda e: e.offset)
+    return entities
+
+
+def redact(
+    text: str,
+    placeholder: str = "[redacted]"
+) -> str:
+    """
+    Replace locally recognized PII in text with a placeholder.
+
+    Overlapping detections (e.g. a phone number inside a card number) are
+    merged so each span is replaced once.
+    """
+    spans = []
+    for entity in recognize_pii_entities(text):
+        end = entity.offset + entity.length
+        if spans and entity.offset < spans[-1][1]:
+            spans[-1][1] = max(spans[-1][1], end)
+        else:
+            spans.append([entity.offset, end])
+
+    for start, end in reversed(spans):
+        text = text[:start] + placeholder + text[end:]
+    return text
+
+
+def covers(
+    categories: list[str]
+) -> bool:
+    """
+    Check whether all given categories are handled locally.
+    """
+    return all(c in SUPPORTED_CATEGORIES for c in categories if c)
@@ -0,0 +1,111 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+import re
+
+"""
+Single-pass multi-pattern substitution for PII redaction mappings.
+"""
+
+
+class MappingReplacer:
+    """
+    Compiled redaction/reconstruction replacer for one redaction mapping.
+
+    Each direction is a single alternation regex sorted longest-first, so a
+    text is scanned once regardless of the number of entities and an entity
+    that is a substring of another entity never clobbers the longer match.
+    """
+
+    def __init__(
+        self,
+        mapping: dict
+    ):
+        self.mapping = mapping
+        self.size = len(mapping)
+
+        # Keep the first redaction key per entity text (same as sequential replace):
+        redact_table = dict()
+        for redaction, entity in mapping.items():
+            redact_table.setdefault(entity, redaction)
+
+        self._redact = self._compile(redact_table)
+        self._reconstruct = self._compile(dict(mapping))
+
+    @staticmethod
+    def _compile(
+        table: dict
+    ) -> tuple:
+        """
+        Compile lookup table into a longest-first alternation pattern.
+        """
+        keys = sorted(
+            (k for k in table if k),
+            key=len,
+            reverse=True
+        )
+        if not keys:
+            return None, table
+
+        pattern = re.compile("|".join(re.escape(k) for k in keys))
+        return pattern, table
+
+    def is_current(
+        self,
+        mapping: dict
+    ) -> bool:
+        """
+        Check whether replacer was compiled from given mapping.
+        """
+        return self.mapping is mapping and self.size == len(mapping)
+
+    def apply(
+        self,
+        text: str,
+        redact: bool = True
+    ) -> str:
+        """
+        Redact or reconstruct text in a single scan.
+        """
+        pattern, table = self._redact if redact else self._reconstruct
+        if pattern is None:
+            return text
+
+        return pattern.sub(lambda m: table[m.group(0)], text)
+
+
+if __name__ == "__main__":
+    import random
+    import timeit
+
+    # Microbenchmark: long chat transcript with many entities.
+    random.seed(0)
+    entities = [f"user{i}@example{i % 7}.com" for i in range(200)]
+    entities += [f"+1 555 {i:03d} {i * 7 % 10000:04d}" for i in range(200)]
+    mapping = {f"{{PII_ENTITY_{i}}}": e for i, e in enumerate(entities, start=1)}
+    words = ["please", "classify", "the", "cotton", "shirt", "for", "import", "order"]
+    transcript = " ".join(
+        random.choice(entities) if random.random() < 0.05 else random.choice(words)
+        for _ in range(50_000)
+    )
+
+    def naive(text: str, redact: bool) -> str:
+        for redaction, entity in mapping.items():
+            text = text.replace(entity, redaction) if redact else text.replace(redaction, entity)
+        return text
+
+    replacer = MappingReplacer(mapping)
+    redacted = replacer.apply(transcript, redact=True)
+    assert redacted == naive(transcript, True)
+    assert replacer.apply(redacted, redact=False) == transcript
+
+    runs = 20
+    print(f"transcript: {len(transcript)} chars, {len(mapping)} entities")
+    for label, fn in [
+        ("naive redact", lambda: naive(transcript, True)),
+        ("single-pass redact", lambda: replacer.apply(transcript, True)),
+        ("naive reconstruct", lambda: naive(redacted, False)),
+        ("single-pass reconstruct", lambda: replacer.apply(redacted, False)),
+        ("compile", lambda: MappingReplacer(mapping)),
+    ]:
+        t = timeit.timeit(fn, number=runs) / runs
+        print(f"{label:>24}: {t * 1000:8.3f} ms")
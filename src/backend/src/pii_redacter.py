@@ -2,7 +2,10 @@
 # Licensed under the MIT License.
 import os
 import logging
-from azure.ai.textanalytics import TextAnalyticsClient
+import threading
+import pii_local
+from pii_matcher import MappingReplacer
+from ta_batcher import TextAnalyticsBatcher
 from utils import get_azure_credential
 
 """
@@ -11,17 +14,41 @@ Azure AI Language PII recognition, redaction, and reconstruction.
 
 CATEGORIES = os.environ.get("PII_CATEGORIES", "").upper().split(",")
 CONFIDENCE_THRESHOLD = float(os.environ.get("PII_CONFIDENCE_THRESHOLD", "0.5"))
-TA_CLIENT = TextAnalyticsClient(
-    endpoint=os.environ.get("LANGUAGE_ENDPOINT"),
-    credential=get_azure_credential()
-)
+
+# OFF: always call TA. PREFILTER: skip TA for messages the local recognizer
+# finds clean (only when it covers every category). ONLY: never call TA.
+LOCAL_MODE = os.environ.get("PII_LOCAL_MODE", "PREFILTER").upper()
+LOCAL_COVERS_CATEGORIES = pii_local.covers(CATEGORIES)
 
 entity_id = 0
 redaction_mappings = dict()
+compiled_mappings = dict()
+
+# TA client is created on first remote call, not at import:
+_ta_batcher = None
+_ta_lock = threading.Lock()
 
 _logger = logging.getLogger(__name__)
 
 
+def get_ta_batcher() -> TextAnalyticsBatcher:
+    """
+    Get (or create) batched Text Analytics client.
+    """
+    global _ta_batcher
+    if _ta_batcher is None:
+        with _ta_lock:
+            if _ta_batcher is None:
+                # Deferred: SDK import is slow and only needed for remote calls.
+                from azure.ai.textanalytics import TextAnalyticsClient
+                client = TextAnalyticsClient(
+                    endpoint=os.environ.get("LANGUAGE_ENDPOINT"),
+                    credential=get_azure_credential()
+                )
+                _ta_batcher = TextAnalyticsBatcher(client)
+    return _ta_batcher
+
+
 def create_redaction_key(
     category: str
 ) -> str:
@@ -41,16 +68,28 @@ def apply_mapping(
     """
     Redact or reconstruct text.
     """
-    result = text
     mapping = redaction_mappings[id]
 
-    for redaction, entity in mapping.items():
-        if redact:
-            result = result.replace(entity, redaction)
-        else:
-            result = result.replace(redaction, entity)
+    # Compile once per conversation id; rebuild if mapping was replaced:
+    replacer = compiled_mappings.get(id)
+    if replacer is None or not replacer.is_current(mapping):
+        replacer = MappingReplacer(mapping)
+        compiled_mappings[id] = replacer
+
+    return replacer.apply(
+        text=text,
+        redact=redact
+    )
 
-    return result
+
+def discard_mapping(
+    id: str
+):
+    """
+    Drop redaction mapping and its compiled replacer.
+    """
+    redaction_mappings.pop(id, None)
+    compiled_mappings.pop(id, None)
 
 
 def recognize(
@@ -63,18 +102,29 @@ def recognize(
     Recognize PII entities in text input and
     create redaction mapping.
     """
-    # Call TA:
-    response = TA_CLIENT.recognize_pii_entities(
-        documents=[text],
-        language=language
-    )
-    result = response[0]
-    if result.is_error:
-        return []
+    entities = None
+
+    if LOCAL_MODE != "OFF":
+        local_entities = pii_local.recognize_pii_entities(
+            text=text,
+            categories=CATEGORIES
+        )
+        if LOCAL_MODE == "ONLY" or (not local_entities and LOCAL_COVERS_CATEGORIES):
+            entities = local_entities
+
+    if entities is None:
+        # Call TA (batched with concurrent requests):
+        result = get_ta_batcher().recognize_pii_entities(
+            text,
+            language=language
+        )
+        if result.is_error:
+            return []
+        entities = result.entities
 
     # Filter based on confidence and category:
     mapping = dict()
-    for ent in result.entities:
+    for ent in entities:
         category = ent.category.upper()
         confidence = ent.confidence_score
 
@@ -118,7 +168,7 @@ def redact(
 
     if not cache:
         # Do not store mapping:
-        redaction_mappings.pop(id)
+        discard_mapping(id)
 
     _logger.info(f"Post-redaction: {result}")
     return result
@@ -145,7 +195,7 @@ def reconstruct(
 
     if not cache:
         # Clean up memory:
-        redaction_mappings.pop(id)
+        discard_mapping(id)
 
     _logger.info(f"Post-reconstruction: {result}")
     return result
@@ -161,4 +211,4 @@ def remove(
         _logger.warning(f"No mapping for id: {id}")
         return
 
-    redaction_mappings.pop(id)
+    discard_mapping(id)
@@ -0,0 +1,72 @@
+"""
+prewarm.py - Offline cache pre-warming from popular-query analytics.
+
+Replays the most frequent search terms and questions from the query log
+through the CROSS search and Prompt Flow paths, then writes a cache
+snapshot that workers load at startup (server.warm_up) and reload when it
+changes (checked every CACHE_SNAPSHOT_RELOAD_SECONDS).
+
+    python prewarm.py --top 100                  # once, e.g. at deploy time
+    python prewarm.py --top 100 --interval 3600  # on a schedule
+"""
+
+import argparse
+import logging
+import time
+
+import query_cache
+import query_log
+from deadline import Deadline
+
+logger = logging.getLogger(__name__)
+
+
+def prewarm(top_n: int, per_query_timeout: float = 30.0, pause: float = 0.2) -> dict:
+    """Replays the top_n terms and questions; returns counts of warmed and failed entries."""
+    from router.customs_router import fetch_cross_candidates, _route_message
+
+    # Replays must not be counted as user traffic
+    query_log.QUERY_LOG_ENABLED = False
+    query_cache.load_snapshot()
+    stats = {"terms": 0, "questions": 0, "failed": 0}
+
+    for term, count in query_log.top_queries("terms", top_n):
+        try:
+            fetch_cross_candidates(term, Deadline(per_query_timeout))
+            stats["terms"] += 1
+        except Exception as e:
+            logger.warning(f"Pre-warm failed for term '{term}' ({count} hits): {e}")
+            stats["failed"] += 1
+        # Stay well below upstream rate limits
+        time.sleep(pause)
+
+    for question, count in query_log.top_queries("questions", top_n):
+        try:
+            # DeadlineExceeded and upstream errors must not lose the entries warmed so far
+            result = _route_message(question, [], Deadline(per_query_timeout))
+            error = result.get("error")
+        except Exception as e:
+            error = e
+        if error is None:
+            stats["questions"] += 1
+        else:
+            logger.warning(f"Pre-warm failed for question '{question}' ({count} hits): {error}")
+            stats["failed"] += 1
+        time.sleep(pause)
+
+    query_cache.save_snapshot()
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-warm CROSS and Prompt Flow caches from the query log.")
+    parser.add_argument("--top", type=int, default=100, help="number of top terms and questions to replay")
+    parser.add_argument("--interval", type=float, default=0, help="repeat every N seconds (0 = run once)")
+    args = parser.parse_args()
+
+    while True:
+        start = time.monotonic()
+        print(f"Pre-warm: {prewarm(args.top)} in {time.monotonic() - start:.1f}s")
+        if args.interval <= 0:
+            break
+        time.sleep(args.interval)
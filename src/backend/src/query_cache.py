@@ -0,0 +1,157 @@
+"""
+query_cache.py - TTL/LRU caches for CROSS searches and Prompt Flow answers.
+
+Caches can be saved to and loaded from a JSON snapshot, so an offline
+pre-warm job can populate them and workers start warm (the snapshot is
+loaded in the master before forking).
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+import serialization
+
+logger = logging.getLogger(__name__)
+
+CACHE_SNAPSHOT_PATH = os.getenv("CACHE_SNAPSHOT_PATH", "cache_snapshot.json")
+CROSS_CACHE_TTL = float(os.getenv("CROSS_CACHE_TTL", str(6 * 3600)))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+# How often workers check whether prewarm.py has rewritten the snapshot (0 disables reloading)
+CACHE_SNAPSHOT_RELOAD_SECONDS = float(os.getenv("CACHE_SNAPSHOT_RELOAD_SECONDS", "300"))
+
+_PUNCTUATION = re.compile(r"[^\w\s\-]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """Case-folds, strips punctuation and collapses whitespace for cache keys and analytics."""
+    text = _PUNCTUATION.sub(" ", (text or "").casefold())
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+class TTLCache:
+    """Thread-safe LRU cache with per-entry expiry (wall-clock, so snapshots survive restarts)."""
+
+    def __init__(self, ttl: float, max_entries: int = CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, value: Any, ttl: float = None) -> None:
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def dump(self) -> dict:
+        now = time.time()
+        with self._lock:
+            return {k: [exp, v] for k, (exp, v) in self._entries.items() if exp > now}
+
+    def restore(self, entries: dict) -> int:
+        now = time.time()
+        loaded = 0
+        with self._lock:
+            for key, (expires_at, value) in entries.items():
+                if expires_at > now:
+                    self._entries[key] = (expires_at, value)
+                    loaded += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return loaded
+
+
+cross_cache = TTLCache(CROSS_CACHE_TTL)
+answer_cache = TTLCache(ANSWER_CACHE_TTL)
+_CACHES = {"cross": cross_cache, "answers": answer_cache}
+
+
+def cross_cache_key(term: str, page_size: int) -> str:
+    return f"{page_size}|{normalize_query(term)}"
+
+
+def answer_cache_key(question: str, contexts: str) -> str:
+    return f"{normalize_query(question)}|{contexts}"
+
+
+def save_snapshot(path: str = CACHE_SNAPSHOT_PATH) -> None:
+    """Atomically writes all caches to a JSON snapshot."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as fp:
+        fp.write(serialization.dumps({name: cache.dump() for name, cache in _CACHES.items()}))
+    os.replace(tmp_path, path)
+    logger.info(f"Saved cache snapshot to {path}: " + ", ".join(f"{n}={len(c)}" for n, c in _CACHES.items()))
+
+
+_snapshot_mtime = None
+_snapshot_checked = time.monotonic()
+_reload_lock = threading.Lock()
+
+
+def load_snapshot(path: str = CACHE_SNAPSHOT_PATH) -> int:
+    """Loads unexpired entries from a snapshot; returns the number loaded (0 if missing)."""
+    global _snapshot_mtime
+    try:
+        with open(path, "rb") as fp:
+            _snapshot_mtime = os.fstat(fp.fileno()).st_mtime
+            snapshot = serialization.loads(fp.read())
+    except FileNotFoundError:
+        return 0
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable cache snapshot {path}: {e}")
+        return 0
+    loaded = sum(_CACHES[name].restore(entries) for name, entries in snapshot.items() if name in _CACHES)
+    logger.info(f"Loaded {loaded} cache entries from {path}.")
+    return loaded
+
+
+def maybe_reload_snapshot(path: str = CACHE_SNAPSHOT_PATH) -> None:
+    """
+    Reloads the snapshot in the background once prewarm.py has rewritten it.
+    Cheap enough to call per request: the file is checked at most every
+    CACHE_SNAPSHOT_RELOAD_SECONDS.
+    """
+    global _snapshot_checked
+    now = time.monotonic()
+    if CACHE_SNAPSHOT_RELOAD_SECONDS <= 0 or now - _snapshot_checked < CACHE_SNAPSHOT_RELOAD_SECONDS:
+        return
+    if not _reload_lock.acquire(blocking=False):
+        return
+    _snapshot_checked = now
+
+    def reload():
+        try:
+            if os.path.getmtime(path) != _snapshot_mtime:
+                load_snapshot(path)
+        except OSError:
+            pass
+        finally:
+            _reload_lock.release()
+    threading.Thread(target=reload, name="snapshot-reload", daemon=True).start()
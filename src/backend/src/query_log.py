@@ -0,0 +1,147 @@
+"""
+query_log.py - Popular-query analytics: counts of normalized search terms and questions.
+
+Counts are buffered in memory and periodically merged, from a background
+thread, into a JSON file shared by all worker processes (guarded by an
+exclusive file lock). Locally recognized PII is redacted before anything is
+counted, and each kind keeps only its QUERY_LOG_MAX_ENTRIES most frequent
+entries. Each entry also keeps up to QUERY_LOG_MAX_CLIENTS hashed client
+networks (the peer address's /24 or /64, never a caller-set header), so
+consumers can require a query to come from several independent clients.
+"""
+
+import atexit
+import fcntl
+import hashlib
+import ipaddress
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from typing import List, Tuple
+
+import pii_local
+import serialization
+from query_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+QUERY_LOG_PATH = os.getenv("QUERY_LOG_PATH", "query_log.json")
+QUERY_LOG_FLUSH_SECONDS = float(os.getenv("QUERY_LOG_FLUSH_SECONDS", "60"))
+QUERY_LOG_ENABLED = os.getenv("QUERY_LOG_ENABLED", "true").lower() == "true"
+QUERY_LOG_MAX_ENTRIES = int(os.getenv("QUERY_LOG_MAX_ENTRIES", "10000"))
+QUERY_LOG_MAX_CLIENTS = int(os.getenv("QUERY_LOG_MAX_CLIENTS", "8"))
+
+KINDS = ("terms", "questions")
+
+
+def client_network(client: str) -> str:
+    """Peer address widened to its /24 (IPv4) or /64 (IPv6), so one host cycling addresses counts once."""
+    try:
+        address = ipaddress.ip_address(client)
+    except ValueError:
+        return client
+    return str(ipaddress.ip_network(f"{address}/{24 if address.version == 4 else 64}", strict=False))
+
+
+class QueryLog:
+    def __init__(self, path: str = QUERY_LOG_PATH, flush_seconds: float = QUERY_LOG_FLUSH_SECONDS,
+                 max_entries: int = QUERY_LOG_MAX_ENTRIES, max_clients: int = QUERY_LOG_MAX_CLIENTS):
+        self.path = path
+        self.flush_seconds = flush_seconds
+        self.max_entries = max_entries
+        self.max_clients = max_clients
+        self._pending = {kind: Counter() for kind in KINDS}
+        self._pending_clients = {kind: {} for kind in KINDS}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._flushing = False
+
+    def record(self, kind: str, text: str, client: str = None) -> None:
+        key = normalize_query(pii_local.redact(text or ""))
+        if not key:
+            return
+        with self._lock:
+            self._pending[kind][key] += 1
+            if client:
+                # Only a short hash is kept; distinct client networks matter, not who they are
+                network = client_network(client)
+                self._pending_clients[kind].setdefault(key, set()).add(hashlib.sha256(network.encode("utf-8")).hexdigest()[:12])
+            due = not self._flushing and time.monotonic() - self._last_flush >= self.flush_seconds
+            if due:
+                self._flushing = True
+        if due:
+            # The merge re-reads and rewrites the file; keep it off the request thread
+            threading.Thread(target=self._flush_in_background, name="query-log-flush", daemon=True).start()
+
+    def _flush_in_background(self) -> None:
+        try:
+            self.flush()
+        finally:
+            with self._lock:
+                self._flushing = False
+
+    def flush(self) -> None:
+        """Merges buffered counts into the log file."""
+        with self._lock:
+            pending, self._pending = self._pending, {kind: Counter() for kind in KINDS}
+            pending_clients, self._pending_clients = self._pending_clients, {kind: {} for kind in KINDS}
+            self._last_flush = time.monotonic()
+        if not any(pending.values()):
+            return
+        try:
+            with open(self.path, "a+b") as fp:
+                fcntl.flock(fp, fcntl.LOCK_EX)
+                fp.seek(0)
+                raw = fp.read()
+                counts = serialization.loads(raw) if raw else {}
+                clients = counts.setdefault("clients", {})
+                for kind, counter in pending.items():
+                    merged = Counter(counts.get(kind, {}))
+                    merged.update(counter)
+                    counts[kind] = dict(merged.most_common(self.max_entries))
+                    kind_clients = clients.get(kind, {})
+                    for key, hashes in pending_clients[kind].items():
+                        known = kind_clients.setdefault(key, [])
+                        known.extend(h for h in sorted(hashes) if h not in known)
+                        del known[self.max_clients:]
+                    clients[kind] = {key: kind_clients[key] for key in counts[kind] if key in kind_clients}
+                fp.seek(0)
+                fp.truncate()
+                fp.write(serialization.dumps(counts))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not flush query log to {self.path}: {e}")
+
+
+def top_queries(kind: str, n: int, path: str = QUERY_LOG_PATH, min_count: int = 1,
+                min_clients: int = 0) -> List[Tuple[str, int]]:
+    """
+    Returns the n most frequent normalized entries of a kind ("terms" or "questions")
+    seen at least min_count times from at least min_clients distinct clients.
+    """
+    try:
+        with open(path, "rb") as fp:
+            fcntl.flock(fp, fcntl.LOCK_SH)
+            raw = fp.read()
+    except FileNotFoundError:
+        return []
+    counts = serialization.loads(raw) if raw else {}
+    clients = counts.get("clients", {}).get(kind, {})
+    eligible = {key: count for key, count in counts.get(kind, {}).items()
+                if count >= min_count and len(clients.get(key, ())) >= min_clients}
+    return Counter(eligible).most_common(n)
+
+
+query_log = QueryLog()
+atexit.register(query_log.flush)
+
+
+def record_term(term: str, client: str = None) -> None:
+    if QUERY_LOG_ENABLED:
+        query_log.record("terms", term, client)
+
+
+def record_question(question: str, client: str = None) -> None:
+    if QUERY_LOG_ENABLED:
+        query_log.record("questions", question, client)
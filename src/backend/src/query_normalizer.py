@@ -0,0 +1,326 @@
+"""
+query_normalizer.py - Search-term normalization, spell correction and synonym expansion.
+
+"T-Shirts!!" and "the cotton tshirts" become "t-shirt" and "cotton tshirt"
+before they reach the CROSS API or a cache key:
+
+  1. case folding, punctuation stripping (query_cache.normalize_query)
+  2. leading article / filler removal
+  3. plural folding
+
+The user's own words are always searched first. Synonym canonicalization
+from a customs synonym table ("cotton tshirt" -> "cotton t-shirt") and
+SymSpell-style spelling correction ("labtop" -> "laptop") only propose
+alternative terms, tried when the term itself returns nothing: a synonym
+can name different goods ("golf tees" are not t-shirts, a hydraulic
+accumulator is not a battery). Spelling is only corrected for words missing
+from a vocabulary built from ruling-corpus subjects: a small seed list
+cannot tell a typo from a product it does not know ("vase", "tent").
+"""
+
+import logging
+import os
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+import serialization
+from query_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+QUERY_SYNONYMS_PATH = os.getenv("QUERY_SYNONYMS_PATH")
+SPELL_MAX_EDIT_DISTANCE = int(os.getenv("SPELL_MAX_EDIT_DISTANCE", "2"))
+SPELL_VOCAB_SIZE = int(os.getenv("SPELL_VOCAB_SIZE", "20000"))
+# Deletes are only generated for this many leading characters (SymSpell prefix length)
+SPELL_PREFIX_LENGTH = 7
+SPELL_MIN_WORD_LENGTH = 4
+# Words this short are only corrected within edit distance 1 ("wire" is not "tire" misspelled twice)
+SPELL_SHORT_WORD_LENGTH = 5
+MAX_ALTERNATIVES = 3
+
+LEADING_FILLERS = {"the", "a", "an", "my", "our", "some", "these", "those", "this", "that"}
+# Words whose trailing "s" is not a plural
+PLURAL_EXCEPTIONS = {
+    "glass", "gas", "bus", "lens", "chassis", "series", "species", "news", "pants", "shorts", "jeans",
+    "trousers", "scissors", "pliers", "tweezers", "goods", "clothes", "glasses", "sunglasses", "binoculars",
+    "headphones", "earphones", "leggings", "tights", "overalls", "cosmetics", "electronics", "textiles",
+}
+
+# canonical -> variants; variants may be phrases
+CUSTOMS_SYNONYMS: Dict[str, List[str]] = {
+    "t-shirt": ["tshirt", "tee shirt", "tee", "t shirt"],
+    "sweatshirt": ["hoodie", "hooded sweatshirt"],
+    "sneaker": ["trainer", "athletic shoe", "running shoe", "tennis shoe"],
+    "laptop": ["notebook computer", "laptop computer", "portable computer"],
+    "cell phone": ["mobile phone", "cellphone", "smartphone", "smart phone"],
+    "television": ["tv", "television set"],
+    "automobile": ["car", "passenger vehicle", "motor car"],
+    "bicycle": ["bike"],
+    "e-bike": ["electric bicycle", "ebike", "electric bike"],
+    "vape": ["electronic cigarette", "e-cigarette", "vaporizer"],
+    "pants": ["trousers", "slacks"],
+    "handbag": ["purse"],
+    "mug": ["coffee cup"],
+    "sofa": ["couch", "settee"],
+    "refrigerator": ["fridge"],
+    "headphones": ["earphones", "earbuds", "headset"],
+    "battery": ["accumulator"],
+    "solar panel": ["photovoltaic module", "solar module", "pv module"],
+    "led lamp": ["led light", "led bulb"],
+}
+
+# Common product vocabulary: known words are not plural-folded or corrected
+SEED_VOCABULARY = """
+laptop computer tablet phone television monitor printer keyboard mouse cable charger adapter battery
+speaker headphones camera lens drone router modem circuit board semiconductor chip sensor motor pump
+valve bearing gear engine turbine compressor generator transformer inverter solar panel lamp bulb
+shirt t-shirt blouse sweater sweatshirt jacket coat dress skirt pants jeans shorts sock glove hat
+scarf shoe sneaker boot sandal slipper handbag wallet backpack luggage suitcase belt watch jewelry
+necklace bracelet ring earring cotton polyester nylon wool silk leather plastic rubber steel aluminum
+stainless copper wood bamboo glass ceramic paper cardboard furniture chair table sofa desk bed mattress cabinet
+shelf toy game puzzle doll bicycle scooter helmet automobile vehicle truck tire wheel brake mirror
+cosmetics shampoo lotion perfume soap toothbrush vitamin supplement medicine food coffee tea sugar
+chocolate candy cheese meat fish fruit vegetable juice wine beer spirit mug cup plate bowl knife fork
+spoon cookware kettle blender refrigerator microwave oven stove heater fan vacuum cleaner washer dryer
+tool drill saw hammer wrench screwdriver fastener bolt screw nut nail hinge lock container bottle bag
+textile fabric yarn fiber knit woven apparel footwear garment accessory machine equipment parts
+"""
+
+
+class NormalizedQuery(NamedTuple):
+    term: str                  # the user's words, plural-folded; no synonyms or spelling corrections
+    original: str
+    corrections: Dict[str, str]
+    alternatives: List[str]    # spelling-corrected term, canonical synonym form, variants; tried if term finds nothing
+
+
+def fold_plural(word: str) -> str:
+    """Singularizes regular English plurals; hyphenated words fold their last part."""
+    head, sep, tail = word.rpartition("-")
+    if sep:
+        return f"{head}-{fold_plural(tail)}"
+    if len(word) <= 3 or word in PLURAL_EXCEPTIONS or word.endswith(("ss", "us", "is")):
+        return word
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith(("ches", "shes", "xes", "zes", "sses")):
+        return word[:-2]
+    if word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal-string-alignment (Damerau-Levenshtein) distance, or limit + 1 once it exceeds limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class SpellCorrector:
+    """SymSpell: precomputed deletes map each misspelling candidate to dictionary words in O(1)."""
+
+    def __init__(self, max_edit_distance: int = SPELL_MAX_EDIT_DISTANCE, prefix_length: int = SPELL_PREFIX_LENGTH):
+        self.max_edit_distance = max_edit_distance
+        self.prefix_length = prefix_length
+        self.counts: Dict[str, int] = {}
+        self.deletes: Dict[str, List[str]] = {}
+
+    def _deletes(self, word: str) -> Set[str]:
+        word = word[:self.prefix_length]
+        results, frontier = {word}, {word}
+        for _ in range(self.max_edit_distance):
+            frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))} - results
+            results |= frontier
+        return results
+
+    def add_words(self, counts: Dict[str, int]) -> None:
+        for word, count in counts.items():
+            if word in self.counts:
+                self.counts[word] += count
+                continue
+            self.counts[word] = count
+            for delete in self._deletes(word):
+                self.deletes.setdefault(delete, []).append(word)
+
+    def __contains__(self, word: str) -> bool:
+        return word in self.counts
+
+    def correct(self, word: str) -> Optional[str]:
+        """Closest dictionary word (ties broken by frequency), or None if nothing is within range."""
+        if word in self.counts:
+            return word
+        max_distance = min(self.max_edit_distance, 1) if len(word) <= SPELL_SHORT_WORD_LENGTH else self.max_edit_distance
+        best, best_key = None, None
+        seen = set()
+        for delete in self._deletes(word):
+            for candidate in self.deletes.get(delete, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                distance = edit_distance(word, candidate, max_distance)
+                if distance > max_distance:
+                    continue
+                key = (distance, -self.counts[candidate])
+                if best_key is None or key < best_key:
+                    best, best_key = candidate, key
+        return best
+
+
+def load_synonyms(path: Optional[str] = QUERY_SYNONYMS_PATH) -> Dict[str, List[str]]:
+    """Built-in table, extended by a JSON file of {"canonical": ["variant", ...]}."""
+    synonyms = {canonical: list(variants) for canonical, variants in CUSTOMS_SYNONYMS.items()}
+    if path:
+        try:
+            with open(path, "rb") as fp:
+                for canonical, variants in serialization.loads(fp.read()).items():
+                    synonyms.setdefault(canonical, []).extend(variants)
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not load query synonyms from {path}: {e}")
+    return synonyms
+
+
+class QueryNormalizer:
+    def __init__(self, synonyms: Dict[str, List[str]] = None, subjects: Iterable[str] = ()):
+        self.synonyms = synonyms if synonyms is not None else load_synonyms()
+        # Variant (folded) -> canonical; canonical forms map to themselves
+        self.canonical: Dict[str, str] = {}
+        for canonical, variants in self.synonyms.items():
+            for variant in [canonical] + variants:
+                self.canonical[self._fold_phrase(variant)] = canonical
+        self.max_phrase_words = max(len(v.split()) for v in self.canonical)
+
+        counts = Counter(fold_plural(w) for w in SEED_VOCABULARY.split())
+        subject_words = 0
+        for subject in subjects:
+            words = [fold_plural(w) for w in normalize_query(subject).split() if w.isalpha() or "-" in w]
+            counts.update(words)
+            subject_words += len(words)
+        for phrase in self.canonical:
+            counts.update(phrase.split())
+        self.vocabulary = set(counts)
+        # Without ruling subjects, an unknown word is as likely a product as a typo: no correction
+        self.speller = SpellCorrector() if subject_words else None
+        if self.speller is not None:
+            self.speller.add_words(dict(counts.most_common(SPELL_VOCAB_SIZE)))
+
+    @staticmethod
+    def _fold_phrase(text: str) -> str:
+        return " ".join(fold_plural(w) for w in normalize_query(text).split())
+
+    def _canonicalize(self, words: List[str]) -> List[str]:
+        """Replaces the longest synonym phrases (left to right) with their canonical forms."""
+        output, i = [], 0
+        while i < len(words):
+            for size in range(min(self.max_phrase_words, len(words) - i), 0, -1):
+                canonical = self.canonical.get(" ".join(words[i:i + size]))
+                if canonical is not None:
+                    output.append(canonical)
+                    i += size
+                    break
+            else:
+                output.append(words[i])
+                i += 1
+        return output
+
+    def normalize(self, text: str) -> NormalizedQuery:
+        words = normalize_query(text).split()
+        while len(words) > 1 and words[0] in LEADING_FILLERS:
+            words.pop(0)
+        # Known words ("stainless", "glasses") are kept as they are
+        words = [w if w in self.vocabulary else fold_plural(w) for w in words]
+
+        corrections = {}
+        corrected_words = list(words)
+        for i, word in enumerate(words):
+            if (self.speller is None or len(word) < SPELL_MIN_WORD_LENGTH or not word.isalpha()
+                    or word in self.vocabulary or word in self.canonical or word in PLURAL_EXCEPTIONS):
+                continue
+            corrected = self.speller.correct(word)
+            if corrected is not None and corrected != word:
+                corrections[word] = corrected
+                corrected_words[i] = corrected
+
+        term = " ".join(words)
+        alternatives = [" ".join(corrected_words)] if corrections else []
+        canonical_words = self._canonicalize(corrected_words)
+        canonical_term = " ".join(canonical_words)
+        alternatives.append(canonical_term)
+        for canonical in dict.fromkeys(canonical_words):
+            alternatives.extend(canonical_term.replace(canonical, variant)
+                                for variant in self.synonyms.get(canonical, ())[:2])
+        alternatives = [a for a in dict.fromkeys(alternatives) if a != term]
+        return NormalizedQuery(term, text, corrections, alternatives[:MAX_ALTERNATIVES])
+
+
+_normalizer: Optional[QueryNormalizer] = None
+_normalizer_lock = threading.Lock()
+
+
+def get_normalizer() -> QueryNormalizer:
+    """Shared normalizer; the spelling dictionary includes ruling-corpus subjects when a corpus is mapped."""
+    global _normalizer
+    if _normalizer is None:
+        with _normalizer_lock:
+            if _normalizer is None:
+                from ruling_corpus import get_corpus
+                corpus = get_corpus()
+                subjects = (corpus.row(i).subject for i in range(len(corpus))) if corpus is not None else ()
+                _normalizer = QueryNormalizer(subjects=subjects)
+    return _normalizer
+
+
+def normalize_search_term(term: str) -> NormalizedQuery:
+    return get_normalizer().normalize(term)
+
+
+if __name__ == "__main__":
+    import random
+    import time
+
+    # Spelling correction needs a corpus-backed vocabulary; stand in a few ruling subjects
+    normalizer = QueryNormalizer(subjects=[
+        "The tariff classification of a laptop computer from China", "stainless steel bolts", "ceramic vase",
+        "camping tent", "copper wire", "charcoal grill", "zipper pulls", "acrylic paint set", "yoga mat",
+        "chess set", "teeth whitening kit", "phone cases", "reading glasses",
+    ])
+    for example in ["labtop", "T-Shirts!!", "the cotton tshirts", "Mens Cotton Tee Shirts", "batteries for laptops",
+                    "leather handbags", "smartphone", "ceramic coffee cups", "stainles steel boltz", "vase", "tent", "golf tees",
+                    "grill", "zipper", "acrylic paint", "yoga mat", "chess set", "teeth whitening", "cases", "glasses"]:
+        result = normalizer.normalize(example)
+        print(f"{example!r:>28} -> {result.term!r} corrections={result.corrections} alternatives={result.alternatives}")
+
+    # Cache-key fragmentation: noisy variants of the same items before and after normalization
+    rng = random.Random(0)
+    items = ["laptop", "cotton t-shirt", "leather handbag", "ceramic mug", "steel bolt", "solar panel"]
+
+    def noisy(item: str) -> str:
+        word = rng.choice(["", "the ", "a ", "my "]) + item
+        if rng.random() < 0.5:
+            word += "s"
+        if rng.random() < 0.3:
+            i = rng.randrange(len(word) - 1)
+            word = word[:i] + word[i + 1] + word[i] + word[i + 2:]
+        return rng.choice([word, word.upper(), word.title()]) + rng.choice(["", "?", "!!", "."])
+
+    queries = [noisy(rng.choice(items)) for _ in range(2000)]
+    raw_keys = len({normalize_query(q) for q in queries})
+    start = time.perf_counter()
+    normalized = [normalizer.normalize(q).term for q in queries]
+    elapsed = (time.perf_counter() - start) / len(queries)
+    keys = len(set(normalized))
+    print(f"{len(queries)} queries over {len(items)} items: {raw_keys} distinct cache keys before, {keys} after "
+          f"(hit rate {1 - raw_keys / len(queries):.1%} -> {1 - keys / len(queries):.1%}); {elapsed * 1e6:.0f} us/query")
@@ -0,0 +1,150 @@
+"""
+reranker.py - Local re-ranking of CROSS ruling candidates.
+
+Scores a candidate page by BM25 over the ruling `subject` plus a recency
+boost from `rulingDate`, vectorized with NumPy across candidates.
+"""
+
+import logging
+import os
+import re
+import time
+from datetime import date
+from typing import List, Dict, Any
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "30"))
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "25"))
+RECENCY_WEIGHT = float(os.getenv("RERANK_RECENCY_WEIGHT", "1.0"))
+RECENCY_HALF_LIFE_YEARS = float(os.getenv("RERANK_RECENCY_HALF_LIFE_YEARS", "5"))
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Small prior for CBP's own ordering, used mainly to break ties
+RANK_PRIOR_WEIGHT = 0.1
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall((text or "").lower())
+
+
+def _ruling_age_years(ruling: Dict[str, Any], today: date) -> float:
+    try:
+        ruling_date = date.fromisoformat(str(ruling.get("rulingDate", ""))[:10])
+    except ValueError:
+        return np.inf
+    return max(0.0, (today - ruling_date).days / 365.25)
+
+
+def score_rulings(query: str, rulings: List[Dict[str, Any]], today: date = None) -> np.ndarray:
+    """Returns one relevance score per ruling (higher is better)."""
+    today = today or date.today()
+    query_terms = list(dict.fromkeys(tokenize(query)))
+    n = len(rulings)
+    if n == 0:
+        return np.zeros(0)
+
+    # Term frequency matrix restricted to query terms: shape (n, q)
+    docs = [tokenize(r.get("subject", "")) for r in rulings]
+    term_index = {t: j for j, t in enumerate(query_terms)}
+    tf = np.zeros((n, max(len(query_terms), 1)))
+    for i, tokens in enumerate(docs):
+        for token in tokens:
+            j = term_index.get(token)
+            if j is not None:
+                tf[i, j] += 1
+    doc_len = np.fromiter((len(d) for d in docs), dtype=float, count=n)
+    avg_len = doc_len.mean() or 1.0
+
+    df = (tf > 0).sum(axis=0)
+    idf = np.log(1.0 + (n - df + 0.5) / (df + 0.5))
+    norm = BM25_K1 * (1.0 - BM25_B + BM25_B * doc_len / avg_len)
+    bm25 = (tf * (BM25_K1 + 1.0) / (tf + norm[:, None]) * idf).sum(axis=1)
+
+    ages = np.fromiter((_ruling_age_years(r, today) for r in rulings), dtype=float, count=n)
+    recency = RECENCY_WEIGHT * np.power(0.5, ages / RECENCY_HALF_LIFE_YEARS)
+
+    rank_prior = RANK_PRIOR_WEIGHT / (1.0 + np.arange(n))
+    return bm25 + recency + rank_prior
+
+
+def rerank_rulings(
+    query: str,
+    rulings: List[Dict[str, Any]],
+    top_k: int = 3,
+    budget_ms: float = RERANK_BUDGET_MS
+) -> List[Dict[str, Any]]:
+    """
+    Returns the top_k rulings by local score. Falls back to the upstream order
+    if scoring fails or exceeds the latency budget.
+    """
+    if len(rulings) <= 1:
+        return rulings[:top_k]
+    start = time.perf_counter()
+    try:
+        scores = score_rulings(query, rulings)
+    except Exception as e:
+        logger.error(f"Re-ranking failed for '{query}', keeping upstream order: {e}")
+        return rulings[:top_k]
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    if elapsed_ms > budget_ms:
+        logger.warning(f"Re-ranking took {elapsed_ms:.1f} ms (budget {budget_ms} ms), keeping upstream order.")
+        return rulings[:top_k]
+
+    # Stable sort keeps upstream order among equal scores
+    order = np.argsort(-scores, kind="stable")[:top_k]
+    return [rulings[i] for i in order]
+
+
+if __name__ == "__main__":
+    import json
+    import random
+    import sys
+    import timeit
+
+    # Offline benchmark. With a fixture path, expects a CROSS API response
+    # ({"rulings": [...]}) and a query; otherwise uses a synthetic fixture in
+    # which rulings matching every query term are the relevant ones.
+    if len(sys.argv) > 2:
+        with open(sys.argv[1]) as fp:
+            candidates = json.load(fp).get("rulings", [])
+        query = sys.argv[2]
+        relevant = None
+    else:
+        random.seed(7)
+        query = "cotton t-shirt"
+        subjects = [
+            "The tariff classification of a men's cotton knit t-shirt from China",
+            "The tariff classification of a women's cotton t-shirt",
+            "The tariff classification of cotton yarn",
+            "The tariff classification of a polyester sweatshirt",
+            "The tariff classification of a shirt display stand",
+            "The tariff classification of leather gloves",
+        ]
+        candidates = []
+        for i in range(RERANK_CANDIDATES):
+            subject = random.choice(subjects)
+            candidates.append({
+                "rulingNumber": f"N{300000 + i}",
+                "rulingDate": f"{random.randint(1995, 2024)}-0{random.randint(1, 9)}-15T00:00:00",
+                "subject": subject,
+            })
+        relevant = {c["rulingNumber"] for c in candidates if "cotton" in c["subject"] and "t-shirt" in c["subject"]}
+
+    reranked = rerank_rulings(query, candidates, top_k=3)
+    if relevant is not None:
+        def precision(rulings):
+            return sum(r["rulingNumber"] in relevant for r in rulings) / 3
+        print(f"precision@3 upstream order: {precision(candidates[:3]):.2f}")
+        print(f"precision@3 re-ranked:      {precision(reranked):.2f}")
+    for r in reranked:
+        print(f"  {r.get('rulingDate', '')[:10]}  {r.get('subject')}")
+
+    runs = 2000
+    t = timeit.timeit(lambda: rerank_rulings(query, candidates, top_k=3), number=runs) / runs
+    print(f"rerank {len(candidates)} candidates: {t * 1000:.3f} ms")
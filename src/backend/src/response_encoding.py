@@ -0,0 +1,111 @@
+"""
+response_encoding.py - Field projection, compression and binary encoding for API responses.
+
+msgpack and brotli are optional; without them responses fall back to JSON
+and gzip respectively.
+"""
+
+import gzip
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import serialization
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Responses smaller than this are not worth compressing
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+MSGPACK_MIMETYPE = "application/msgpack"
+JSON_MIMETYPE = "application/json"
+
+# Ruling fields the bundled frontend renders; requested with fields=default
+DEFAULT_RULING_FIELDS = ["rulingNumber", "rulingDate", "subject", "tariffs", "categories", "url"]
+
+
+def parse_fields(value: Any) -> Optional[List[str]]:
+    """
+    Accepts "a,b,c", ["a", "b"] or "default"; None means no projection.
+    Raises ValueError for anything else.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        if value.strip().lower() == "default":
+            return list(DEFAULT_RULING_FIELDS)
+        return [f.strip() for f in value.split(",") if f.strip()]
+    if isinstance(value, list) and all(isinstance(f, str) for f in value):
+        return list(value)
+    raise ValueError("fields must be a comma-separated string or a list of strings.")
+
+
+def project_rulings(result: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+    """
+    Keeps only the requested fields of each entry in result["cross_rulings"].
+    An empty field list drops the raw rulings entirely (the formatted text remains).
+    """
+    rulings = result.get("cross_rulings")
+    if fields is None or not isinstance(rulings, list):
+        return result
+    projected = dict(result)
+    if not fields:
+        projected.pop("cross_rulings")
+    else:
+        projected["cross_rulings"] = [{k: r[k] for k in fields if k in r} for r in rulings]
+    return projected
+
+
+def _accepts(header: str, token: str) -> bool:
+    """True if an Accept/Accept-Encoding header lists token with a non-zero q-value."""
+    for part in (header or "").lower().split(","):
+        name, _, params = part.partition(";")
+        if name.strip() != token:
+            continue
+        params = params.replace(" ", "")
+        if params.startswith("q="):
+            try:
+                return float(params[2:]) > 0
+            except ValueError:
+                return True
+        return True
+    return False
+
+
+def encode_response(
+    payload: Any,
+    accept: str = "",
+    accept_encoding: str = ""
+) -> Tuple[bytes, Dict[str, str]]:
+    """
+    Serializes payload (msgpack if requested and available, else JSON) and
+    compresses it (brotli, then gzip) per Accept-Encoding. Returns body and headers.
+    """
+    if msgpack is not None and _accepts(accept, MSGPACK_MIMETYPE):
+        body = msgpack.packb(payload, default=str)
+        headers = {"Content-Type": MSGPACK_MIMETYPE}
+    else:
+        body = serialization.dumps(payload)
+        headers = {"Content-Type": JSON_MIMETYPE}
+    headers["Vary"] = "Accept, Accept-Encoding"
+
+    if len(body) >= COMPRESSION_MIN_BYTES:
+        if brotli is not None and _accepts(accept_encoding, "br"):
+            body = brotli.compress(body, quality=BROTLI_QUALITY)
+            headers["Content-Encoding"] = "br"
+        elif _accepts(accept_encoding, "gzip"):
+            body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+            headers["Content-Encoding"] = "gzip"
+    return body, headers
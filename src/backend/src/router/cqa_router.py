@@ -28,7 +28,7 @@ def create_cqa_router() -> Callable[[str, str, str], dict]:
         Call CQA runtime.
         """
         try:
-            _logger.info(f"Calling {project_name}:{deployment_name} runtime")
+            _logger.info("Calling %s:%s runtime", project_name, deployment_name, extra={"event": "cqa.call"})
 
             response = client.get_answers(
                 question=question,
@@ -37,13 +37,14 @@ def create_cqa_router() -> Callable[[str, str, str], dict]:
                 deployment_name=deployment_name
             )
 
-            _logger.info(f"Runtime response: {response}")
+            # Full payloads only at debug; formatted lazily if enabled
+            _logger.debug("Runtime response: %s", response)
             return parse_response_sdk(
                 response=response
             )
 
         except Exception as e:
-            _logger.error(f"Runtime call failed: {e}")
+            _logger.error("Runtime call failed: %s", e, extra={"event": "cqa.error"})
             return {
                 "error": e
             }
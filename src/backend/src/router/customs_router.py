@@ -3,6 +3,21 @@ import os
 import logging
 import re
 from dotenv import load_dotenv
+import serialization
+from session_store import create_session_store
+from hts_index import get_hts_index, normalize_hts_code, format_hts_code
+from reranker import rerank_rulings, RERANK_CANDIDATES, RERANK_BUDGET_MS
+from deadline import Deadline, DeadlineExceeded
+from query_cache import cross_cache, answer_cache, cross_cache_key, answer_cache_key
+from query_log import record_term, record_question
+from log_config import configure_logging
+from ruling_record import Ruling, RulingTable
+from ruling_corpus import get_corpus
+from ruling_store import get_ruling_text
+from query_normalizer import normalize_search_term
+from pagination import Paginator, InvalidCursor
+
+configure_logging()
 
 try:
     from ..scraper import search_cross_rulings
@@ -14,11 +29,10 @@ except ImportError as e1:
         logging.warning("Imported scraper using direct import (check PYTHONPATH or execution context).")
     except ImportError as e2:
         logging.error(f"Could not import search_cross_rulings function from scraper.py: {e2}")
-        def search_cross_rulings(term: str, collection: str = "ALL", page_size: int = 10, page: int = 1, sort_by: str = "RELEVANCE") -> list:
+        def search_cross_rulings(term: str, collection: str = "ALL", page_size: int = 10, page: int = 1, sort_by: str = "RELEVANCE", timeout: float = 30) -> list:
             logging.error("CRITICAL: Using dummy search_cross_rulings due to import failure.")
             return []
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 dotenv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env')
@@ -36,12 +50,17 @@ else:
 AZURE_ENDPOINT = os.getenv("AZURE_PROMPT_FLOW_ENDPOINT")
 AZURE_API_KEY = os.getenv("AZURE_PROMPT_FLOW_API_KEY")
 REQUEST_TIMEOUT = 60
+CROSS_REQUEST_TIMEOUT = 30
+RULING_TEXT_EXCERPT_CHARS = int(os.getenv("RULING_TEXT_EXCERPT_CHARS", "4000"))
 
 if not AZURE_ENDPOINT:
     logger.critical("CRITICAL: AZURE_PROMPT_FLOW_ENDPOINT environment variable not set.")
 if not AZURE_API_KEY:
     logger.critical("CRITICAL: AZURE_PROMPT_FLOW_API_KEY environment variable not set.")
 
+# Shared through Redis when SESSION_REDIS_URL is set; otherwise each worker process keeps its own
+SESSION_STORE = create_session_store()
+
 HEADERS = {
     "Content-Type": "application/json",
     "Authorization": f"Bearer {AZURE_API_KEY}" if AZURE_API_KEY else ""
@@ -58,6 +77,109 @@ ITEM_EXTRACTION_PATTERNS = [
     re.compile(r'\b(' + '|'.join(CLASSIFICATION_KEYWORDS) + r')\s+(?:of|for)?\s*(?:the\s+|a\s+|an\s+)?([\w\s\-]+?)(\?|$)', re.IGNORECASE)
 ]
 
+# Direct code questions such as "what is heading 8471?" or "hts 6109.10.0012"; groups are joined by dots
+# or written together, never by spaces ("heading 8471 10 units" is heading 8471)
+HTS_CODE_QUERY_REGEX = re.compile(
+    r'\bchapter\s+(\d{2})\b'
+    r'|\b(?:heading|subheading|htsus|hts|tariff code|tariff number|code)\s+(?:number\s+|no\.?\s+|for\s+|of\s+)?(\d{4}(?:\.?\d{2}){0,3})\b',
+    re.IGNORECASE
+)
+
+# Ruling references such as "ruling N123456" or "ruling no. HQ 089123"
+RULING_NUMBER_PATTERN = r'[A-Z]{1,2}\s?\d{5,6}'
+RULING_NUMBER_QUERY_REGEX = re.compile(r'\bruling\s+(?:number\s+|no\.?\s+|#\s*)?(' + RULING_NUMBER_PATTERN + r')\b', re.IGNORECASE)
+RULING_NUMBER_REGEX = re.compile(RULING_NUMBER_PATTERN, re.IGNORECASE)
+
+def extract_hts_code_query(message: str) -> str | None:
+    if not message: return None
+    match = HTS_CODE_QUERY_REGEX.search(message)
+    return (match.group(1) or match.group(2)) if match else None
+
+def extract_ruling_number(message: str) -> str | None:
+    if not message: return None
+    match = RULING_NUMBER_QUERY_REGEX.search(message)
+    return match.group(1).upper() if match else None
+
+def normalize_ruling_number(value: str) -> str | None:
+    """Upper-case ruling number if value is exactly one (e.g. "n123456"), else None."""
+    if not value or not RULING_NUMBER_REGEX.fullmatch(value): return None
+    return value.upper()
+
+def normalize_tariffs(tariffs: list[str]) -> list[str]:
+    """Dotted HTSUS form for well-formed codes; codes missing from the loaded schedule are flagged."""
+    hts_index = get_hts_index()
+    normalized = []
+    for tariff in tariffs:
+        digits = normalize_hts_code(tariff)
+        if digits is None:
+            normalized.append(tariff)
+        elif hts_index is not None and hts_index.validate(digits) is None:
+            normalized.append(f"{format_hts_code(digits)} (not in current schedule)")
+        else:
+            normalized.append(format_hts_code(digits))
+    return normalized
+
+def format_hts_lookup(code: str, max_children: int = 10, max_rulings: int = 3) -> dict | None:
+    """Answers a direct HTS code question from the local schedule and ruling corpus, or None if it cannot."""
+    hts_index = get_hts_index()
+    corpus = get_corpus()
+    entry, children = None, []
+    if hts_index is not None:
+        entry = hts_index.lookup(code)
+        children = [e for e in hts_index.browse(code, limit=max_children + 1) if entry is None or e.code != entry.code]
+    # Most recent rulings citing a tariff under this code
+    rulings = corpus.by_tariff_prefix(code, limit=max_rulings) if corpus is not None else []
+    if entry is None and not children and not rulings:
+        return None
+
+    lines = []
+    if entry is not None:
+        lines.append(f"HTS {entry.code}: {entry.full_description}")
+        if entry.general:
+            lines.append(f"  General rate of duty: {entry.general}")
+        if entry.special:
+            lines.append(f"  Special rate of duty: {entry.special}")
+        if entry.other:
+            lines.append(f"  Column 2 rate of duty: {entry.other}")
+    if children:
+        lines.append(f"Codes under {code}:")
+        lines.extend(f"  {e.code}: {e.description}" + (f" ({e.general})" if e.general else "") for e in children[:max_children])
+    if rulings:
+        lines.append(format_cross_rulings_for_context(rulings, max_to_format=max_rulings))
+
+    entries = ([entry] if entry is not None else []) + children[:max_children]
+    return {
+        "kind": "hts_lookup_result",
+        "result": "\n".join(lines),
+        "hts_entries": [e._asdict() for e in entries],
+        "cross_rulings": [r.to_dict() for r in rulings],
+        "history": [],
+        "error": None
+    }
+
+def format_ruling_lookup(ruling_number: str, deadline: Deadline) -> dict | None:
+    """Answers a question about a specific ruling from the local corpus and text store, or None."""
+    corpus = get_corpus()
+    ruling = None
+    if corpus is not None:
+        ruling = corpus.find(ruling_number) or corpus.find(ruling_number.replace(" ", ""))
+    # Stored bodies are served offline; a miss is fetched once within the deadline
+    text = get_ruling_text(ruling.number if ruling else ruling_number.replace(" ", ""),
+                           timeout=deadline.timeout(CROSS_REQUEST_TIMEOUT, "ruling text fetch"))
+    if ruling is None and text is None:
+        return None
+    parts = [format_cross_rulings_for_context([ruling], max_to_format=1)] if ruling is not None else []
+    if text:
+        excerpt = text[:RULING_TEXT_EXCERPT_CHARS] + ("..." if len(text) > RULING_TEXT_EXCERPT_CHARS else "")
+        parts.append(f"Ruling text:\n{excerpt}")
+    return {
+        "kind": "cross_rulings_result",
+        "result": "\n".join(parts),
+        "cross_rulings": [ruling.to_dict()] if ruling is not None else [],
+        "history": [],
+        "error": None
+    }
+
 def is_classification_question(message: str) -> bool:
     if not message: return False
     return bool(CLASSIFICATION_REGEX.search(message))
@@ -72,12 +194,13 @@ def extract_search_term(message: str) -> str | None:
                 if term and term.strip():
                     term = term.strip('.,;:!?()"\'')
                     if term.lower() not in CLASSIFICATION_KEYWORDS:
-                        logger.info(f"Extracted search term: '{term}' using pattern: {pattern.pattern}")
+                        logger.debug("Extracted search term %r using pattern: %s", term, pattern.pattern)
                         return term.strip()
-    logger.warning(f"No search term extracted from: '{message[:100]}...'")
+    logger.info("No search term extracted from: %r", message[:100], extra={"event": "customs.no_term"})
     return None
 
-def format_cross_rulings_for_context(rulings: list[dict], max_to_format: int = 3) -> str:
+def format_cross_rulings_for_context(rulings: list[dict] | list[Ruling] | RulingTable, max_to_format: int = 3) -> str:
+    # Raw API dicts and compact records share the same .get() field access
     if not rulings:
         return "No specific CROSS rulings found."
     
@@ -94,16 +217,118 @@ def format_cross_rulings_for_context(rulings: list[dict], max_to_format: int = 3
         # 'tariffs' is expected to be a list of strings
         tariffs_list = ruling.get('tariffs', [])
         if isinstance(tariffs_list, list) and tariffs_list:
-            parts.append(f"    Tariffs: {', '.join(tariffs_list)}")
+            parts.append(f"    Tariffs: {', '.join(normalize_tariffs(tariffs_list))}")
         if ruling.get('url'):
              parts.append(f"    URL: {ruling.get('url')}")
         formatted_list.append("\n".join(parts))
     
     return "\n".join(formatted_list) if len(formatted_list) > 1 else "No specific CROSS rulings found or able to be formatted."
 
-def customs_router(message: str, language: str = None, id: str = None) -> dict:
-    logger.info(f"Entering customs_router with message: '{message[:100]}...' Language: {language}, ID: {id}")
-    
+def fetch_cross_candidates(search_term: str, deadline: Deadline, alternatives: list[str] = ()) -> tuple[list[dict], str]:
+    """
+    CROSS candidate page for re-ranking, served from the cache when warm, and
+    the term whose search produced it. Alternatives (the spelling-corrected
+    term, then synonyms) are searched in turn only while results are empty;
+    the first non-empty page is cached under search_term together
+    with that source term.
+    """
+    key = cross_cache_key(search_term, RERANK_CANDIDATES)
+    cached = cross_cache.get(key)
+    # Snapshots written before source terms were cached hold bare lists; treat them as misses
+    if isinstance(cached, dict):
+        logger.info("CROSS cache hit for %r.", search_term, extra={"event": "cross.cache_hit"})
+        return cached["rulings"], cached["term"]
+    for term in [search_term, *alternatives]:
+        candidates = search_cross_rulings(term, page_size=RERANK_CANDIDATES,
+                                          timeout=deadline.timeout(CROSS_REQUEST_TIMEOUT, "CROSS search"))
+        if candidates:
+            break
+    else:
+        term = search_term
+    cross_cache.set(key, {"term": term, "rulings": candidates})
+    return candidates, term
+
+def _load_ranked_candidates(search_term: str, source: str, deadline: Deadline) -> tuple[list[dict], bool]:
+    # Full first page of the source term, re-ranked for the user's term as on the first answer;
+    # a short page means CROSS has nothing further
+    candidates, _ = fetch_cross_candidates(source, deadline)
+    ranked = rerank_rulings(search_term, candidates, top_k=len(candidates),
+                            budget_ms=min(RERANK_BUDGET_MS, deadline.remaining() * 1000))
+    return ranked, len(candidates) < RERANK_CANDIDATES
+
+# Candidate sets behind "more rulings" cursors; later CROSS pages of the source term are appended unranked
+PAGINATOR = Paginator(
+    fetch_page=lambda source, page, timeout: search_cross_rulings(source, page_size=RERANK_CANDIDATES, page=page, timeout=timeout),
+    load_first=_load_ranked_candidates
+)
+
+def _next_rulings_page(cursor: str, deadline: Deadline) -> dict:
+    try:
+        rulings, next_cursor, search_term = PAGINATOR.next_page(cursor, deadline)
+    except InvalidCursor as e_cursor:
+        return {"kind": "error", "result": None, "history": [], "error": str(e_cursor)}
+    except DeadlineExceeded:
+        raise
+    except (requests.exceptions.RequestException, TimeoutError) as e_req:
+        logger.error(f"CROSS API error while paging cursor results: {e_req}")
+        return {
+            "kind": "cross_rulings_result",
+            "result": "Could not retrieve more CROSS rulings at this time.",
+            "cross_rulings": [],
+            "cursor": cursor,
+            "history": [],
+            "error": str(e_req)
+        }
+    logger.info("Served %d more rulings for %r.", len(rulings), search_term, extra={"event": "cross.page"})
+    return {
+        "kind": "cross_rulings_result",
+        "result": format_cross_rulings_for_context(rulings, max_to_format=len(rulings)) if rulings
+                  else f"No more U.S. Customs CROSS rulings were found for '{search_term}'.",
+        "cross_rulings": rulings,
+        "cursor": next_cursor,
+        "history": [],
+        "error": None
+    }
+
+def customs_router(message: str, language: str = None, id: str = None, deadline: Deadline = None, cursor: str = None,
+                   client: str = None) -> dict:
+    logger.info("Entering customs_router", extra={"event": "customs.request", "language": language, "id": id})
+    logger.debug("Message: %r", message)
+    # Each upstream hop gets the remaining budget as its timeout
+    deadline = deadline or Deadline()
+
+    # Conversation history is only tracked when the caller supplies an id. The id is chosen by the
+    # caller, so it is scoped to the client: another caller reusing it does not get this history.
+    session_id = f"{client}|{id}" if id and client else id
+    chat_history = SESSION_STORE.get_history(session_id) if id else []
+    try:
+        # A cursor from an earlier answer pages through its cached candidate set
+        result = _next_rulings_page(cursor, deadline) if cursor else _route_message(message, chat_history, deadline, client)
+    except DeadlineExceeded as e_deadline:
+        logger.warning(f"Abandoning request: {e_deadline}")
+        result = {"kind": "error", "result": None, "history": [], "error": str(e_deadline)}
+
+    if id and result.get("error") is None and result.get("result"):
+        SESSION_STORE.append(session_id, message, result["result"])
+        result["history"] = SESSION_STORE.get_history(session_id)
+    return result
+
+def _route_message(message: str, chat_history: list, deadline: Deadline, client: str = None) -> dict:
+    # Direct code questions are answered locally and need no upstream configuration.
+    ruling_number = extract_ruling_number(message)
+    if ruling_number:
+        ruling_result = format_ruling_lookup(ruling_number, deadline)
+        if ruling_result is not None:
+            logger.info("Answered ruling %s locally.", ruling_number, extra={"event": "customs.ruling_lookup"})
+            return ruling_result
+
+    hts_code = extract_hts_code_query(message)
+    if hts_code:
+        hts_result = format_hts_lookup(hts_code)
+        if hts_result is not None:
+            logger.info("Answered HTS code query %s locally.", hts_code, extra={"event": "customs.hts_lookup"})
+            return hts_result
+
     if not AZURE_ENDPOINT or not AZURE_API_KEY or not HEADERS.get("Authorization"):
         error_msg = "Backend Misconfiguration: Azure endpoint or API key missing."
         logger.critical(error_msg)
@@ -112,25 +337,36 @@ def customs_router(message: str, language: str = None, id: str = None) -> dict:
     ai_contexts = ""
 
     if is_classification_question(message):
-        logger.info(f"Message identified as classification question: '{message[:100]}...'")
+        logger.debug("Message identified as classification question: %r", message[:100])
         search_term = extract_search_term(message)
         if search_term:
-            logger.info(f"Extracted search term: '{search_term}' for API call.")
+            # Literal plural-folded term; synonym and spelling forms are only fallbacks when it finds nothing
+            normalized = normalize_search_term(search_term)
+            search_term = normalized.term or search_term
+            logger.info("Extracted search term %r for API call.", search_term,
+                        extra={"event": "customs.search_term", "corrections": normalized.corrections})
             try:
-                rulings_from_api = search_cross_rulings(search_term, page_size=3)
+                # Fetch a larger candidate page and keep the locally re-ranked top 3
+                record_term(search_term, client)
+                candidates, source_term = fetch_cross_candidates(search_term, deadline, normalized.alternatives)
+                ranked = rerank_rulings(search_term, candidates, top_k=len(candidates),
+                                        budget_ms=min(RERANK_BUDGET_MS, deadline.remaining() * 1000))
+                rulings_from_api = ranked[:3]
                 if rulings_from_api:
-                    logger.info(f"Successfully retrieved {len(rulings_from_api)} rulings from API for '{search_term}'.")
+                    logger.info("Retrieved %d rulings for %r.", len(rulings_from_api), search_term, extra={"event": "cross.rulings"})
                     formatted = format_cross_rulings_for_context(rulings_from_api, max_to_format=3)
                     # Return the actual top 3 rulings directly, bypassing Azure ML
                     return {
                         "kind": "cross_rulings_result",
                         "result": formatted,
                         "cross_rulings": rulings_from_api,
+                        "cursor": PAGINATOR.start(search_term, ranked, len(candidates) < RERANK_CANDIDATES, shown=3,
+                                                  source=source_term),
                         "history": [],
                         "error": None
                     }
                 else:
-                    logger.info(f"No rulings returned from API for '{search_term}'.")
+                    logger.info("No rulings returned for %r.", search_term, extra={"event": "cross.rulings"})
                     return {
                         "kind": "cross_rulings_result",
                         "result": f"No specific U.S. Customs CROSS rulings were found for '{search_term}'.",
@@ -138,6 +374,17 @@ def customs_router(message: str, language: str = None, id: str = None) -> dict:
                         "history": [],
                         "error": None
                     }
+            except DeadlineExceeded:
+                raise
+            except requests.exceptions.Timeout as e_timeout:
+                logger.error(f"CROSS API timed out for search term '{search_term}': {e_timeout}")
+                return {
+                    "kind": "cross_rulings_result",
+                    "result": f"Could not retrieve CROSS rulings for '{search_term}' within the request deadline.",
+                    "cross_rulings": [],
+                    "history": [],
+                    "error": str(e_timeout)
+                }
             except requests.exceptions.HTTPError as e_http:
                 logger.error(f"CROSS API HTTP error for search term '{search_term}': {e_http}")
                 return {
@@ -175,29 +422,42 @@ def customs_router(message: str, language: str = None, id: str = None) -> dict:
                     "error": str(e_scrp)
                 }
         else:
-            logger.info("No search term extracted from classification question. AI will rely on general knowledge.")
+            logger.debug("No search term extracted from classification question. AI will rely on general knowledge.")
             ai_contexts = "Note: A specific item for CROSS ruling search was not identified in the query."
     else:
-        logger.info("Message not identified as a classification question. No CROSS ruling search will be performed.")
+        logger.debug("Message not identified as a classification question. No CROSS ruling search will be performed.")
         ai_contexts = ""
 
-    logger.info(f"Preparing to call Azure ML. Context provided to AI: '{ai_contexts[:200]}...' if any.")
+    logger.debug("Preparing to call Azure ML. Context provided to AI: %r", ai_contexts[:200])
     
     payload = {
         "question": message, # Original user question
         "contexts": ai_contexts, # Formatted rulings or error message
-        # "chat_history": [] # if your PF uses chat history
+        "chat_history": chat_history # Trimmed window from SESSION_STORE
     }
-    logger.debug(f"Sending payload to Azure ML. Keys: {list(payload.keys())}")
+    logger.debug("Sending payload to Azure ML: %s", payload)
+
+    # Answers without conversation context are reusable across users
+    record_question(message, client)
+    cache_key = answer_cache_key(message, ai_contexts) if not chat_history else None
+    if cache_key is not None:
+        cached_output = answer_cache.get(cache_key)
+        if cached_output is not None:
+            logger.info("Azure ML answer served from cache.", extra={"event": "promptflow.cache_hit"})
+            return {"kind": "customs_agent_text_result", "result": cached_output, "history": [], "error": None}
 
+    timeout = deadline.timeout(REQUEST_TIMEOUT, "Azure ML call")
     try:
-        response = requests.post(AZURE_ENDPOINT, headers=HEADERS, json=payload, timeout=REQUEST_TIMEOUT)
-        logger.info(f"Azure ML Response Status Code: {response.status_code}")
+        response = requests.post(AZURE_ENDPOINT, headers=HEADERS, data=serialization.dumps(payload), timeout=timeout)
+        logger.info("Azure ML response status %d", response.status_code, extra={"event": "promptflow.response"})
         response.raise_for_status()
-        ai_response_data = response.json()
-        logger.debug(f"Azure ML Parsed JSON Response Keys: {list(ai_response_data.keys())}")
+        ai_response_data = serialization.loads(response.content)
+        logger.debug("Azure ML response: %s", ai_response_data)
         
-        output_text = ai_response_data.get("output") or ai_response_data.get("answer") or "[Agent response not found in expected field]"
+        output_text = ai_response_data.get("output") or ai_response_data.get("answer")
+        if output_text and cache_key is not None:
+            answer_cache.set(cache_key, output_text)
+        output_text = output_text or "[Agent response not found in expected field]"
         return {
             "kind": "customs_agent_text_result",
             "result": output_text,
@@ -205,7 +465,7 @@ def customs_router(message: str, language: str = None, id: str = None) -> dict:
             "error": None
         }
     except requests.exceptions.Timeout:
-        error_message = f"Request to Azure ML timed out after {REQUEST_TIMEOUT} seconds."
+        error_message = f"Request to Azure ML timed out after {timeout:.1f} seconds."
         logger.error(error_message)
         return {"kind": "error", "result": None, "history": [], "error": error_message}
     except requests.exceptions.HTTPError as e_http:
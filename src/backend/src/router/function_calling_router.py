@@ -2,8 +2,10 @@
 # Licensed under the MIT License.
 import os
 import json
+import time
 import logging
 import pii_redacter
+from concurrent.futures import ThreadPoolExecutor
 from typing import Callable
 from azure.core.rest import HttpRequest
 from azure.ai.language.conversations.authoring import ConversationAuthoringClient
@@ -18,6 +20,12 @@ _logger = logging.getLogger(__name__)
 PII_ENABLED = os.environ.get("PII_ENABLED", "false").lower() == "true"
 FUNCTION_CALLING_PROMPT = get_prompt("function_calling.txt")
 
+# Exported CLU intents/CQA questions are cached on disk for warm restarts:
+SNAPSHOT_PATH = os.environ.get("ROUTER_SNAPSHOT_PATH", "router_snapshot.json")
+SNAPSHOT_REFRESH = os.environ.get("ROUTER_SNAPSHOT_REFRESH", "false").lower() == "true"
+# Projects edited in place keep their names, so snapshots older than this are re-exported:
+SNAPSHOT_MAX_AGE = float(os.environ.get("ROUTER_SNAPSHOT_MAX_AGE", "86400"))
+
 
 def get_tools(
     path: str = "tools/"
@@ -99,6 +107,79 @@ def get_cqa_questions() -> list[str]:
         raise e
 
 
+def load_snapshot(
+    path: str = SNAPSHOT_PATH
+) -> dict:
+    """
+    Load exported project snapshot from disk.
+    """
+    try:
+        with open(path, 'r') as fp:
+            return json.load(fp)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        _logger.warning(f"Ignoring unreadable snapshot {path}: {e}")
+        return {}
+
+
+def save_snapshot(
+    snapshot: dict,
+    path: str = SNAPSHOT_PATH
+):
+    """
+    Atomically write exported project snapshot to disk.
+    """
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'w') as fp:
+            json.dump(snapshot, fp)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        _logger.warning(f"Unable to write snapshot {path}: {e}")
+
+
+def get_project_exports(
+    path: str = SNAPSHOT_PATH,
+    refresh: bool = SNAPSHOT_REFRESH,
+    max_age: float = SNAPSHOT_MAX_AGE
+) -> tuple[list[str], list[str]]:
+    """
+    Get CLU intents and CQA questions.
+
+    Warm-starts from the local snapshot when it matches the configured
+    projects and is at most max_age seconds old; otherwise runs both
+    project exports concurrently and persists the result.
+    """
+    projects = {
+        "clu": os.environ['CLU_PROJECT_NAME'],
+        "cqa": os.environ['CQA_PROJECT_NAME']
+    }
+
+    snapshot = load_snapshot(path)
+    age = time.time() - snapshot.get("exported_at", 0)
+    if not refresh and snapshot.get("projects") == projects and age <= max_age:
+        _logger.info(f"Using project snapshot from {path} ({age:.0f}s old)")
+        return snapshot["intents"], snapshot["questions"]
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        intents_future = executor.submit(get_clu_intents)
+        questions_future = executor.submit(get_cqa_questions)
+        clu_intents = intents_future.result()
+        cqa_questions = questions_future.result()
+
+    save_snapshot(
+        snapshot={
+            "projects": projects,
+            "exported_at": time.time(),
+            "intents": clu_intents,
+            "questions": cqa_questions
+        },
+        path=path
+    )
+    return clu_intents, cqa_questions
+
+
 def create_router_hook(
     router: Callable[[str, str, str], dict]
 ) -> Callable[[str, str, str], dict]:
@@ -137,8 +218,7 @@ def create_function_calling_router() -> Callable[[str, str, str], dict]:
         )
     }
 
-    clu_intents = get_clu_intents()
-    cqa_questions = get_cqa_questions()
+    clu_intents, cqa_questions = get_project_exports()
 
     prompt = FUNCTION_CALLING_PROMPT.format(
         intents=", ".join(clu_intents),
@@ -60,19 +60,20 @@ def create_orchestration_router() -> Callable[[str, str, str], dict]:
         )
 
         try:
-            _logger.info(f"Calling {project_name}:{deployment_name} runtime")
+            _logger.info("Calling %s:%s runtime", project_name, deployment_name, extra={"event": "orchestration.call"})
 
             response = client.analyze_conversation(
                 task=input_json
             )
 
-            _logger.info(f"Runtime response: {response}")
+            # Full payloads only at debug; formatted lazily if enabled
+            _logger.debug("Runtime response: %s", response)
             return parse_response(
                 response=response
             )
 
         except Exception as e:
-            _logger.error(f"Runtime call failed: {e}")
+            _logger.error("Runtime call failed: %s", e, extra={"event": "orchestration.error"})
             return {
                 "error": e
             }
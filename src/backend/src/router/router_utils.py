@@ -2,11 +2,9 @@
 # Licensed under the MIT License.
 from typing import Callable
 from router.router_type import RouterType
-from router.clu_router import create_clu_router
-from router.cqa_router import create_cqa_router
-from router.function_calling_router import create_function_calling_router
-from router.orchestration_router import create_orchestration_router
-from router.customs_router import customs_router
+
+# Router modules (and their Azure SDK clients) are imported only when the
+# corresponding router type is created.
 
 
 def create_router(
@@ -18,13 +16,44 @@ def create_router(
     if router_type == RouterType.BYPASS:
         return lambda x, y, z: None
     if router_type == RouterType.CLU:
+        from router.clu_router import create_clu_router
         return create_clu_router()
     elif router_type == RouterType.CQA:
+        from router.cqa_router import create_cqa_router
         return create_cqa_router()
     elif router_type == RouterType.ORCHESTRATION:
+        from router.orchestration_router import create_orchestration_router
         return create_orchestration_router()
     elif router_type == RouterType.FUNCTION_CALLING:
+        from router.function_calling_router import create_function_calling_router
         return create_function_calling_router()
     elif router_type == RouterType.CUSTOMS_AGENT:
+        from router.customs_router import customs_router
         return customs_router
     raise ValueError("Unsupported router type")
+
+
+if __name__ == "__main__":
+    import os
+    import subprocess
+    import sys
+    import time
+
+    # Startup benchmark: cold import in a fresh interpreter, then router creation.
+    src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    runs = 5
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-c", "import router.router_utils"],
+            cwd=src_dir,
+            check=True
+        )
+        timings.append(time.perf_counter() - start)
+    print(f"cold import router.router_utils: {min(timings) * 1000:.1f} ms (best of {runs})")
+
+    router_type = RouterType(sys.argv[1]) if len(sys.argv) > 1 else RouterType.BYPASS
+    start = time.perf_counter()
+    create_router(router_type)
+    print(f"create_router({router_type.name}): {(time.perf_counter() - start) * 1000:.1f} ms")
@@ -0,0 +1,330 @@
+"""
+ruling_corpus.py - Read-only, memory-mapped CROSS ruling corpus shared by worker processes.
+
+The corpus is one file: a header, a fixed-width row table, a vocabulary
+table, per-row tariff ids, a sorted rulingNumber index, a sorted tariff
+index and a UTF-8 string heap (all little-endian). Workers mmap it, so its
+pages live once in the OS page cache however many workers are forked, and
+lookups read straight from the mapping without deserializing the corpus.
+
+    python ruling_corpus.py build corpus.bin --top 500      # from popular terms in the query log
+    python ruling_corpus.py build corpus.bin --terms-file terms.txt --merge
+    python ruling_corpus.py benchmark
+"""
+
+import heapq
+import logging
+import mmap
+import os
+import struct
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from hts_index import normalize_hts_code
+from ruling_record import Ruling, RulingTable
+
+logger = logging.getLogger(__name__)
+
+RULING_CORPUS_PATH = os.getenv("RULING_CORPUS_PATH")
+
+MAGIC = b"CROSSRC1"
+VERSION = 1
+# magic, version, rows, vocab entries, tariff postings, then section offsets:
+# rows, vocab, tariff ids, number index, tariff index, heap
+HEADER = struct.Struct("<8sIIII6Q")
+# number off/len, subject off/len, date ordinal, flags, collection, categories,
+# tariff start/count, url off/len (heap offsets are relative to the heap section)
+ROW = struct.Struct("<QIQIiIIIIIQI")
+VOCAB = struct.Struct("<QI")
+TARIFF_ID = struct.Struct("<I")
+NUMBER_KEY_WIDTH = 16
+NUMBER_ENTRY = struct.Struct(f"<{NUMBER_KEY_WIDTH}sI")
+TARIFF_KEY_WIDTH = 10
+TARIFF_ENTRY = struct.Struct(f"<{TARIFF_KEY_WIDTH}sI")
+# Length marker for "no value" (vocab entry 0) and for standard ruling URLs
+ABSENT = 0xFFFFFFFF
+_MISSING = object()
+
+
+def _number_key(number: str) -> bytes:
+    return number.encode("utf-8")[:NUMBER_KEY_WIDTH].ljust(NUMBER_KEY_WIDTH, b"\0")
+
+
+def build_corpus(rulings: Iterable[Union[Dict[str, Any], Ruling]], path: str) -> int:
+    """Writes rulings (deduplicated by rulingNumber, last wins) to path atomically; returns the row count."""
+    latest: Dict[str, Ruling] = {}
+    for item in rulings:
+        ruling = item if isinstance(item, Ruling) else Ruling.from_api(item)
+        if ruling.number:
+            latest[ruling.number] = ruling
+    table = RulingTable()
+    table.extend(latest[number] for number in sorted(latest))
+
+    heap = bytearray()
+
+    def put(value: str) -> tuple:
+        data = value.encode("utf-8")
+        offset = len(heap)
+        heap.extend(data)
+        return offset, len(data)
+
+    rows = bytearray()
+    for i, ruling in enumerate(table):
+        number_off, number_len = put(ruling.number)
+        subject_off, subject_len = put(ruling.subject)
+        url_off, url_len = (0, ABSENT) if ruling._url is None else put(ruling._url)
+        start, end = table.tariff_starts[i], table.tariff_starts[i + 1]
+        rows += ROW.pack(number_off, number_len, subject_off, subject_len, ruling.date_ordinal, ruling.flags,
+                         table.collections[i], table.categories[i], start, end - start, url_off, url_len)
+
+    vocab = bytearray()
+    for term in table.vocab:
+        vocab += VOCAB.pack(0, ABSENT) if term is None else VOCAB.pack(*put(term))
+
+    number_index = b"".join(NUMBER_ENTRY.pack(_number_key(n), i) for i, n in enumerate(table.numbers))
+
+    postings = set()
+    for i in range(len(table)):
+        for term_id in table.tariff_ids[table.tariff_starts[i]:table.tariff_starts[i + 1]]:
+            digits = normalize_hts_code(table.vocab[term_id])
+            if digits:
+                postings.add((digits.encode("ascii").ljust(TARIFF_KEY_WIDTH, b"\0"), i))
+    tariff_index = b"".join(TARIFF_ENTRY.pack(key, row) for key, row in sorted(postings))
+
+    tariff_ids = table.tariff_ids.tobytes() if TARIFF_ID.size == table.tariff_ids.itemsize else \
+        b"".join(TARIFF_ID.pack(t) for t in table.tariff_ids)
+
+    sections = [bytes(rows), bytes(vocab), tariff_ids, number_index, tariff_index, bytes(heap)]
+    offsets, position = [], HEADER.size
+    for section in sections:
+        offsets.append(position)
+        position += len(section)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as fp:
+        fp.write(HEADER.pack(MAGIC, VERSION, len(table), len(table.vocab), len(postings), *offsets))
+        for section in sections:
+            fp.write(section)
+    os.replace(tmp_path, path)
+    logger.info(f"Wrote ruling corpus {path}: {len(table)} rulings, {len(postings)} tariff postings, {position} bytes.")
+    return len(table)
+
+
+class RulingCorpus:
+    """Read-only view of a corpus file; safe to share across threads and forked workers."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as fp:
+            self._mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mm)
+        (magic, version, self.row_count, self.vocab_count, self.posting_count,
+         self._rows, self._vocab, self._tariff_ids, self._numbers, self._tariffs, self._heap) = HEADER.unpack_from(self._mm)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} ruling corpus")
+        self._vocab_cache: Dict[int, Optional[str]] = {}
+
+    def close(self) -> None:
+        self._view.release()
+        self._mm.close()
+
+    def __len__(self) -> int:
+        return self.row_count
+
+    def _string(self, offset: int, length: int) -> str:
+        start = self._heap + offset
+        return str(self._view[start:start + length], "utf-8")
+
+    def _term(self, term_id: int) -> Optional[str]:
+        # The vocabulary is small (tariffs, collections, categories); decode each term once
+        term = self._vocab_cache.get(term_id, _MISSING)
+        if term is _MISSING:
+            offset, length = VOCAB.unpack_from(self._mm, self._vocab + term_id * VOCAB.size)
+            term = self._vocab_cache[term_id] = None if length == ABSENT else self._string(offset, length)
+        return term
+
+    def row(self, i: int) -> Ruling:
+        (number_off, number_len, subject_off, subject_len, date_ordinal, flags, collection, categories,
+         tariff_start, tariff_count, url_off, url_len) = ROW.unpack_from(self._mm, self._rows + i * ROW.size)
+        ids = self._tariff_ids + tariff_start * TARIFF_ID.size
+        tariffs = tuple(self._term(TARIFF_ID.unpack_from(self._mm, ids + k * TARIFF_ID.size)[0]) for k in range(tariff_count))
+        return Ruling(
+            self._string(number_off, number_len), date_ordinal, self._string(subject_off, subject_len), tariffs,
+            self._term(collection), self._term(categories),
+            None if url_len == ABSENT else self._string(url_off, url_len), flags,
+        )
+
+    def _date_ordinal(self, i: int) -> int:
+        # date_ordinal is the fifth field of the row struct
+        return struct.unpack_from("<i", self._mm, self._rows + i * ROW.size + 24)[0]
+
+    def _lower_bound(self, base: int, entry: struct.Struct, count: int, width: int, key: bytes) -> int:
+        low, high = 0, count
+        while low < high:
+            mid = (low + high) // 2
+            start = base + mid * entry.size
+            if self._mm[start:start + width] < key:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def find(self, ruling_number: str) -> Optional[Ruling]:
+        """Lookup by rulingNumber (binary search over the fixed-width number index)."""
+        key = _number_key(ruling_number)
+        position = self._lower_bound(self._numbers, NUMBER_ENTRY, self.row_count, NUMBER_KEY_WIDTH, key)
+        # Keys are truncated to NUMBER_KEY_WIDTH bytes; confirm against the full number
+        while position < self.row_count:
+            entry_key, row = NUMBER_ENTRY.unpack_from(self._mm, self._numbers + position * NUMBER_ENTRY.size)
+            if entry_key != key:
+                return None
+            ruling = self.row(row)
+            if ruling.number == ruling_number:
+                return ruling
+            position += 1
+        return None
+
+    def by_tariff_prefix(self, prefix: str, limit: int = 10) -> List[Ruling]:
+        """Rulings citing a tariff starting with prefix (digits, dots ignored), newest first."""
+        digits = "".join(c for c in prefix if c.isdigit())[:TARIFF_KEY_WIDTH]
+        if not digits:
+            return []
+        low_key = digits.encode("ascii")
+        high_key = low_key.ljust(TARIFF_KEY_WIDTH, b"\xff")
+        start = self._lower_bound(self._tariffs, TARIFF_ENTRY, self.posting_count, TARIFF_KEY_WIDTH, low_key)
+        end = self._lower_bound(self._tariffs, TARIFF_ENTRY, self.posting_count, TARIFF_KEY_WIDTH, high_key)
+        rows = {TARIFF_ENTRY.unpack_from(self._mm, self._tariffs + p * TARIFF_ENTRY.size)[1] for p in range(start, end)}
+        newest = heapq.nlargest(limit, rows, key=self._date_ordinal)
+        return [self.row(i) for i in newest]
+
+
+_corpus: Optional[RulingCorpus] = None
+_corpus_loaded = False
+_load_lock = threading.Lock()
+
+
+def get_corpus() -> Optional[RulingCorpus]:
+    """Returns the corpus mapped from RULING_CORPUS_PATH (opened once), or None if unavailable."""
+    global _corpus, _corpus_loaded
+    if not _corpus_loaded:
+        with _load_lock:
+            if not _corpus_loaded:
+                if RULING_CORPUS_PATH:
+                    try:
+                        _corpus = RulingCorpus(RULING_CORPUS_PATH)
+                        logger.info(f"Mapped ruling corpus {RULING_CORPUS_PATH} ({len(_corpus)} rulings).")
+                    except (OSError, ValueError, struct.error) as e:
+                        logger.error(f"Could not open ruling corpus {RULING_CORPUS_PATH}: {e}")
+                # Only marked loaded once _corpus is final, so unlocked readers never see it early
+                _corpus_loaded = True
+    return _corpus
+
+
+def collect_rulings(terms: Iterable[str], pages: int = 1, page_size: int = 100) -> List[Dict[str, Any]]:
+    """Fetches CROSS search results for each term (search_cross_rulings output)."""
+    from scraper import search_cross_rulings
+
+    rulings = []
+    for term in terms:
+        for page in range(1, pages + 1):
+            try:
+                items = search_cross_rulings(term, page_size=page_size, page=page)
+            except Exception as e:
+                logger.warning(f"Skipping '{term}' page {page}: {e}")
+                break
+            rulings.extend(items)
+            if len(items) < page_size:
+                break
+    return rulings
+
+
+if __name__ == "__main__":
+    import argparse
+    import random
+    import sys
+    import tempfile
+    import time
+
+    parser = argparse.ArgumentParser(description="Build or benchmark the memory-mapped ruling corpus.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="build a corpus from CROSS searches")
+    build.add_argument("path")
+    build.add_argument("--terms-file", help="one search term per line")
+    build.add_argument("--top", type=int, default=0, help="also use the N most popular terms from the query log")
+    build.add_argument("--pages", type=int, default=1)
+    build.add_argument("--merge", action="store_true", help="keep rulings already in the corpus at path")
+    commands.add_parser("benchmark", help="lookup latency and per-worker memory on a synthetic corpus")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        terms = []
+        if args.terms_file:
+            with open(args.terms_file, encoding="utf-8") as fp:
+                terms.extend(line.strip() for line in fp if line.strip())
+        if args.top:
+            from query_log import top_queries
+            terms.extend(term for term, _ in top_queries("terms", args.top))
+        rulings: List[Any] = []
+        if args.merge and os.path.exists(args.path):
+            existing = RulingCorpus(args.path)
+            rulings.extend(existing.row(i) for i in range(len(existing)))
+        rulings.extend(collect_rulings(dict.fromkeys(terms), pages=args.pages))
+        print(f"{build_corpus(rulings, args.path)} rulings written to {args.path}")
+        sys.exit(0)
+
+    # Benchmark: 300k synthetic rulings; lookup latency, then memory of 4
+    # forked workers each touching the whole corpus (mmap vs. RulingTable).
+    rng = random.Random(0)
+    pool = [f"{rng.randint(100, 9799):04d}.{rng.randint(10, 99)}.{rng.randint(0, 9999):04d}" for _ in range(19_000)]
+    items = [{
+        "rulingNumber": f"N{i:06d}",
+        "rulingDate": f"{rng.randint(1995, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T00:00:00",
+        "subject": f"The tariff classification of item {i} model {rng.randint(1, 9999)} from China",
+        "tariffs": [pool[rng.randrange(len(pool))] for _ in range(rng.choice((1, 1, 2, 3)))],
+        "collection": rng.choice(("NY", "HQ")),
+    } for i in range(300_000)]
+    path = os.path.join(tempfile.mkdtemp(), "corpus.bin")
+    start = time.perf_counter()
+    build_corpus(items, path)
+    print(f"build: {time.perf_counter() - start:.1f}s, {os.path.getsize(path) / 2**20:.1f} MiB on disk")
+
+    corpus = RulingCorpus(path)
+    assert corpus.find("N123456").to_dict()["subject"] == items[123456]["subject"]
+    runs = 20_000
+    numbers = [f"N{rng.randrange(len(items)):06d}" for _ in range(runs)]
+    start = time.perf_counter()
+    for number in numbers:
+        corpus.find(number)
+    print(f"find: {(time.perf_counter() - start) / runs * 1e6:.1f} us")
+    start = time.perf_counter()
+    for tariff in pool[:2000]:
+        corpus.by_tariff_prefix(tariff[:7], limit=3)
+    print(f"by_tariff_prefix (6 digits): {(time.perf_counter() - start) / 2000 * 1e6:.1f} us")
+
+    def smaps(field: str) -> int:
+        with open("/proc/self/smaps_rollup") as fp:
+            return sum(int(line.split()[1]) for line in fp if line.startswith(field)) * 1024
+
+    import multiprocessing
+
+    workers = 4
+    for label, load in [("RulingTable per worker", lambda: RulingTable.from_api(items)),
+                        ("mmap corpus", lambda: RulingCorpus(path))]:
+        # Workers measure together so shared pages are split between them in PSS
+        barrier = multiprocessing.get_context("fork").Barrier(workers)
+        children = []
+        for _ in range(workers):
+            pid = os.fork()
+            if pid == 0:
+                before = smaps("Private_Clean") + smaps("Private_Dirty")
+                loaded = load()
+                for i in range(0, len(loaded), 7):
+                    loaded.row(i)
+                barrier.wait()
+                private = smaps("Private_Clean") + smaps("Private_Dirty") - before
+                print(f"{label:>24}: +{private / 2**20:6.1f} MiB private, PSS {smaps('Pss:') / 2**20:6.1f} MiB")
+                barrier.wait()
+                os._exit(0)
+            children.append(pid)
+        for pid in children:
+            os.waitpid(pid, 0)
@@ -0,0 +1,311 @@
+"""
+ruling_record.py - Compact in-memory representation of CROSS rulings.
+
+`Ruling` is a __slots__ record with interned tariff, collection and category
+strings; `RulingTable` stores a whole corpus column-wise (flat arrays plus
+vocabularies) and materializes `Ruling` rows on access. Both expose the API
+field names through a read-only mapping interface (`get`, `[]`, `in`), so
+code written against the raw API dicts (format_cross_rulings_for_context,
+the re-ranker, response projection) accepts them unchanged.
+
+Only the summary fields returned by the CROSS search API are kept.
+"""
+
+import logging
+import sys
+from array import array
+from datetime import date
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+import serialization
+
+logger = logging.getLogger(__name__)
+
+RULING_URL_TEMPLATE = "https://rulings.cbp.gov/ruling/{}"
+
+# Bit flags for the two revocation booleans
+REVOKED_BY_OPERATIONAL_LAW = 1
+OPERATIONALLY_REVOKED = 2
+
+FIELDS = (
+    "rulingNumber", "rulingDate", "subject", "tariffs", "collection", "categories",
+    "url", "isRevokedByOperationalLaw", "operationallyRevoked",
+)
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _date_ordinal(value: Any) -> int:
+    """"2021-06-01T00:00:00" -> proleptic ordinal; 0 when missing or malformed."""
+    try:
+        return date.fromisoformat(str(value)[:10]).toordinal()
+    except ValueError:
+        return 0
+
+
+def _url_or_default(number: str, url: Optional[str]) -> Optional[str]:
+    """None when the URL follows the standard pattern (it is then rebuilt on access)."""
+    if url == RULING_URL_TEMPLATE.format(number):
+        return None
+    return url or ""
+
+
+class Ruling:
+    """One CROSS ruling; read like the API dict (`ruling.get("subject")`)."""
+
+    __slots__ = ("number", "date_ordinal", "subject", "tariffs", "collection", "categories", "_url", "flags")
+
+    def __init__(self, number: str, date_ordinal: int, subject: str, tariffs: tuple,
+                 collection: Optional[str], categories: Optional[str], url: Optional[str], flags: int):
+        self.number = number
+        self.date_ordinal = date_ordinal
+        self.subject = subject
+        self.tariffs = tariffs
+        self.collection = collection
+        self.categories = categories
+        self._url = url
+        self.flags = flags
+
+    @classmethod
+    def from_api(cls, item: Dict[str, Any]) -> "Ruling":
+        number = item.get("rulingNumber") or ""
+        flags = (REVOKED_BY_OPERATIONAL_LAW if item.get("isRevokedByOperationalLaw") else 0) \
+            | (OPERATIONALLY_REVOKED if item.get("operationallyRevoked") else 0)
+        return cls(
+            number, _date_ordinal(item.get("rulingDate")), item.get("subject") or "",
+            tuple(_intern(t) for t in item.get("tariffs") or ()),
+            _intern(item.get("collection")), _intern(item.get("categories")),
+            _url_or_default(number, item.get("url")), flags,
+        )
+
+    @property
+    def url(self) -> str:
+        return RULING_URL_TEMPLATE.format(self.number) if self._url is None else self._url
+
+    @property
+    def ruling_date(self) -> Optional[str]:
+        return f"{date.fromordinal(self.date_ordinal).isoformat()}T00:00:00" if self.date_ordinal else None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key == "rulingNumber":
+            value = self.number
+        elif key == "rulingDate":
+            value = self.ruling_date
+        elif key == "subject":
+            value = self.subject
+        elif key == "tariffs":
+            value = list(self.tariffs) if self.tariffs else None
+        elif key == "collection":
+            value = self.collection
+        elif key == "categories":
+            value = self.categories
+        elif key == "url":
+            value = self.url
+        elif key == "isRevokedByOperationalLaw":
+            value = bool(self.flags & REVOKED_BY_OPERATIONAL_LAW)
+        elif key == "operationallyRevoked":
+            value = bool(self.flags & OPERATIONALLY_REVOKED)
+        else:
+            return default
+        return default if value is None or value == "" else value
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.get(key, KeyError)
+        if value is KeyError:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, KeyError) is not KeyError
+
+    def keys(self) -> List[str]:
+        return [k for k in FIELDS if k in self]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The API dict form (used when rulings are returned to clients)."""
+        return {k: self[k] for k in self.keys()}
+
+    def __repr__(self) -> str:
+        return f"Ruling({self.number!r}, {self.subject[:40]!r})"
+
+
+class StringColumn:
+    """Strings packed into one UTF-8 heap with an offsets array (no per-string object)."""
+
+    def __init__(self):
+        self.heap = bytearray()
+        self.offsets = array("Q", [0])
+
+    def append(self, value: str) -> None:
+        self.heap += value.encode("utf-8")
+        self.offsets.append(len(self.heap))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return self.heap[self.offsets[i]:self.offsets[i + 1]].decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        return (self[i] for i in range(len(self)))
+
+
+class RulingTable:
+    """
+    Column-oriented ruling corpus. Numbers and subjects live in packed
+    string columns; dates and flags in flat arrays; tariffs, collections and
+    categories are indexes into a shared vocabulary of interned strings.
+    """
+
+    def __init__(self):
+        self.numbers = StringColumn()
+        self.subjects = StringColumn()
+        self.dates = array("i")
+        self.flags = bytearray()
+        self.collections = array("I")
+        self.categories = array("I")
+        # Row i owns tariff_ids[tariff_starts[i]:tariff_starts[i + 1]]
+        self.tariff_starts = array("I", [0])
+        self.tariff_ids = array("I")
+        self.vocab: List[Optional[str]] = [None]
+        self._vocab_index: Dict[Optional[str], int] = {None: 0}
+        # Only non-standard URLs are stored
+        self.urls: Dict[int, str] = {}
+        self._number_index: Optional[Dict[str, int]] = None
+
+    def _term_id(self, value: Optional[str]) -> int:
+        term_id = self._vocab_index.get(value)
+        if term_id is None:
+            term_id = self._vocab_index[value] = len(self.vocab)
+            self.vocab.append(sys.intern(value))
+        return term_id
+
+    def append(self, item: Union[Dict[str, Any], Ruling]) -> None:
+        ruling = item if isinstance(item, Ruling) else Ruling.from_api(item)
+        row = len(self.numbers)
+        self.numbers.append(ruling.number)
+        self.subjects.append(ruling.subject)
+        self.dates.append(ruling.date_ordinal)
+        self.flags.append(ruling.flags)
+        self.collections.append(self._term_id(ruling.collection))
+        self.categories.append(self._term_id(ruling.categories))
+        self.tariff_ids.extend(self._term_id(t) for t in ruling.tariffs)
+        self.tariff_starts.append(len(self.tariff_ids))
+        if ruling._url is not None:
+            self.urls[row] = ruling._url
+        self._number_index = None
+
+    def extend(self, items: Iterable[Union[Dict[str, Any], Ruling]]) -> None:
+        for item in items:
+            self.append(item)
+
+    @classmethod
+    def from_api(cls, items: Iterable[Dict[str, Any]]) -> "RulingTable":
+        table = cls()
+        table.extend(items)
+        return table
+
+    def __len__(self) -> int:
+        return len(self.numbers)
+
+    def row(self, i: int) -> Ruling:
+        vocab = self.vocab
+        tariffs = tuple(vocab[t] for t in self.tariff_ids[self.tariff_starts[i]:self.tariff_starts[i + 1]])
+        return Ruling(
+            self.numbers[i], self.dates[i], self.subjects[i], tariffs,
+            vocab[self.collections[i]], vocab[self.categories[i]], self.urls.get(i), self.flags[i],
+        )
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Ruling, List[Ruling]]:
+        if isinstance(index, slice):
+            return [self.row(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self.row(index)
+
+    def __iter__(self) -> Iterator[Ruling]:
+        return (self.row(i) for i in range(len(self)))
+
+    def find(self, ruling_number: str) -> Optional[Ruling]:
+        """Lookup by rulingNumber; the index is built on first use."""
+        if self._number_index is None:
+            self._number_index = {n: i for i, n in enumerate(self.numbers)}
+        i = self._number_index.get(ruling_number)
+        return None if i is None else self.row(i)
+
+
+def load_rulings(path: str) -> RulingTable:
+    """
+    Loads a ruling corpus from a JSON file holding either a CROSS search
+    response ({"rulings": [...]}) or a plain list of rulings.
+    """
+    with open(path, "rb") as fp:
+        data = serialization.loads(fp.read())
+    items = data.get("rulings", []) if isinstance(data, dict) else data
+    table = RulingTable.from_api(items)
+    logger.info(f"Loaded {len(table)} rulings from {path} ({len(table.vocab)} distinct terms).")
+    return table
+
+
+if __name__ == "__main__":
+    import gc
+    import random
+    import subprocess
+
+    # RSS per million rulings by representation. Each representation is
+    # measured in a fresh interpreter; rows are generated in chunks so the
+    # source dicts are freed before measuring the compact forms.
+    def rss_bytes() -> int:
+        with open("/proc/self/statm") as fp:
+            return int(fp.read().split()[1]) * 4096
+
+    pool_rng = random.Random(0)
+    tariff_pool = [f"{pool_rng.randint(100, 9799):04d}.{pool_rng.randint(10, 99)}.{pool_rng.randint(0, 9999):04d}"
+                   for _ in range(19_000)]
+
+    def synthetic(start: int, count: int) -> List[Dict[str, Any]]:
+        rng = random.Random(start)
+        items = []
+        for i in range(start, start + count):
+            number = f"N{i:06d}"
+            items.append({
+                "rulingNumber": number,
+                "rulingDate": f"{rng.randint(1995, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T00:00:00",
+                "subject": f"The tariff classification of item {i} model {rng.randint(1, 9999)} from China",
+                # The schedule has ~19k statistical lines; draw from a pool that size
+                "tariffs": [tariff_pool[rng.randrange(len(tariff_pool))] for _ in range(rng.choice((1, 1, 2, 3)))],
+                "categories": rng.choice(("Classification", "Classification, Marking", "Origin")),
+                "collection": rng.choice(("NY", "HQ")),
+                "url": RULING_URL_TEMPLATE.format(number),
+                "isRevokedByOperationalLaw": False,
+                "operationallyRevoked": rng.random() < 0.01,
+            })
+        return items
+
+    if len(sys.argv) == 3 and sys.argv[1] == "--measure":
+        kind, count, chunk = sys.argv[2], 1_000_000, 20_000
+        gc.collect()
+        before = rss_bytes()
+        corpus: Any = RulingTable() if kind == "table" else []
+        for start in range(0, count, chunk):
+            items = synthetic(start, chunk)
+            if kind == "dict":
+                corpus.extend(items)
+            elif kind == "slots":
+                corpus.extend(Ruling.from_api(item) for item in items)
+            else:
+                corpus.extend(items)
+            del items
+        gc.collect()
+        print(f"{kind:>6}: {(rss_bytes() - before) / 2**20:8.1f} MiB per million rulings")
+        sys.exit(0)
+
+    sample = synthetic(0, 3)
+    table = RulingTable.from_api(sample)
+    assert [r.to_dict() for r in table] == sample, "round trip changed ruling fields"
+    for kind in ("dict", "slots", "table"):
+        subprocess.run([sys.executable, __file__, "--measure", kind], check=True)
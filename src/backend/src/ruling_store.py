@@ -0,0 +1,310 @@
+"""
+ruling_store.py - Full ruling text fetched by rulingNumber and kept in a compressed local store.
+
+Bodies are content-addressed (SHA-256 of the text) and compressed with zstd
+when the zstandard package is installed, zlib otherwise, using a shared
+dictionary trained on stored rulings (they share most of their boilerplate).
+Ruling numbers map to digests through small ref files, so all worker
+processes can read and write the store without locking.
+
+    python ruling_store.py prefetch --top 100    # bodies of rulings returned for popular terms
+    python ruling_store.py train                 # (re)train the dictionary and recompress
+    python ruling_store.py benchmark
+"""
+
+import hashlib
+import logging
+import os
+import re
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import quote
+
+import requests
+
+import serialization
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+RULING_STORE_PATH = os.getenv("RULING_STORE_PATH", "ruling_store")
+RULING_TEXT_URL = os.getenv("RULING_TEXT_URL", "https://rulings.cbp.gov/api/ruling/{}")
+# Serve only stored bodies, never fetch
+RULING_TEXT_OFFLINE = os.getenv("RULING_TEXT_OFFLINE", "false").lower() == "true"
+RULING_STORE_CODEC = os.getenv("RULING_STORE_CODEC", "zstd" if zstandard is not None else "zlib")
+DICTIONARY_SIZE = 32 * 1024  # zlib uses at most a 32 KiB window
+
+# Blob header: codec byte + 8-byte dictionary id (zeros when none)
+_CODEC_ZLIB = b"z"
+_CODEC_ZSTD = b"s"
+_NO_DICTIONARY = b"\0" * 8
+_UNSAFE_NAME = re.compile(r"[^A-Za-z0-9]")
+
+
+def _digest(text: bytes) -> str:
+    return hashlib.sha256(text).hexdigest()
+
+
+def build_zlib_dictionary(samples: List[bytes], size: int = DICTIONARY_SIZE) -> bytes:
+    """Lines shared by several samples, most common last (zlib prefers matches near the end)."""
+    counts = Counter()
+    for sample in samples:
+        counts.update(set(line.strip() for line in sample.splitlines() if len(line.strip()) > 8))
+    common = [line for line, count in counts.most_common() if count > 1]
+    chosen, total = [], 0
+    for line in common:
+        if total + len(line) + 1 > size:
+            break
+        chosen.append(line)
+        total += len(line) + 1
+    return b"\n".join(reversed(chosen))
+
+
+class RulingStore:
+    def __init__(self, root: str = RULING_STORE_PATH, codec: str = RULING_STORE_CODEC):
+        self.root = root
+        self.codec = codec if codec != "zstd" or zstandard is not None else "zlib"
+        self._dictionaries: Dict[bytes, bytes] = {}
+        for sub in ("objects", "refs", "dicts"):
+            os.makedirs(os.path.join(root, sub), exist_ok=True)
+
+    def _ref_path(self, ruling_number: str) -> str:
+        return os.path.join(self.root, "refs", _UNSAFE_NAME.sub("_", ruling_number.upper()))
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.root, "objects", digest[:2], digest[2:])
+
+    @staticmethod
+    def _write_atomic(path: str, data: bytes) -> None:
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as fp:
+            fp.write(data)
+        os.replace(tmp_path, path)
+
+    def _dictionary(self, dict_id: bytes) -> Optional[bytes]:
+        if dict_id == _NO_DICTIONARY:
+            return None
+        data = self._dictionaries.get(dict_id)
+        if data is None:
+            with open(os.path.join(self.root, "dicts", dict_id.hex()), "rb") as fp:
+                data = self._dictionaries[dict_id] = fp.read()
+        return data
+
+    def _current_dictionary(self) -> tuple:
+        try:
+            with open(os.path.join(self.root, "dicts", "CURRENT"), "rb") as fp:
+                dict_id = bytes.fromhex(fp.read().decode("ascii").strip())
+        except (FileNotFoundError, ValueError):
+            return _NO_DICTIONARY, None
+        return dict_id, self._dictionary(dict_id)
+
+    def _compress(self, data: bytes) -> bytes:
+        dict_id, dictionary = self._current_dictionary()
+        if self.codec == "zstd":
+            compressor = zstandard.ZstdCompressor(
+                level=19, dict_data=zstandard.ZstdCompressionDict(dictionary) if dictionary else None)
+            return _CODEC_ZSTD + dict_id + compressor.compress(data)
+        compressor = zlib.compressobj(9, zdict=dictionary) if dictionary else zlib.compressobj(9)
+        return _CODEC_ZLIB + dict_id + compressor.compress(data) + compressor.flush()
+
+    def _decompress(self, blob: bytes) -> bytes:
+        codec, dict_id, payload = blob[:1], blob[1:9], blob[9:]
+        dictionary = self._dictionary(dict_id)
+        if codec == _CODEC_ZSTD:
+            if zstandard is None:
+                raise ValueError("Stored ruling is zstd-compressed but zstandard is not installed")
+            return zstandard.ZstdDecompressor(
+                dict_data=zstandard.ZstdCompressionDict(dictionary) if dictionary else None).decompress(payload)
+        decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+        return decompressor.decompress(payload) + decompressor.flush()
+
+    def put(self, ruling_number: str, text: str) -> str:
+        """Stores a ruling body; identical bodies share one object. Returns the digest."""
+        data = text.encode("utf-8")
+        digest = _digest(data)
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._write_atomic(path, self._compress(data))
+        self._write_atomic(self._ref_path(ruling_number), digest.encode("ascii"))
+        return digest
+
+    def get(self, ruling_number: str) -> Optional[str]:
+        """Stored body of a ruling, or None; never touches the network."""
+        try:
+            with open(self._ref_path(ruling_number), "rb") as fp:
+                digest = fp.read().decode("ascii")
+            with open(self._object_path(digest), "rb") as fp:
+                return self._decompress(fp.read()).decode("utf-8")
+        except FileNotFoundError:
+            return None
+
+    def __contains__(self, ruling_number: str) -> bool:
+        return os.path.exists(self._ref_path(ruling_number))
+
+    def digests(self) -> List[str]:
+        objects = os.path.join(self.root, "objects")
+        return [prefix + name for prefix in os.listdir(objects) for name in os.listdir(os.path.join(objects, prefix))
+                if not name.endswith(".tmp")]
+
+    def train_dictionary(self, max_samples: int = 2000) -> Optional[str]:
+        """Trains a dictionary on stored bodies, makes it current and recompresses all objects."""
+        digests = self.digests()
+        samples = []
+        for digest in digests[:max_samples]:
+            with open(self._object_path(digest), "rb") as fp:
+                samples.append(self._decompress(fp.read()))
+        if len(samples) < 8:
+            logger.warning(f"Only {len(samples)} stored rulings; not training a dictionary.")
+            return None
+        if self.codec == "zstd":
+            dictionary = zstandard.train_dictionary(DICTIONARY_SIZE * 4, samples).as_bytes()
+        else:
+            dictionary = build_zlib_dictionary(samples)
+        dict_id = hashlib.sha256(dictionary).digest()[:8]
+        self._write_atomic(os.path.join(self.root, "dicts", dict_id.hex()), dictionary)
+        self._write_atomic(os.path.join(self.root, "dicts", "CURRENT"), dict_id.hex().encode("ascii"))
+
+        for digest in digests:
+            path = self._object_path(digest)
+            with open(path, "rb") as fp:
+                data = self._decompress(fp.read())
+            self._write_atomic(path, self._compress(data))
+        logger.info(f"Trained {len(dictionary)}-byte {self.codec} dictionary on {len(samples)} rulings; recompressed {len(digests)}.")
+        return dict_id.hex()
+
+    def stats(self) -> dict:
+        digests = self.digests()
+        stored = sum(os.path.getsize(self._object_path(d)) for d in digests)
+        return {"rulings": len(os.listdir(os.path.join(self.root, "refs"))), "objects": len(digests), "bytes": stored}
+
+
+_store: Optional[RulingStore] = None
+
+
+def get_store() -> RulingStore:
+    global _store
+    if _store is None:
+        _store = RulingStore()
+    return _store
+
+
+def fetch_ruling_text(ruling_number: str, timeout: float = 30) -> str:
+    """Fetches the full text of one ruling from CROSS."""
+    # Quoted so the number can only ever fill its path segment
+    response = requests.get(RULING_TEXT_URL.format(quote(ruling_number, safe="")), headers={"Accept": "application/json"}, timeout=timeout)
+    response.raise_for_status()
+    text = serialization.loads(response.content).get("text")
+    if not text:
+        raise ValueError(f"No text in CROSS response for ruling {ruling_number}")
+    return text
+
+
+def get_ruling_text(ruling_number: str, timeout: float = 30, offline: bool = RULING_TEXT_OFFLINE) -> Optional[str]:
+    """Stored body, fetching and storing it on a miss unless offline. None if unavailable."""
+    store = get_store()
+    text = store.get(ruling_number)
+    if text is not None or offline:
+        return text
+    try:
+        text = fetch_ruling_text(ruling_number, timeout=timeout)
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logger.warning(f"Could not fetch text of ruling {ruling_number}: {e}")
+        return None
+    store.put(ruling_number, text)
+    return text
+
+
+def prefetch(ruling_numbers: Iterable[str], concurrency: int = 4) -> dict:
+    """Fetches bodies not yet stored; returns counts of fetched, cached and failed rulings."""
+    store = get_store()
+    numbers = list(dict.fromkeys(ruling_numbers))
+    pending = [n for n in numbers if n not in store]
+    stats = {"fetched": 0, "cached": len(numbers) - len(pending), "failed": 0}
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for text in executor.map(lambda n: get_ruling_text(n, offline=False), pending):
+            stats["fetched" if text is not None else "failed"] += 1
+    return stats
+
+
+def prefetch_popular(top_n: int, concurrency: int = 4) -> dict:
+    """Prefetches bodies of the rulings returned for the top_n most popular search terms."""
+    from query_log import top_queries
+    from router.customs_router import fetch_cross_candidates
+    from deadline import Deadline
+
+    numbers = []
+    for term, _ in top_queries("terms", top_n):
+        try:
+            candidates, _ = fetch_cross_candidates(term, Deadline(30))
+            numbers.extend(r.get("rulingNumber") for r in candidates)
+        except Exception as e:
+            logger.warning(f"Skipping term '{term}': {e}")
+    return prefetch([n for n in numbers if n], concurrency=concurrency)
+
+
+if __name__ == "__main__":
+    import argparse
+    import random
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Manage the local ruling text store.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    fetch = commands.add_parser("prefetch", help="fetch bodies of rulings returned for popular terms")
+    fetch.add_argument("--top", type=int, default=100)
+    fetch.add_argument("--concurrency", type=int, default=4)
+    commands.add_parser("train", help="train the shared dictionary and recompress stored bodies")
+    commands.add_parser("stats")
+    commands.add_parser("benchmark", help="compression ratio with and without a shared dictionary")
+    args = parser.parse_args()
+
+    if args.command == "prefetch":
+        print(prefetch_popular(args.top, args.concurrency))
+    elif args.command == "train":
+        print(get_store().train_dictionary())
+    elif args.command == "stats":
+        print(get_store().stats())
+    else:
+        # Synthetic ruling letters: shared boilerplate with per-ruling details
+        rng = random.Random(0)
+        products = ["cotton t-shirt", "laptop computer", "fuel pump", "ceramic mug", "steel bolt", "LED lamp"]
+        def letter(i: int) -> str:
+            product = rng.choice(products)
+            return "\n".join([
+                f"N{i:06d}", f"{rng.randint(1, 12)}/{rng.randint(1, 28)}/{rng.randint(2005, 2024)}",
+                "CLA-2-61:OT:RR:NC:N3:348", "CATEGORY: Classification",
+                f"RE: The tariff classification of a {product} from {rng.choice(['China', 'Vietnam', 'India'])}",
+                "Dear Sir or Madam:",
+                f"In your letter dated {rng.randint(1, 28)} you requested a tariff classification ruling.",
+                f"The submitted sample is a {product}, model {rng.randint(100, 9999)}, composed of {rng.randint(50, 100)}% materials.",
+                "The applicable subheading will be " f"{rng.randint(1000, 9999)}.{rng.randint(10, 99)}.{rng.randint(1000, 9999)}, "
+                "Harmonized Tariff Schedule of the United States (HTSUS).",
+                "Duty rates are provided for your convenience and are subject to change. The text of the most recent "
+                "HTSUS and the accompanying duty rates are provided on the World Wide Web at https://hts.usitc.gov/.",
+                "This ruling is being issued under the provisions of Part 177 of the Customs and Border Protection "
+                "Regulations (19 C.F.R. 177).",
+                "A copy of the ruling or the control number indicated above should be provided with the entry "
+                "documents filed at the time this merchandise is imported.",
+                "If you have any questions regarding the ruling, contact National Import Specialist at "
+                "[email protected].",
+                "Sincerely,", "Steven A. Mack", "Director", "National Commodity Specialist Division",
+            ])
+        bodies = {f"N{i:06d}": letter(i) for i in range(2000)}
+        raw = sum(len(b.encode()) for b in bodies.values())
+        codecs = ["zlib"] + (["zstd"] if zstandard is not None else [])
+        for codec in codecs:
+            store = RulingStore(tempfile.mkdtemp(), codec=codec)
+            for number, body in bodies.items():
+                store.put(number, body)
+            plain = store.stats()["bytes"]
+            store.train_dictionary()
+            trained = store.stats()["bytes"]
+            assert all(store.get(n) == b for n, b in list(bodies.items())[:50])
+            print(f"{codec:>5}: raw {raw / 1024:7.1f} KiB, compressed {plain / 1024:7.1f} KiB ({raw / plain:4.1f}x), "
+                  f"with dictionary {trained / 1024:7.1f} KiB ({raw / trained:4.1f}x)")
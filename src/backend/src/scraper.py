@@ -2,24 +2,29 @@
 scraper.py - Searches CBP CROSS rulings via JSON API.
 """
 
+import os
 import requests
 import sys
 import json
 import logging
 from typing import List, Dict, Any
 
-# Configure basic logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+import serialization
+from log_config import configure_logging
+
+# Queued, structured logging (see log_config.py)
+configure_logging()
 logger = logging.getLogger(__name__)
 
-CROSS_API_URL = "https://rulings.cbp.gov/api/search"
+CROSS_API_URL = os.getenv("CROSS_API_URL", "https://rulings.cbp.gov/api/search")
 
 def search_cross_rulings(
     term: str,
     collection: str = "ALL",
     page_size: int = 10,
     page: int = 1,
-    sort_by: str = "RELEVANCE"
+    sort_by: str = "RELEVANCE",
+    timeout: float = 30
 ) -> List[Dict[str, Any]]:
     """
     Searches CROSS rulings using the official CBP JSON API.
@@ -30,6 +35,7 @@ def search_cross_rulings(
         page_size: The number of results per page (default: 10).
         page: The page number to retrieve (default: 1).
         sort_by: The sorting criteria (default: "RELEVANCE").
+        timeout: Request timeout in seconds (default: 30); callers pass their remaining deadline.
 
     Returns:
         A list of dictionaries, each representing a ruling item.
@@ -48,15 +54,15 @@ def search_cross_rulings(
         "Accept": "application/json"
     }
 
-    logger.info(f"Querying CROSS API: {CROSS_API_URL} with params: {params}")
+    logger.info("Querying CROSS API for %r (page %d, size %d)", term, page, page_size, extra={"event": "cross.query"})
 
-    response = requests.get(CROSS_API_URL, params=params, headers=headers, timeout=30)
+    response = requests.get(CROSS_API_URL, params=params, headers=headers, timeout=timeout)
     response.raise_for_status()
 
-    data = response.json()
+    data = serialization.loads(response.content)
     items: List[Dict[str, Any]] = data.get("rulings", [])
 
-    logger.info(f"Retrieved {len(items)} items for term '{term}'.") # Log message is concise
+    logger.debug("Retrieved %d items for term %r.", len(items), term)
     return items
 
 
@@ -0,0 +1,92 @@
+"""
+serialization.py - Pluggable JSON serializer.
+
+Uses orjson when installed and the standard library otherwise. Both backends
+produce compact UTF-8 bytes and raise ValueError on malformed input.
+Set JSON_BACKEND=stdlib to force the fallback.
+"""
+
+import json
+import os
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if os.getenv("JSON_BACKEND", "").lower() == "stdlib":
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "stdlib"
+
+
+def _default(obj: Any) -> Any:
+    # Compact records (ruling_record.Ruling) serialize as their API dicts
+    to_dict = getattr(obj, "to_dict", None)
+    return to_dict() if callable(to_dict) else str(obj)
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj: Any) -> bytes:
+        """Serializes obj to compact JSON bytes; unknown types are stringified."""
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+
+    def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+        """Parses JSON from bytes or str."""
+        return orjson.loads(data)
+
+else:
+    _encoder = json.JSONEncoder(default=_default, ensure_ascii=False, separators=(",", ":"))
+
+    def dumps(obj: Any) -> bytes:
+        """Serializes obj to compact JSON bytes; unknown types are stringified."""
+        return _encoder.encode(obj).encode("utf-8")
+
+    def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+        """Parses JSON from bytes or str."""
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return json.loads(data)
+
+
+if __name__ == "__main__":
+    import timeit
+
+    # Typical payloads: a CROSS search page and an API response with rulings
+    ruling = {
+        "rulingNumber": "N123456",
+        "rulingDate": "2021-06-01T00:00:00",
+        "subject": "The tariff classification of a men's cotton knit t-shirt from China",
+        "tariffs": ["6109.10.0012", "6109.10.0014"],
+        "categories": "Classification",
+        "collection": "NY",
+        "url": "https://rulings.cbp.gov/ruling/N123456",
+        "isRevokedByOperationalLaw": False,
+        "operationallyRevoked": False,
+    }
+    payloads = {
+        "cross page (30 rulings)": {"rulings": [dict(ruling) for _ in range(30)], "totalHits": 30},
+        "api response (3 rulings)": {
+            "kind": "cross_rulings_result",
+            "result": "Relevant U.S. Customs CROSS Rulings:\n" * 10,
+            "cross_rulings": [dict(ruling) for _ in range(3)],
+            "history": [],
+            "error": None,
+        },
+    }
+    runs = 20_000
+    print(f"backend: {BACKEND}")
+    for label, payload in payloads.items():
+        encoded = dumps(payload)
+        std_encoded = json.dumps(payload).encode("utf-8")
+        for name, fn in [
+            ("dumps", lambda: dumps(payload)),
+            ("stdlib dumps", lambda: json.dumps(payload).encode("utf-8")),
+            ("loads", lambda: loads(encoded)),
+            ("stdlib loads", lambda: json.loads(std_encoded)),
+        ]:
+            t = timeit.timeit(fn, number=runs) / runs
+            print(f"{label:>26} {name:>13}: {t * 1e6:8.2f} us")
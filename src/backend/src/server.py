@@ -1,14 +1,133 @@
-from flask import Flask, request, jsonify
-from router.customs_router import customs_router
+import os
+from flask import Flask, Response, request
+from werkzeug.middleware.proxy_fix import ProxyFix
+from router.customs_router import customs_router, normalize_ruling_number
+from response_encoding import parse_fields, project_rulings, encode_response
+from hts_index import get_hts_index
+from admission import AdmissionController, AdmissionRejected
+from deadline import Deadline
+from query_cache import load_snapshot, maybe_reload_snapshot
+from ruling_corpus import get_corpus
+from ruling_store import get_ruling_text
+from query_normalizer import get_normalizer
+from suggest_index import get_suggest_index
+import serialization
 
 app = Flask(__name__, static_folder='../static')
+# Reverse proxies in front of the app (e.g. 1 for App Service ingress); only their X-Forwarded-For entries are trusted
+TRUSTED_PROXY_COUNT = int(os.getenv("TRUSTED_PROXY_COUNT", "0"))
+if TRUSTED_PROXY_COUNT:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_COUNT)
+
+# Per worker process; total capacity is this times WEB_WORKERS
+admission = AdmissionController()
+
+def client_id() -> str:
+    # Peer address (as seen by the first trusted proxy); caller-set headers such as X-Client-Id are ignored
+    return request.remote_addr or "unknown"
+
+def warm_up():
+    """Loads shared read-only state; called in the master before forking so workers share pages."""
+    get_hts_index()
+    # Mapped read-only; pages are shared through the OS page cache
+    get_corpus()
+    # Spelling dictionary built from the corpus subjects
+    get_normalizer()
+    get_suggest_index()
+    # Caches pre-populated by prewarm.py
+    load_snapshot()
+
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    body, headers = encode_response({"status": "ok", "hts_index": get_hts_index() is not None, "admission": admission.stats()})
+    return Response(body, headers=headers)
 
 @app.route("/api/customs/ask", methods=["POST"])
 def ask_customs():
-    data = request.get_json()
+    # Budget from X-Request-Timeout (seconds), capped by REQUEST_DEADLINE_SECONDS
+    deadline = Deadline.from_header(request.headers.get("X-Request-Timeout"))
+    # Picks up snapshots rewritten by prewarm.py --interval
+    maybe_reload_snapshot()
+    return _with_admission(deadline, lambda: _ask_customs(deadline),
+                           {"kind": "error", "result": None, "history": []})
+
+@app.route("/api/customs/suggest", methods=["GET"])
+def suggest():
+    # Cheap per call, but fired on every keystroke, so admitted like the other routes
+    deadline = Deadline.from_header(request.headers.get("X-Request-Timeout"))
+    prefix = request.args.get("q", "")
+    try:
+        k = int(request.args.get("k", "8"))
+    except ValueError:
+        k = 8
+    return _with_admission(deadline, lambda: _suggest(prefix, k), {"query": prefix, "suggestions": []})
+
+def _suggest(prefix: str, k: int):
+    suggestions = [{"text": text, "weight": weight} for text, weight in get_suggest_index().suggest(prefix, k)]
+    return _encoded({"query": prefix, "suggestions": suggestions})
+
+@app.route("/api/customs/ruling/<ruling_number>", methods=["GET"])
+def ruling_text(ruling_number: str):
+    # Served from the local store; fetched from CROSS once on a miss
+    deadline = Deadline.from_header(request.headers.get("X-Request-Timeout"))
+    number = normalize_ruling_number(ruling_number)
+    if number is None:
+        return _encoded({"rulingNumber": ruling_number, "text": None, "error": "Invalid ruling number."}, status=400)
+    # A miss costs an upstream fetch plus compression, so it is admitted like /ask
+    return _with_admission(deadline, lambda: _ruling_text(number, deadline),
+                           {"rulingNumber": number, "text": None})
+
+def _ruling_text(ruling_number: str, deadline: Deadline):
+    text = get_ruling_text(ruling_number, timeout=deadline.remaining())
+    if text is None:
+        return _encoded({"rulingNumber": ruling_number, "text": None, "error": "Ruling text not available."}, status=404)
+    return _encoded({"rulingNumber": ruling_number, "text": text, "error": None})
+
+def _encoded(payload: dict, status: int = 200, headers: dict = None) -> Response:
+    """
+    Response negotiated by the request's Accept and Accept-Encoding headers.
+    """
+    body, encoded_headers = encode_response(
+        payload,
+        accept=request.headers.get("Accept", ""),
+        accept_encoding=request.headers.get("Accept-Encoding", "")
+    )
+    encoded_headers.update(headers or {})
+    return Response(body, status=status, headers=encoded_headers)
+
+def _with_admission(deadline: Deadline, handler, busy_payload: dict) -> Response:
+    """
+    Runs handler under the per-worker admission controller; 503 with Retry-After when busy.
+    """
+    client = client_id()
+    try:
+        admitted_at = admission.acquire(client, timeout=deadline.remaining())
+    except AdmissionRejected as e:
+        return _encoded(dict(busy_payload, error=f"Server busy ({e.reason}), retry later."), status=503,
+                        headers={"Retry-After": e.retry_after_header})
+    try:
+        return handler()
+    finally:
+        admission.release(client, admitted_at)
+
+def _ask_customs(deadline: Deadline):
+    try:
+        data = serialization.loads(request.get_data())
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        return _encoded({"kind": "error", "result": None, "history": [], "error": "Request body must be a JSON object."},
+                        status=400)
+    # Optional ?fields=a,b (or "fields" in the body) projects cross_rulings entries
+    try:
+        fields = parse_fields(request.args.get("fields", data.get("fields")))
+    except ValueError as e:
+        return _encoded({"kind": "error", "result": None, "history": [], "error": str(e)}, status=400)
     message = data.get("message", "")
-    result = customs_router(message)
-    return jsonify(result)
+    conversation_id = data.get("id")
+    # "cursor" from a previous cross_rulings_result asks for the next page of rulings
+    result = customs_router(message, id=conversation_id, deadline=deadline, cursor=data.get("cursor"), client=client_id())
+    return _encoded(project_rulings(result, fields))
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=True)
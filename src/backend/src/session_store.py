@@ -0,0 +1,211 @@
+"""
+session_store.py - Bounded per-conversation chat history.
+
+Each gunicorn worker is a separate process, so the in-process SessionStore
+only sees the turns that reached its own worker. With SESSION_REDIS_URL set,
+sessions live in Redis and every worker (and replica) shares them.
+"""
+
+import logging
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import List, Dict
+
+import serialization
+
+logger = logging.getLogger(__name__)
+
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "6"))
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", "8192"))
+SESSION_MAX_TURN_CHARS = int(os.getenv("SESSION_MAX_TURN_CHARS", "1500"))
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "1800"))
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+SESSION_SUMMARY_CHARS = int(os.getenv("SESSION_SUMMARY_CHARS", "600"))
+SUMMARY_QUESTION_CHARS = 160
+SUMMARY_QUESTION = "What did I ask earlier in this conversation?"
+SESSION_REDIS_URL = os.getenv("SESSION_REDIS_URL")
+SESSION_REDIS_PREFIX = "session:"
+
+
+def _clip(text: str, limit: int) -> str:
+    """
+    Shortens text to at most limit characters, marking the cut.
+    """
+    if text is None:
+        return ""
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+
+class SessionStore:
+    """
+    Thread-safe store of recent (question, answer) turns keyed by conversation id.
+
+    Each session keeps at most `max_turns` turns and `max_bytes` UTF-8 bytes;
+    long turns are clipped on insert and the oldest turns are dropped first.
+    Dropped turns are folded into a short extractive summary of the earlier
+    questions (at most `summary_chars`), sent upstream as the first turn.
+    Sessions idle for longer than `idle_ttl` seconds are evicted, and the
+    least recently used session is evicted once `max_sessions` is reached.
+    """
+
+    def __init__(
+        self,
+        max_turns: int = SESSION_MAX_TURNS,
+        max_bytes: int = SESSION_MAX_BYTES,
+        max_turn_chars: int = SESSION_MAX_TURN_CHARS,
+        idle_ttl: float = SESSION_IDLE_TTL,
+        max_sessions: int = SESSION_MAX_SESSIONS,
+        summary_chars: int = SESSION_SUMMARY_CHARS
+    ):
+        self.max_turns = max_turns
+        self.max_bytes = max_bytes
+        self.max_turn_chars = max_turn_chars
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.summary_chars = summary_chars
+        # id -> [last_access, size_bytes, [(question, answer, size), ...], [dropped question, ...]]
+        self._sessions: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict_idle(self, now: float) -> None:
+        """
+        Drops sessions idle for longer than idle_ttl.
+        """
+        # Sessions are ordered by last access, so expired ones are at the front.
+        while self._sessions:
+            oldest_id, entry = next(iter(self._sessions.items()))
+            if now - entry[0] < self.idle_ttl:
+                break
+            self._sessions.pop(oldest_id)
+
+    def get_history(self, id: str) -> List[Dict[str, Dict[str, str]]]:
+        """
+        Returns the trimmed history window in Prompt Flow chat_history format,
+        preceded by a summary turn once earlier turns have been dropped.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._sessions.get(id)
+            if entry is None:
+                return []
+            entry[0] = now
+            self._sessions.move_to_end(id)
+            return self._history(entry)
+
+    @staticmethod
+    def _history(entry: list) -> List[Dict[str, Dict[str, str]]]:
+        history = [
+            {"inputs": {"question": q}, "outputs": {"answer": a}}
+            for q, a, _ in entry[2]
+        ]
+        if entry[3]:
+            summary = "Earlier questions: " + "; ".join(entry[3])
+            history.insert(0, {"inputs": {"question": SUMMARY_QUESTION}, "outputs": {"answer": summary}})
+        return history
+
+    def _summarize(self, entry: list, question: str) -> None:
+        """
+        Folds a dropped turn's question into the session summary, oldest first out.
+        """
+        if self.summary_chars <= 0:
+            return
+        entry[3].append(_clip(question, SUMMARY_QUESTION_CHARS))
+        while len(entry[3]) > 1 and sum(len(q) + 2 for q in entry[3]) > self.summary_chars:
+            entry[3].pop(0)
+
+    def _add_turn(self, entry: list, question: str, answer: str) -> None:
+        """
+        Appends a clipped turn to entry and trims it to the session budget.
+        """
+        question = _clip(question, self.max_turn_chars)
+        answer = _clip(answer, self.max_turn_chars)
+        size = len(question.encode("utf-8")) + len(answer.encode("utf-8"))
+        entry[1] += size
+        entry[2].append((question, answer, size))
+        while entry[2] and (len(entry[2]) > self.max_turns or entry[1] > self.max_bytes):
+            dropped_question, _, dropped_size = entry[2].pop(0)
+            entry[1] -= dropped_size
+            self._summarize(entry, dropped_question)
+
+    def append(self, id: str, question: str, answer: str) -> None:
+        """
+        Records a completed turn and trims the session to its budget.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._sessions.get(id)
+            if entry is None:
+                if len(self._sessions) >= self.max_sessions:
+                    self._sessions.popitem(last=False)
+                entry = [now, 0, [], []]
+                self._sessions[id] = entry
+
+            entry[0] = now
+            self._add_turn(entry, question, answer)
+            self._sessions.move_to_end(id)
+
+    def clear(self, id: str) -> None:
+        with self._lock:
+            self._sessions.pop(id, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class RedisSessionStore(SessionStore):
+    """
+    SessionStore shared by all workers through Redis.
+
+    A session is one JSON value expiring after idle_ttl; appends are
+    optimistic transactions, so concurrent turns of one conversation are
+    not lost. Redis evicts by TTL (and maxmemory), so max_sessions is unused.
+    """
+
+    def __init__(self, url: str, **kwargs):
+        # Optional dependency, only needed when SESSION_REDIS_URL is set
+        import redis
+        super().__init__(**kwargs)
+        self._redis = redis.Redis.from_url(url)
+        self._ttl = max(1, int(self.idle_ttl))
+
+    def _key(self, id: str) -> str:
+        return SESSION_REDIS_PREFIX + id
+
+    def get_history(self, id: str) -> List[Dict[str, Dict[str, str]]]:
+        key = self._key(id)
+        raw = self._redis.get(key)
+        if raw is None:
+            return []
+        self._redis.expire(key, self._ttl)
+        return self._history(serialization.loads(raw))
+
+    def append(self, id: str, question: str, answer: str) -> None:
+        key = self._key(id)
+
+        def update(pipe):
+            raw = pipe.get(key)
+            entry = serialization.loads(raw) if raw is not None else [0, 0, [], []]
+            self._add_turn(entry, question, answer)
+            pipe.multi()
+            pipe.set(key, serialization.dumps(entry), ex=self._ttl)
+
+        self._redis.transaction(update, key)
+
+    def clear(self, id: str) -> None:
+        self._redis.delete(self._key(id))
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self._redis.scan_iter(match=SESSION_REDIS_PREFIX + "*"))
+
+
+def create_session_store() -> SessionStore:
+    """
+    Redis-backed store when SESSION_REDIS_URL is set, else an in-process store.
+    """
+    if SESSION_REDIS_URL:
+        return RedisSessionStore(SESSION_REDIS_URL)
+    return SessionStore()
@@ -0,0 +1,188 @@
+"""
+suggest_index.py - Item-name autocomplete from a sorted-array prefix index.
+
+Phrases come from ruling subjects ("The tariff classification of a men's
+cotton knit t-shirt from China" -> "men's cotton knit t-shirt") and past
+search terms, weighted by how often they occur. A search term is only
+suggested once SUGGEST_MIN_TERM_COUNT searches from SUGGEST_MIN_TERM_CLIENTS
+distinct client networks (peer addresses, which a caller cannot choose) made
+it, and never if it contains recognizable PII, so one user's query is not
+shown to others. Every word start of a
+phrase is a key, so "shirt" also completes "cotton t-shirt". Keys are kept
+in one sorted list; a prefix is a bisected range whose top-k weights come
+from NumPy (short prefixes, whose ranges are large, are precomputed).
+"""
+
+import bisect
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+import pii_local
+from query_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+SUGGEST_REFRESH_SECONDS = float(os.getenv("SUGGEST_REFRESH_SECONDS", "3600"))
+SUGGEST_MAX_TERMS = int(os.getenv("SUGGEST_MAX_TERMS", "50000"))
+# A past search counts this many times as much as a ruling subject mention
+SEARCH_TERM_WEIGHT = float(os.getenv("SUGGEST_SEARCH_TERM_WEIGHT", "5"))
+SUGGEST_MIN_TERM_COUNT = int(os.getenv("SUGGEST_MIN_TERM_COUNT", "3"))
+SUGGEST_MIN_TERM_CLIENTS = int(os.getenv("SUGGEST_MIN_TERM_CLIENTS", "2"))
+# query_log replaces recognized PII with this placeholder (normalized)
+_REDACTED = normalize_query("[redacted]")
+PRECOMPUTED_PREFIX_LENGTH = 2
+MAX_K = 20
+
+_SUBJECT_PREFIX = re.compile(r"^(?:the\s+)?(?:tariff\s+)?classification(?:,[^,]*,)?\s+of\s+(?:an?\s+|the\s+|certain\s+)?", re.IGNORECASE)
+_SUBJECT_SUFFIX = re.compile(r"\s+(?:from|made in|imported from|produced in)\s+[\w\s,.'-]+$", re.IGNORECASE)
+# Model/style numbers do not help completion
+_SUBJECT_MODEL = re.compile(r"[\s,;]+(?:models?|styles?|items?|part|sku)\b.*$", re.IGNORECASE)
+# Keys start at each word and at each part of a hyphenated word ("shirt" in "t-shirt")
+_WORD_START = re.compile(r"(?:^|(?<=[\s-]))\w")
+
+
+def item_name(subject: str) -> str:
+    """Item phrase of a ruling subject, normalized; empty if nothing is left."""
+    text = _SUBJECT_MODEL.sub("", _SUBJECT_SUFFIX.sub("", _SUBJECT_PREFIX.sub("", subject or "")))
+    words = normalize_query(text).split()
+    return " ".join(words[:8])
+
+
+class SuggestIndex:
+    def __init__(self, weighted_phrases: Dict[str, float]):
+        self.phrases: List[str] = list(weighted_phrases)
+        self.phrase_weights = np.fromiter(weighted_phrases.values(), dtype=np.float64, count=len(self.phrases))
+
+        entries: List[Tuple[str, int]] = []
+        for phrase_id, phrase in enumerate(self.phrases):
+            entries.extend((phrase[m.start():], phrase_id) for m in _WORD_START.finditer(phrase))
+        entries.sort()
+        self.keys: List[str] = [key for key, _ in entries]
+        self.phrase_ids = np.fromiter((pid for _, pid in entries), dtype=np.int32, count=len(entries))
+        self.weights = self.phrase_weights[self.phrase_ids]
+
+        self._precomputed: Dict[str, List[int]] = {}
+        for length in range(1, PRECOMPUTED_PREFIX_LENGTH + 1):
+            for prefix in {key[:length] for key in self.keys if len(key) >= length}:
+                self._precomputed[prefix] = self._top_ids(prefix, MAX_K)
+
+    def __len__(self) -> int:
+        return len(self.phrases)
+
+    def _top_ids(self, prefix: str, k: int) -> List[int]:
+        low = bisect.bisect_left(self.keys, prefix)
+        high = bisect.bisect_left(self.keys, prefix + "\uffff", low)
+        if low == high:
+            return []
+        weights = self.weights[low:high]
+        # Over-select: one phrase can match at several word starts
+        take = min(len(weights), k * 3)
+        top = np.argpartition(-weights, take - 1)[:take] if take < len(weights) else np.arange(len(weights))
+        top = top[np.argsort(-weights[top], kind="stable")]
+        return list(dict.fromkeys(int(self.phrase_ids[low + i]) for i in top))[:k]
+
+    def suggest(self, prefix: str, k: int = 8) -> List[Tuple[str, float]]:
+        """Top-k (phrase, weight) completions of prefix."""
+        prefix = normalize_query(prefix)
+        k = max(1, min(k, MAX_K))
+        if not prefix:
+            return []
+        ids = self._precomputed.get(prefix) if len(prefix) <= PRECOMPUTED_PREFIX_LENGTH else None
+        if ids is None:
+            ids = self._top_ids(prefix, k)
+        return [(self.phrases[i], float(self.phrase_weights[i])) for i in ids[:k]]
+
+
+def build_index(subjects: Iterable[str] = (), search_terms: Iterable[Tuple[str, int]] = (),
+                min_term_count: int = SUGGEST_MIN_TERM_COUNT) -> SuggestIndex:
+    weights: Counter = Counter()
+    for subject in subjects:
+        name = item_name(subject)
+        if name:
+            weights[name] += 1.0
+    for term, count in search_terms:
+        if count < min_term_count or pii_local.recognize_pii_entities(term):
+            continue
+        term = normalize_query(term)
+        if term and _REDACTED not in term.split():
+            weights[term] += count * SEARCH_TERM_WEIGHT
+    return SuggestIndex(dict(weights.most_common(SUGGEST_MAX_TERMS)))
+
+
+_index: Optional[SuggestIndex] = None
+_built_at = 0.0
+_refresh_lock = threading.Lock()
+
+
+def _rebuild() -> None:
+    global _index, _built_at
+    from query_log import top_queries
+    from ruling_corpus import get_corpus
+
+    start = time.perf_counter()
+    corpus = get_corpus()
+    subjects = (corpus.row(i).subject for i in range(len(corpus))) if corpus is not None else ()
+    terms = top_queries("terms", SUGGEST_MAX_TERMS, min_count=SUGGEST_MIN_TERM_COUNT, min_clients=SUGGEST_MIN_TERM_CLIENTS)
+    index = build_index(subjects, terms)
+    _index, _built_at = index, time.monotonic()
+    logger.info(f"Built suggest index: {len(index)} phrases in {time.perf_counter() - start:.2f}s.")
+
+
+def get_suggest_index() -> SuggestIndex:
+    """Shared index; built on first use, then rebuilt in the background every SUGGEST_REFRESH_SECONDS."""
+    if _index is None:
+        with _refresh_lock:
+            if _index is None:
+                _rebuild()
+    elif time.monotonic() - _built_at > SUGGEST_REFRESH_SECONDS and _refresh_lock.acquire(blocking=False):
+        def refresh():
+            try:
+                _rebuild()
+            except Exception as e:
+                logger.error(f"Suggest index refresh failed: {e}")
+            finally:
+                _refresh_lock.release()
+        threading.Thread(target=refresh, name="suggest-refresh", daemon=True).start()
+    return _index
+
+
+if __name__ == "__main__":
+    import random
+
+    # Latency of suggest() over a synthetic corpus of 300k subjects and 20k past terms
+    rng = random.Random(0)
+    materials = ["cotton", "polyester", "leather", "steel", "stainless steel", "aluminum", "plastic", "ceramic", "wooden", "glass"]
+    items = ["t-shirt", "jacket", "handbag", "bolt", "mug", "laptop computer", "bicycle", "lamp", "chair", "toy car",
+             "fuel pump", "solar panel", "phone case", "backpack", "sneaker", "water bottle", "knife", "cable", "charger"]
+    colors = ["black", "white", "red", "blue", "green", "pink", "grey", "brown", "yellow", "orange", "purple", "silver"]
+    uses = ["", "for children", "with lid", "set", "for outdoor use", "with battery", "for pets", "kit", "holder", "cover"]
+    subjects = [f"The tariff classification of a {rng.choice(colors)} {rng.choice(materials)} {rng.choice(items)} "
+                f"{rng.choice(uses)} model {rng.randint(1, 3000)} from {rng.choice(['China', 'Vietnam', 'Mexico'])}"
+                for _ in range(300_000)]
+    terms = [(f"{rng.choice(materials)} {rng.choice(items)}", rng.randint(1, 500)) for _ in range(20_000)]
+    start = time.perf_counter()
+    index = build_index(subjects, terms)
+    print(f"build: {len(index)} phrases, {len(index.keys)} keys in {time.perf_counter() - start:.1f}s")
+
+    prefixes = []
+    for _ in range(5000):
+        phrase = rng.choice(index.phrases)
+        words = phrase.split()
+        word_start = phrase.index(rng.choice(words))
+        prefixes.append(phrase[word_start:word_start + rng.randint(1, 10)])
+    latencies = []
+    for prefix in prefixes:
+        start = time.perf_counter()
+        index.suggest(prefix, k=8)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    print(f"suggest: p50 {latencies[len(latencies) // 2] * 1e6:.0f} us, p99 {latencies[int(len(latencies) * 0.99)] * 1e6:.0f} us")
+    for prefix in ["st", "stainless st", "lapt", "shirt"]:
+        print(f"{prefix!r:>16}: {[p for p, _ in index.suggest(prefix, k=4)]}")
@@ -0,0 +1,222 @@
+# Copyright (c) Microsoft Corporation.
+# Licensed under the MIT License.
+import os
+import queue
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+"""
+Micro-batching dispatcher for Azure AI Language Text Analytics calls.
+
+Concurrent single-document requests are collected over a short window and
+sent as one multi-document call per operation; results are demultiplexed
+back to each caller.
+"""
+
+WINDOW_MS = float(os.environ.get("TA_BATCH_WINDOW_MS", "5"))
+MAX_BATCH_SIZE = int(os.environ.get("TA_MAX_BATCH_SIZE", "5"))
+
+_logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Collect single-document requests and dispatch them in batches.
+
+    `batch_function` must accept `documents=[...]` plus keyword arguments and
+    return one result per document, in order (as TextAnalyticsClient does).
+    Requests with different keyword arguments are dispatched separately.
+    """
+
+    def __init__(
+        self,
+        batch_function: Callable[..., list],
+        window_ms: float = WINDOW_MS,
+        max_batch_size: int = MAX_BATCH_SIZE,
+        max_concurrency: int = 16,
+        name: str = "ta-batcher"
+    ):
+        self.batch_function = batch_function
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self.name = name
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency,
+            thread_name_prefix=name
+        )
+
+    def _ensure_worker(self):
+        """
+        Start collector thread on first use.
+        """
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._collect,
+                    name=self.name,
+                    daemon=True
+                )
+                self._worker.start()
+
+    def submit(
+        self,
+        document: str,
+        **kwargs
+    ) -> Future:
+        """
+        Queue a single document; returns future for its result.
+        """
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((document, kwargs, future))
+        return future
+
+    def __call__(
+        self,
+        document: str,
+        **kwargs
+    ) -> Any:
+        """
+        Queue a single document and wait for its result.
+        """
+        return self.submit(document, **kwargs).result()
+
+    def _collect(self):
+        """
+        Collector loop: gather requests for one window, then dispatch.
+        """
+        while True:
+            pending = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    pending.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            # Group by call arguments (e.g. language), then chunk by size limit:
+            groups = dict()
+            for document, kwargs, future in pending:
+                key = tuple(sorted(kwargs.items()))
+                groups.setdefault(key, []).append((document, future))
+
+            for key, items in groups.items():
+                for i in range(0, len(items), self.max_batch_size):
+                    self._executor.submit(
+                        self._dispatch,
+                        items[i:i + self.max_batch_size],
+                        dict(key)
+                    )
+
+    def _dispatch(
+        self,
+        items: list[tuple],
+        kwargs: dict
+    ):
+        """
+        Send one batched call and demultiplex results.
+        """
+        documents = [document for document, _ in items]
+        try:
+            results = list(self.batch_function(documents=documents, **kwargs))
+            if len(results) != len(items):
+                raise ValueError(
+                    f"Expected {len(items)} results, got {len(results)}"
+                )
+        except Exception as e:
+            _logger.error(f"{self.name} batch call failed: {e}")
+            for _, future in items:
+                future.set_exception(e)
+            return
+
+        for (_, future), result in zip(items, results):
+            future.set_result(result)
+
+
+class TextAnalyticsBatcher:
+    """
+    Batched `detect_language` and `recognize_pii_entities` over one client.
+    """
+
+    def __init__(
+        self,
+        client,
+        window_ms: float = WINDOW_MS,
+        max_batch_size: int = MAX_BATCH_SIZE
+    ):
+        self.detect_language = MicroBatcher(
+            batch_function=client.detect_language,
+            window_ms=window_ms,
+            max_batch_size=max_batch_size,
+            name="ta-detect-language"
+        )
+        self.recognize_pii_entities = MicroBatcher(
+            batch_function=client.recognize_pii_entities,
+            window_ms=window_ms,
+            max_batch_size=max_batch_size,
+            name="ta-recognize-pii"
+        )
+
+
+if __name__ == "__main__":
+    from types import SimpleNamespace
+
+    class MockTextAnalyticsClient:
+        """
+        Local stand-in for TextAnalyticsClient with fixed per-call latency.
+        """
+
+        def __init__(self, latency: float = 0.05):
+            self.latency = latency
+            self.calls = 0
+            self._lock = threading.Lock()
+
+        def detect_language(self, documents: list[str], **kwargs) -> list:
+            with self._lock:
+                self.calls += 1
+            time.sleep(self.latency)
+            return [
+                SimpleNamespace(
+                    is_error=False,
+                    primary_language=SimpleNamespace(iso6391_name="en", name=d)
+                )
+                for d in documents
+            ]
+
+        def recognize_pii_entities(self, documents: list[str], **kwargs) -> list:
+            return [SimpleNamespace(is_error=False, entities=[]) for _ in documents]
+
+    concurrency = 50
+    texts = [f"message {i}" for i in range(concurrency)]
+
+    for label, batched in [("unbatched", False), ("batched", True)]:
+        client = MockTextAnalyticsClient()
+        batcher = TextAnalyticsBatcher(client)
+
+        def call(text: str) -> str:
+            if batched:
+                result = batcher.detect_language(text)
+            else:
+                result = client.detect_language(documents=[text])[0]
+            return result.primary_language.name
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(call, texts))
+        elapsed = time.perf_counter() - start
+
+        assert results == texts
+        print(f"{label:>10}: {concurrency} requests, {client.calls} upstream calls, {elapsed * 1000:.1f} ms")
@@ -1,5 +1,39 @@
 # Deprecated: This file is no longer used. All orchestration is handled by the Prompt Flow API integration.
+# Licensed under the MIT License.
+import os
+import uuid
+import language_id
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from typing import Callable
+from azure.ai.textanalytics import TextAnalyticsClient
+from router.router_type import RouterType
+from router.router_utils import create_router
+from ta_batcher import TextAnalyticsBatcher
+from utils import get_azure_credential
+from query_cache import TTLCache
 
+LANGUAGE_CACHE_SIZE = int(os.environ.get("LANGUAGE_CACHE_SIZE", "10000"))
+# Raw SDK responses are large and rarely used by clients:
+INCLUDE_API_RESPONSE = os.environ.get("INCLUDE_API_RESPONSE", "false").lower() == "true"
+ORCHESTRATION_MAX_WORKERS = int(os.environ.get("ORCHESTRATION_MAX_WORKERS", "16"))
+
+
+class OrchestrationMode(Enum):
+    """
+    Orchestration execution mode.
+    """
+    # Detect language, then route, then fallback on router error:
+    SEQUENTIAL = "SEQUENTIAL"
+
+    # Language detection, router and speculative fallback in parallel:
+    CONCURRENT = "CONCURRENT"
+
+    # As CONCURRENT, but call CLU and CQA routers at once and pick by confidence:
+    FANOUT = "FANOUT"
+
+
+class UnifiedConversationOrchestrator:
     """
     Unified-Conversation-Orchestrator.
 
@@ -9,15 +43,24 @@
     def __init__(
         self,
         router_type: RouterType,
-        fallback_function: Callable[[str, str, str], dict]
+        fallback_function: Callable[[str, str, str], dict],
+        mode: OrchestrationMode = None
     ):
         """
         Initialize orchestrator: create internal TA client and router.
         """
+        self.mode = mode or OrchestrationMode(
+            os.environ.get("ORCHESTRATION_MODE", "SEQUENTIAL").upper()
+        )
         self.ta_client = TextAnalyticsClient(
             endpoint=os.environ.get("LANGUAGE_ENDPOINT"),
             credential=get_azure_credential()
         )
+        # Concurrent orchestrations share batched TA calls:
+        self.ta_batcher = TextAnalyticsBatcher(self.ta_client)
+
+        # Detected language per conversation id (thread-safe LRU, no expiry):
+        self.language_cache = TTLCache(float("inf"), LANGUAGE_CACHE_SIZE)
 
         # Router is Callable[[str, str, str], dict]:
         self.router_type = router_type
@@ -27,17 +70,142 @@
 
         self.fallback_function = fallback_function
 
+        # Routers evaluated at once in FANOUT mode:
+        self.fanout_routers = []
+        if self.mode == OrchestrationMode.FANOUT:
+            self.fanout_routers = [
+                create_router(router_type=RouterType.CLU),
+                create_router(router_type=RouterType.CQA)
+            ]
+
+        self.executor = None
+        if self.mode != OrchestrationMode.SEQUENTIAL:
+            self.executor = ThreadPoolExecutor(
+                max_workers=ORCHESTRATION_MAX_WORKERS,
+                thread_name_prefix="orchestrator"
+            )
+
     def detect_language(
         self,
-        text: str
+        text: str,
+        id: str = None
     ) -> str:
         """
-        Detect language of input text using Azure AI Lanuage.
+        Detect language of input text.
+
+        Uses the local identifier first and Azure AI Language only when it
+        is uncertain; results are memoized per conversation id.
         """
-        result = self.ta_client.detect_language(documents=[text])
-        language = result[0].primary_language.iso6391_name
+        language, final = self.provisional_language(
+            text=text,
+            id=id
+        )
+        if final:
+            return language
+
+        result = self.ta_batcher.detect_language(text)
+        language = result.primary_language.iso6391_name
+        self.cache_language(id, language)
         return language
 
+    def provisional_language(
+        self,
+        text: str,
+        id: str = None
+    ) -> tuple[str, bool]:
+        """
+        Cached or confident local language, without remote calls.
+
+        Returns (language, final); final is False when the local guess is
+        uncertain and remote detection should confirm it.
+        """
+        cached = self.language_cache.get(id) if id is not None else None
+        if cached is not None:
+            return cached, True
+
+        guess = language_id.identify(text)
+        if guess.confidence >= language_id.CONFIDENCE_THRESHOLD:
+            self.cache_language(id, guess.language)
+            return guess.language, True
+
+        return guess.language, False
+
+    def cache_language(
+        self,
+        id: str,
+        language: str
+    ):
+        """
+        Memoize detected language per conversation id (LRU).
+        """
+        if id is None:
+            return
+        self.language_cache.set(id, language)
+
+    def route_concurrent(
+        self,
+        message: str,
+        id: str,
+        routers: list[Callable[[str, str, str], dict]]
+    ) -> tuple[dict, Callable[[], dict]]:
+        """
+        Run routers and a speculative fallback in parallel with language
+        detection.
+
+        Work starts with the provisional (local) language; if remote
+        detection disagrees, it is discarded and restarted. Losing work is
+        cancelled if not yet started, otherwise its result is ignored.
+        Returns the selected routing result and a getter for the fallback.
+        """
+        language, final = self.provisional_language(
+            text=message,
+            id=id
+        )
+        language_future = None
+        if not final:
+            language_future = self.executor.submit(self.detect_language, message, id)
+
+        def launch(lang: str) -> list:
+            return [
+                self.executor.submit(router, message, lang, id) for router in routers
+            ] + [
+                self.executor.submit(self.fallback_function, message, lang, id)
+            ]
+
+        futures = launch(language)
+        if language_future is not None:
+            detected = language_future.result()
+            if detected != language:
+                for future in futures:
+                    future.cancel()
+                futures = launch(detected)
+
+        *route_futures, fallback_future = futures
+        routing_result = self.select_result(
+            [future.result() for future in route_futures]
+        )
+        if routing_result is not None and routing_result.get("error") is None:
+            fallback_future.cancel()
+
+        return routing_result, fallback_future.result
+
+    @staticmethod
+    def select_result(
+        results: list[dict]
+    ) -> dict:
+        """
+        Pick the successful routing result with the highest confidence;
+        otherwise the first attempted result (or None).
+        """
+        successful = [
+            r for r in results if r is not None and r.get("error") is None
+        ]
+        if successful:
+            return max(successful, key=lambda r: r.get("confidence") or 0)
+
+        attempted = [r for r in results if r is not None]
+        return attempted[0] if attempted else None
+
     def orchestrate(
         self,
         message: str,
@@ -49,10 +217,26 @@
         if id is None:
             id = str(uuid.uuid4())
 
-        language = self.detect_language(text=message)
+        if self.mode == OrchestrationMode.SEQUENTIAL:
+            language = self.detect_language(
+                text=message,
+                id=id
+            )
+
+            # Router expects a message, language, and id:
+            routing_result = self.router(message, language, id)
+
+            # Fallback-function expects a message, language, and message id:
+            def get_fallback_result() -> dict:
+                return self.fallback_function(message, language, id)
 
-        # Router expects a message, language, and id:
-        routing_result = self.router(message, language, id)
+        else:
+            routers = self.fanout_routers or [self.router]
+            routing_result, get_fallback_result = self.route_concurrent(
+                message=message,
+                id=id,
+                routers=routers
+            )
 
         orchestration_response = {
             "id": id,
@@ -61,22 +245,74 @@
         }
 
         if routing_result is None or routing_result["error"] is not None:
-            # Fallback-function expects a message, language, and message id:
-            fallback_result = self.fallback_function(
-                message,
-                language,
-                id)
+            fallback_result = get_fallback_result()
 
             orchestration_response["route"] = "fallback"
             orchestration_response["result"] = fallback_result
 
             if routing_result is not None:
+                if not INCLUDE_API_RESPONSE:
+                    routing_result.pop("api_response", None)
                 orchestration_response["attempted_route"] = routing_result
 
         else:
             routing_result.pop("error")
+            if not INCLUDE_API_RESPONSE:
+                routing_result.pop("api_response", None)
             route = "clu" if routing_result["kind"] == "clu_result" else "cqa"
             orchestration_response["route"] = route
             orchestration_response["result"] = routing_result
 
         return orchestration_response
+
+
+if __name__ == "__main__":
+    import time
+    from types import SimpleNamespace
+
+    # Mock-upstream benchmark: latency per mode for confident and
+    # low-confidence (fallback) turns, with an uncertain-language message.
+    latency = 0.05
+
+    def mock_router(confidence: float, kind: str) -> Callable[[str, str, str], dict]:
+        def route(message: str, language: str, id: str) -> dict:
+            time.sleep(latency)
+            error = None if confidence >= 0.5 else "confidence threshold not met"
+            return {"kind": kind, "error": error, "confidence": confidence}
+        return route
+
+    def mock_fallback(message: str, language: str, id: str) -> dict:
+        time.sleep(latency * 2)
+        return {"answer": "fallback"}
+
+    class MockBatcher:
+        def detect_language(self, text: str):
+            time.sleep(latency)
+            return SimpleNamespace(primary_language=SimpleNamespace(iso6391_name="en"))
+
+    def build(mode: OrchestrationMode, confidence: float) -> UnifiedConversationOrchestrator:
+        orchestrator = UnifiedConversationOrchestrator.__new__(UnifiedConversationOrchestrator)
+        orchestrator.mode = mode
+        orchestrator.ta_batcher = MockBatcher()
+        orchestrator.language_cache = TTLCache(float("inf"), LANGUAGE_CACHE_SIZE)
+        orchestrator.router_type = RouterType.ORCHESTRATION
+        orchestrator.router = mock_router(confidence, "clu_result")
+        orchestrator.fallback_function = mock_fallback
+        orchestrator.fanout_routers = []
+        if mode == OrchestrationMode.FANOUT:
+            orchestrator.fanout_routers = [
+                mock_router(confidence, "clu_result"),
+                mock_router(confidence * 0.9, "cqa_result")
+            ]
+        orchestrator.executor = ThreadPoolExecutor(max_workers=8)
+        return orchestrator
+
+    for confidence, label in [(0.9, "confident"), (0.2, "low-confidence")]:
+        for mode in OrchestrationMode:
+            orchestrator = build(mode, confidence)
+            start = time.perf_counter()
+            runs = 5
+            for i in range(runs):
+                response = orchestrator.orchestrate("laptop", id=f"{mode.name}-{i}")
+            elapsed = (time.perf_counter() - start) / runs
+            print(f"{label:>15} {mode.name:>10}: {elapsed * 1000:6.1f} ms  route={response['route']}")
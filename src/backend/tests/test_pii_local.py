@@ -0,0 +1,19 @@
+import pii_local
+from pii_local import LocalPiiEntity
+
+
+def _entity(text, offset, length):
+    return LocalPiiEntity(text=text[offset:offset + length], category="PhoneNumber",
+                          confidence_score=0.8, offset=offset, length=length)
+
+
+def test_redact_merges_overlapping_spans(monkeypatch):
+    text = "call 4111 1111 1111 1111 now"
+    entities = [_entity(text, 5, 19), _entity(text, 10, 9), _entity(text, 20, 8)]
+    monkeypatch.setattr(pii_local, "recognize_pii_entities", lambda t: entities)
+    assert pii_local.redact(text) == "call [redacted]"
+
+
+def test_redact_keeps_separate_spans():
+    text = "ssn 123-45-6789 and 4111-1111-1111-1111"
+    assert pii_local.redact(text) == "ssn [redacted] and [redacted]"
@@ -0,0 +1,36 @@
+import pytest
+
+from query_normalizer import QueryNormalizer
+
+
+@pytest.fixture(scope="module")
+def normalizer():
+    return QueryNormalizer(subjects=["The tariff classification of a laptop computer from China", "steel pipe fittings"])
+
+
+@pytest.mark.parametrize("text, term, wrong", [
+    ("steel pipe tees", "steel pipe tee", "steel pipe t-shirt"),
+    ("golf tees", "golf tee", "golf t-shirt"),
+    ("hydraulic accumulator", "hydraulic accumulator", "hydraulic battery"),
+    ("dog trainer", "dog trainer", "dog sneaker"),
+])
+def test_synonyms_do_not_replace_the_users_term(normalizer, text, term, wrong):
+    result = normalizer.normalize(text)
+    assert result.term == term
+    # Synonym forms are only fallbacks, never searched first
+    assert wrong in result.alternatives
+
+
+def test_plurals_are_folded(normalizer):
+    assert normalizer.normalize("The Leather Handbags!!").term == "leather handbag"
+    assert normalizer.normalize("glasses").term == "glasses"
+
+
+def test_spelling_correction_is_only_an_alternative(normalizer):
+    result = normalizer.normalize("labtop")
+    assert result.term == "labtop"
+    assert result.alternatives[0] == "laptop"
+
+
+def test_no_correction_without_corpus():
+    assert QueryNormalizer().normalize("labtop").alternatives == []
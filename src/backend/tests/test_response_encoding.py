@@ -0,0 +1,16 @@
+import pytest
+
+from response_encoding import DEFAULT_RULING_FIELDS, parse_fields
+
+
+def test_parse_fields_accepts_strings_and_string_lists():
+    assert parse_fields(None) is None
+    assert parse_fields("subject, url,") == ["subject", "url"]
+    assert parse_fields("default") == DEFAULT_RULING_FIELDS
+    assert parse_fields(["subject", "url"]) == ["subject", "url"]
+
+
+@pytest.mark.parametrize("value", [5, {"a": 1}, ["subject", 1], True])
+def test_parse_fields_rejects_other_types(value):
+    with pytest.raises(ValueError):
+        parse_fields(value)